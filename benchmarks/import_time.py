@@ -0,0 +1,156 @@
+"""
+import_time.py
+Asmita Chitale
+Assignment 03
+ATCM 3311.0U1
+07/24/2020
+"""
+
+
+#====================================================== IMPORTS =======================================================#
+import json
+import os
+import subprocess
+import sys
+import time
+import types
+
+
+#====================================================== CONSTS ========================================================#
+BUDGETS = (  # Modules to import, each with the most seconds it may take
+    ("blocks", 0.05),
+    ("sampling", 0.05),
+    ("level", 0.1),
+    ("corpus", 0.1),
+    ("mafile", 0.1),
+    ("scene", 0.1),
+    ("mayalevel", 0.1),
+)
+HEAVY_MODULES = (  # Modules that must only be imported when the UI, a scene backend or a worker pool is used
+    "maya",
+    "pymel",
+    "PySide2",
+    "shiboken2",
+    "multiprocessing",
+    "concurrent",
+)
+REPEATS = 5  # Imports timed per module, each in a new process. The fastest is kept, since the others are just noise
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src")  # Directory of the modules
+STUBBED_MODULES = ("maya", "pymel", "PySide2", "shiboken2")  # Modules replaced by empty stubs, so Maya isn't needed
+
+
+#====================================================== CLASSES =======================================================#
+class StubFinder(object):
+    """Imports empty modules in place of Maya, PyMEL and Qt, and remembers which were imported. Part of the Controller
+
+    The stubs have no attributes, so they only stand in for imports at the top of a module, which are what this
+    benchmark looks for. Works as both a Python 2 and a Python 3 import hook
+    """
+
+    def __init__(self):
+        """Creates a finder that hasn't imported anything"""
+        self.imported = [][:]
+
+    def _is_stubbed(self, fullname):
+        """
+        Returns whether a module is replaced by a stub
+        :param fullname: The full name of the module, such as maya.cmds
+        :return: Whether it is stubbed
+        """
+        return fullname.split(".", 1)[0] in STUBBED_MODULES
+
+    def find_spec(self, fullname, path=None, target=None):
+        """Python 3 hook, returns a spec for the stub of a stubbed module"""
+        if not self._is_stubbed(fullname):
+            return None
+        import importlib.util
+        return importlib.util.spec_from_loader(fullname, self, is_package=True)
+
+    def create_module(self, spec):
+        """Python 3 hook, makes the stub"""
+        return self._make_module(spec.name)
+
+    def exec_module(self, module):
+        """Python 3 hook, the stub has nothing to run"""
+        pass
+
+    def find_module(self, fullname, path=None):
+        """Python 2 hook, returns this finder for stubbed modules"""
+        return self if self._is_stubbed(fullname) else None
+
+    def load_module(self, fullname):
+        """Python 2 hook, makes the stub"""
+        if fullname not in sys.modules:
+            sys.modules[fullname] = self._make_module(fullname)
+        return sys.modules[fullname]
+
+    def _make_module(self, fullname):
+        """
+        Makes the stub of a module
+        :param fullname: The full name of the module
+        :return: The module
+        """
+        self.imported.append(fullname)
+        module = types.ModuleType(fullname)
+        module.__path__ = [][:]  # So submodules can be imported
+        module.__loader__ = self
+        return module
+
+
+#===================================================== FUNCTIONS =======================================================#
+def time_import(module_name):
+    """
+    Imports a module in this process with Maya stubbed out, and returns what it cost
+    :param module_name: The name of the module
+    :return: Tuple of the seconds taken and the sorted names of the heavy modules it imported
+    """
+    sys.path.insert(0, SRC_DIR)
+    sys.meta_path.insert(0, StubFinder())
+    start = time.time()
+    __import__(module_name)
+    seconds = time.time() - start
+    heavy = sorted(name for name in sys.modules if name.split(".", 1)[0] in HEAVY_MODULES)
+    return seconds, heavy
+
+
+def measure(module_name, repeats=REPEATS):
+    """
+    Times importing a module, each time in a new Python process so nothing is imported already
+    :param module_name: The name of the module
+    :param repeats: The number of processes
+    :return: Tuple of the fastest seconds taken and the sorted names of the heavy modules it imported
+    """
+    results = [][:]
+    for _ in range(repeats):
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--child", module_name])
+        results.append(json.loads(output.decode("utf-8").strip().splitlines()[-1]))
+    return min(result[0] for result in results), results[0][1]
+
+
+def main(args):
+    """
+    Times importing every module of BUDGETS and checks it against its budget and HEAVY_MODULES
+    :param args: The command line arguments, without the program name. --child MODULE times one import and prints it
+        as JSON, and a number scales every budget, such as 2 for a slow machine
+    :return: The exit code, 0 if every module is within its budget
+    """
+    if len(args) == 2 and args[0] == "--child":
+        print(json.dumps(time_import(args[1])))
+        return 0
+
+    scale = float(args[0]) if len(args) > 0 else 1.0
+    failed = False
+    for module_name, budget in BUDGETS:
+        seconds, heavy = measure(module_name)
+        problems = [][:]
+        if seconds > budget * scale:
+            problems.append("over budget of {:.1f}ms".format(budget * scale * 1000))
+        if len(heavy) > 0:
+            problems.append("imported {}".format(", ".join(heavy)))
+        failed = failed or len(problems) > 0
+        print("{:<12} {:8.1f}ms  {}".format(module_name, seconds * 1000, "; ".join(problems) if problems else "ok"))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
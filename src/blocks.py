@@ -8,6 +8,7 @@ ATCM 3311.0U1
 
 
 #====================================================== IMPORTS =======================================================#
+from collections import namedtuple
 from enum import Enum
 
 
@@ -56,6 +57,69 @@ class Orientation(Enum):
     EAST = 3
 
 
+# These are consts but closely linked and related to BlockType and Orientation
+BLOCK_TYPES = tuple(BlockType)  # Get block type from its value
+ORIENTATIONS = tuple(Orientation)  # Get orientation from its value
+ORIENTATION_BITS = 2  # Number of bits of a cell code used by the orientation
+
+# Offsets from a block's position to every position it connects to, in the order adjacent() returns them
+ADJACENT_OFFSETS = {
+    (BlockType.EMPTY, Orientation.NORTH): (),
+    (BlockType.EMPTY, Orientation.WEST): (),
+    (BlockType.EMPTY, Orientation.SOUTH): (),
+    (BlockType.EMPTY, Orientation.EAST): (),
+    (BlockType.START, Orientation.NORTH): ((0, 0, 1),),
+    (BlockType.START, Orientation.WEST): ((1, 0, 0),),
+    (BlockType.START, Orientation.SOUTH): ((0, 0, -1),),
+    (BlockType.START, Orientation.EAST): ((-1, 0, 0),),
+    (BlockType.END, Orientation.NORTH): ((0, 0, -1),),
+    (BlockType.END, Orientation.WEST): ((-1, 0, 0),),
+    (BlockType.END, Orientation.SOUTH): ((0, 0, 1),),
+    (BlockType.END, Orientation.EAST): ((1, 0, 0),),
+    (BlockType.DEAD_END, Orientation.NORTH): ((0, 0, -1),),
+    (BlockType.DEAD_END, Orientation.WEST): ((-1, 0, 0),),
+    (BlockType.DEAD_END, Orientation.SOUTH): ((0, 0, 1),),
+    (BlockType.DEAD_END, Orientation.EAST): ((1, 0, 0),),
+    (BlockType.STRAIGHT, Orientation.NORTH): ((0, 0, -1), (0, 0, 1)),
+    (BlockType.STRAIGHT, Orientation.WEST): ((-1, 0, 0), (1, 0, 0)),
+    (BlockType.STRAIGHT, Orientation.SOUTH): ((0, 0, -1), (0, 0, 1)),
+    (BlockType.STRAIGHT, Orientation.EAST): ((-1, 0, 0), (1, 0, 0)),
+    (BlockType.RAMP, Orientation.NORTH): ((0, 0, -1), (0, 1, 1)),
+    (BlockType.RAMP, Orientation.WEST): ((-1, 0, 0), (1, 1, 0)),
+    (BlockType.RAMP, Orientation.SOUTH): ((0, 0, 1), (0, 1, -1)),
+    (BlockType.RAMP, Orientation.EAST): ((1, 0, 0), (-1, 1, 0)),
+    (BlockType.T_INTERSECTION, Orientation.NORTH): ((0, 0, -1), (-1, 0, 0), (1, 0, 0)),
+    (BlockType.T_INTERSECTION, Orientation.WEST): ((-1, 0, 0), (0, 0, -1), (0, 0, 1)),
+    (BlockType.T_INTERSECTION, Orientation.SOUTH): ((0, 0, 1), (-1, 0, 0), (1, 0, 0)),
+    (BlockType.T_INTERSECTION, Orientation.EAST): ((1, 0, 0), (0, 0, -1), (0, 0, 1)),
+    (BlockType.CROSS, Orientation.NORTH): ((0, 0, -1), (0, 0, 1), (-1, 0, 0), (1, 0, 0)),
+    (BlockType.CROSS, Orientation.WEST): ((0, 0, -1), (0, 0, 1), (-1, 0, 0), (1, 0, 0)),
+    (BlockType.CROSS, Orientation.SOUTH): ((0, 0, -1), (0, 0, 1), (-1, 0, 0), (1, 0, 0)),
+    (BlockType.CROSS, Orientation.EAST): ((0, 0, -1), (0, 0, 1), (-1, 0, 0), (1, 0, 0)),
+    (BlockType.CURVED, Orientation.NORTH): ((0, 0, -1), (1, 0, 0)),
+    (BlockType.CURVED, Orientation.WEST): ((-1, 0, 0), (0, 0, -1)),
+    (BlockType.CURVED, Orientation.SOUTH): ((0, 0, 1), (-1, 0, 0)),
+    (BlockType.CURVED, Orientation.EAST): ((1, 0, 0), (0, 0, 1)),
+    (BlockType.RAMP_DUMMY, Orientation.NORTH): ((0, 0, 1),),
+    (BlockType.RAMP_DUMMY, Orientation.WEST): ((1, 0, 0),),
+    (BlockType.RAMP_DUMMY, Orientation.SOUTH): ((0, 0, -1),),
+    (BlockType.RAMP_DUMMY, Orientation.EAST): ((-1, 0, 0),),
+}
+ADJACENT_OFFSETS_BY_CODE = [()] * (len(BLOCK_TYPES) << ORIENTATION_BITS)  # Same as above, indexed by cell code
+for (_block_type, _orientation), _offsets in ADJACENT_OFFSETS.items():
+    ADJACENT_OFFSETS_BY_CODE[(_block_type.value << ORIENTATION_BITS) | _orientation.value] = _offsets
+SOCKET_OFFSETS = (  # Every offset a block can connect along: the four sides, then the four ramp tops
+    (0, 0, -1), (0, 0, 1), (-1, 0, 0), (1, 0, 0),
+    (0, 1, -1), (0, 1, 1), (-1, 1, 0), (1, 1, 0),
+)
+SOCKET_BITS = dict((_offset, 1 << _bit) for _bit, _offset in enumerate(SOCKET_OFFSETS))  # Bit for each offset
+EXIT_MASKS_BY_CODE = [0] * len(ADJACENT_OFFSETS_BY_CODE)  # Socket bits of the offsets of each cell code
+for _code, _offsets in enumerate(ADJACENT_OFFSETS_BY_CODE):
+    for _offset in _offsets:
+        EXIT_MASKS_BY_CODE[_code] |= SOCKET_BITS[_offset]
+del _block_type, _orientation, _offsets, _code, _offset
+
+
 class EmptyBlock(object):
     """Represents an empty block. Can have any orientation. Part of the Model"""
 
@@ -75,7 +139,7 @@ class EmptyBlock(object):
         :param pos: The block's position
         :return: List of adjacent positions
         """
-        return []
+        return apply_offsets(pos, ADJACENT_OFFSETS[(self.block_type, self.orientation)])
 
 
 class StartBlock(object):
@@ -105,14 +169,7 @@ class StartBlock(object):
         :param pos: The block's position
         :return: List of adjacent positions
         """
-        if self.orientation == Orientation.NORTH:
-            return [(pos[X], pos[Y], pos[Z] + 1)]
-        elif self.orientation == Orientation.WEST:
-            return [(pos[X] + 1, pos[Y], pos[Z])]
-        elif self.orientation == Orientation.SOUTH:
-            return [(pos[X], pos[Y], pos[Z] - 1)]
-        else:
-            return [(pos[X] - 1, pos[Y], pos[Z])]
+        return apply_offsets(pos, ADJACENT_OFFSETS[(self.block_type, self.orientation)])
 
 
 class EndBlock(object):
@@ -142,14 +199,7 @@ class EndBlock(object):
         :param pos: The block's position
         :return: List of adjacent positions
         """
-        if self.orientation == Orientation.NORTH:
-            return [(pos[X], pos[Y], pos[Z] - 1)]
-        elif self.orientation == Orientation.WEST:
-            return [(pos[X] - 1, pos[Y], pos[Z])]
-        elif self.orientation == Orientation.SOUTH:
-            return [(pos[X], pos[Y], pos[Z] + 1)]
-        else:
-            return [(pos[X] + 1, pos[Y], pos[Z])]
+        return apply_offsets(pos, ADJACENT_OFFSETS[(self.block_type, self.orientation)])
 
 
 class DeadEndBlock(object):
@@ -179,14 +229,7 @@ class DeadEndBlock(object):
         :param pos: The block's position
         :return: List of adjacent positions
         """
-        if self.orientation == Orientation.NORTH:
-            return [(pos[X], pos[Y], pos[Z] - 1)]
-        elif self.orientation == Orientation.WEST:
-            return [(pos[X] - 1, pos[Y], pos[Z])]
-        elif self.orientation == Orientation.SOUTH:
-            return [(pos[X], pos[Y], pos[Z] + 1)]
-        else:
-            return [(pos[X] + 1, pos[Y], pos[Z])]
+        return apply_offsets(pos, ADJACENT_OFFSETS[(self.block_type, self.orientation)])
 
 
 class StraightBlock(object):
@@ -218,10 +261,7 @@ class StraightBlock(object):
         :param pos: The block's position
         :return: List of adjacent positions
         """
-        if self.orientation == Orientation.NORTH or self.orientation == Orientation.SOUTH:
-            return [(pos[X], pos[Y], pos[Z] - 1), (pos[X], pos[Y], pos[Z] + 1)]
-        else:
-            return [(pos[X] - 1, pos[Y], pos[Z]), (pos[X] + 1, pos[Y], pos[Z])]
+        return apply_offsets(pos, ADJACENT_OFFSETS[(self.block_type, self.orientation)])
 
 
 class RampBlock(object):
@@ -257,14 +297,7 @@ class RampBlock(object):
         :param pos: The block's position
         :return: List of adjacent positions
         """
-        if self.orientation == Orientation.NORTH:
-            return [(pos[X], pos[Y], pos[Z] - 1), (pos[X], pos[Y] + 1, pos[Z] + 1)]
-        elif self.orientation == Orientation.WEST:
-            return [(pos[X] - 1, pos[Y], pos[Z]), (pos[X] + 1, pos[Y] + 1, pos[Z])]
-        elif self.orientation == Orientation.SOUTH:
-            return [(pos[X], pos[Y], pos[Z] + 1), (pos[X], pos[Y] + 1, pos[Z] - 1)]
-        else:
-            return [(pos[X] + 1, pos[Y], pos[Z]), (pos[X] - 1, pos[Y] + 1, pos[Z])]
+        return apply_offsets(pos, ADJACENT_OFFSETS[(self.block_type, self.orientation)])
 
 
 class RampDummy(object):
@@ -293,14 +326,7 @@ class RampDummy(object):
         :param pos: The block's position
         :return: List of adjacent positions
         """
-        if self.orientation == Orientation.NORTH:
-            return [(pos[X], pos[Y], pos[Z] + 1)]
-        elif self.orientation == Orientation.WEST:
-            return [(pos[X] + 1, pos[Y], pos[Z])]
-        elif self.orientation == Orientation.SOUTH:
-            return [(pos[X], pos[Y], pos[Z] - 1)]
-        else:
-            return [(pos[X] - 1, pos[Y], pos[Z])]
+        return apply_offsets(pos, ADJACENT_OFFSETS[(self.block_type, self.orientation)])
 
 
 class TIntersectionBlock(object):
@@ -330,14 +356,7 @@ class TIntersectionBlock(object):
         :param pos: The block's position
         :return: List of adjacent positions
         """
-        if self.orientation == Orientation.NORTH:
-            return [(pos[X], pos[Y], pos[Z] - 1), (pos[X] - 1, pos[Y], pos[Z]), (pos[X] + 1, pos[Y], pos[Z])]
-        elif self.orientation == Orientation.WEST:
-            return [(pos[X] - 1, pos[Y], pos[Z]), (pos[X], pos[Y], pos[Z] - 1), (pos[X], pos[Y], pos[Z] + 1)]
-        elif self.orientation == Orientation.SOUTH:
-            return [(pos[X], pos[Y], pos[Z] + 1), (pos[X] - 1, pos[Y], pos[Z]), (pos[X] + 1, pos[Y], pos[Z])]
-        else:
-            return [(pos[X] + 1, pos[Y], pos[Z]), (pos[X], pos[Y], pos[Z] - 1), (pos[X], pos[Y], pos[Z] + 1)]
+        return apply_offsets(pos, ADJACENT_OFFSETS[(self.block_type, self.orientation)])
 
 
 class CrossBlock(object):
@@ -368,8 +387,7 @@ class CrossBlock(object):
         :param pos: The block's position
         :return: List of adjacent positions
         """
-        return [(pos[X], pos[Y], pos[Z] - 1), (pos[X], pos[Y], pos[Z] + 1),
-                (pos[X] - 1, pos[Y], pos[Z]), (pos[X] + 1, pos[Y], pos[Z])]
+        return apply_offsets(pos, ADJACENT_OFFSETS[(self.block_type, self.orientation)])
 
 
 class CurvedBlock(object):
@@ -399,14 +417,59 @@ class CurvedBlock(object):
         :param pos: The block's position
         :return: List of adjacent positions
         """
-        if self.orientation == Orientation.NORTH:
-            return [(pos[X], pos[Y], pos[Z] - 1), (pos[X] + 1, pos[Y], pos[Z])]
-        elif self.orientation == Orientation.WEST:
-            return [(pos[X] - 1, pos[Y], pos[Z]), (pos[X], pos[Y], pos[Z] - 1)]
-        elif self.orientation == Orientation.SOUTH:
-            return [(pos[X], pos[Y], pos[Z] + 1), (pos[X] - 1, pos[Y], pos[Z])]
-        else:
-            return [(pos[X] + 1, pos[Y], pos[Z]), (pos[X], pos[Y], pos[Z] + 1)]
+        return apply_offsets(pos, ADJACENT_OFFSETS[(self.block_type, self.orientation)])
+
+
+class BlockPrototype(namedtuple("BlockPrototype", ("block_type", "orientation", "pth", "weight"))):
+    """Immutable, shared stand-in for a block of one type and orientation. Part of the Model
+
+    Prototypes let the generator check every candidate block at a spot without making a block object for each one.
+    They have no length since they are shared; the level keeps the length of each placed block
+    """
+    __slots__ = ()
+
+    def __new__(cls, block_type, orientation=Orientation.NORTH, pth=None, weight=DEFAULT_WEIGHT):
+        return super(BlockPrototype, cls).__new__(cls, block_type, orientation, pth, weight)
+
+    @classmethod
+    def from_block(cls, block):
+        """
+        Makes a prototype with the same settings as a block
+        :param block: The block
+        :return: The prototype
+        """
+        return cls(block.block_type, orientation=block.orientation, pth=block.pth, weight=block.weight)
+
+    def __str__(self):
+        return str(self.make_block())
+
+    @property
+    def offsets(self):
+        """The offsets to every position this block connects to"""
+        return ADJACENT_OFFSETS[(self.block_type, self.orientation)]
+
+    @property
+    def exit_mask(self):
+        """The socket bits of every position this block connects to"""
+        return EXIT_MASKS_BY_CODE[cell_code(self.block_type, self.orientation)]
+
+    def adjacent(self, pos):
+        """
+        Returns all adjacent positions given the block's position
+        :param pos: The block's position
+        :return: List of adjacent positions
+        """
+        return apply_offsets(pos, ADJACENT_OFFSETS[(self.block_type, self.orientation)])
+
+    def make_block(self, length=-1):
+        """
+        Makes a block object from the prototype
+        :param length: The length of the block
+        :return: The block
+        """
+        blk = make_block(self.block_type, pth=self.pth, weight=self.weight, orientation=self.orientation)
+        blk.length = length
+        return blk
 
 
 class BlockFile(object):
@@ -429,23 +492,88 @@ class BlockFile(object):
         Makes a block from the block file. Note that a base class is unnecessary due to duck typing
         :return: The block
         """
-        if not self.pth:
-            return EmptyBlock()
-        if self.block_type == BlockType.START:
-            return StartBlock(pth=self.pth, weight=self.weight, orientation=orientation)
-        if self.block_type == BlockType.END:
-            return EndBlock(pth=self.pth, weight=self.weight, orientation=orientation)
-        if self.block_type == BlockType.DEAD_END:
-            return DeadEndBlock(pth=self.pth, weight=self.weight, orientation=orientation)
-        if self.block_type == BlockType.STRAIGHT:
-            return StraightBlock(pth=self.pth, weight=self.weight, orientation=orientation)
-        if self.block_type == BlockType.RAMP:
-            return RampBlock(pth=self.pth, weight=self.weight, orientation=orientation)
-        if self.block_type == BlockType.T_INTERSECTION:
-            return TIntersectionBlock(pth=self.pth, weight=self.weight, orientation=orientation)
-        if self.block_type == BlockType.CROSS:
-            return CrossBlock(pth=self.pth, weight=self.weight, orientation=orientation)
-        if self.block_type == BlockType.CURVED:
-            return CurvedBlock(pth=self.pth, weight=self.weight, orientation=orientation)
-        else:
+        if not self.pth or self.block_type == BlockType.RAMP_DUMMY:
             return EmptyBlock()
+        return make_block(self.block_type, pth=self.pth, weight=self.weight, orientation=orientation)
+
+    def make_prototypes(self):
+        """
+        Makes prototypes of the block file's block in every orientation. The prototypes do not follow later changes
+        to the block file, so make new ones after changing the path or weight
+        :return: A list of prototypes, one per orientation
+        """
+        return [BlockPrototype.from_block(self.make_block(orientation=orientation)) for orientation in ORIENTATIONS]
+
+
+# This is a const but needs the block classes above
+BLOCK_CLASSES = {  # Get the block class for a block type
+    BlockType.EMPTY: EmptyBlock,
+    BlockType.START: StartBlock,
+    BlockType.END: EndBlock,
+    BlockType.DEAD_END: DeadEndBlock,
+    BlockType.STRAIGHT: StraightBlock,
+    BlockType.RAMP: RampBlock,
+    BlockType.T_INTERSECTION: TIntersectionBlock,
+    BlockType.CROSS: CrossBlock,
+    BlockType.CURVED: CurvedBlock,
+    BlockType.RAMP_DUMMY: RampDummy,
+}
+GLYPHS_BY_CODE = ["?"] * len(ADJACENT_OFFSETS_BY_CODE)  # Text of each cell code, from the block's __str__
+for _block_type, _block_class in BLOCK_CLASSES.items():
+    for _orientation in ORIENTATIONS:
+        GLYPHS_BY_CODE[(_block_type.value << ORIENTATION_BITS) | _orientation.value] = \
+            str(_block_class(orientation=_orientation))
+del _block_type, _block_class, _orientation
+
+
+#===================================================== FUNCTIONS =======================================================#
+def apply_offsets(pos, offsets):
+    """
+    Returns the positions found by adding each offset to a position
+    :param pos: The (X,Y,Z) position
+    :param offsets: The (X,Y,Z) offsets, such as an entry of ADJACENT_OFFSETS
+    :return: List of positions
+    """
+    x, y, z = pos
+    return [(x + dx, y + dy, z + dz) for dx, dy, dz in offsets]
+
+
+def make_block(block_type, pth=None, weight=DEFAULT_WEIGHT, orientation=Orientation.NORTH):
+    """
+    Makes a block object of the given type
+    :param block_type: The BlockType of the block
+    :param pth: Path to the scene file for the block
+    :param weight: The randomization weight
+    :param orientation: The orientation of the block
+    :return: The block. Unknown block types give an empty block
+    """
+    block_class = BLOCK_CLASSES.get(block_type, EmptyBlock)
+    return block_class(pth=pth, weight=weight, orientation=orientation)
+
+
+def cell_code(block_type, orientation):
+    """
+    Packs a block type and orientation into a single byte for compact level storage
+    :param block_type: The BlockType
+    :param orientation: The Orientation
+    :return: The cell code
+    """
+    return (block_type.value << ORIENTATION_BITS) | orientation.value
+
+
+def cell_block_type(code):
+    """
+    Unpacks the block type from a cell code
+    :param code: The cell code
+    :return: The BlockType
+    """
+    return BLOCK_TYPES[code >> ORIENTATION_BITS]
+
+
+def cell_orientation(code):
+    """
+    Unpacks the orientation from a cell code
+    :param code: The cell code
+    :return: The Orientation
+    """
+    return ORIENTATIONS[code & ((1 << ORIENTATION_BITS) - 1)]
@@ -0,0 +1,204 @@
+"""
+corpus.py
+Asmita Chitale
+Assignment 03
+ATCM 3311.0U1
+07/24/2020
+"""
+
+
+#====================================================== IMPORTS =======================================================#
+import level
+
+import os
+import struct
+
+
+#====================================================== CONSTS ========================================================#
+CORPUS_MAGIC = b"LVLC"  # First bytes of a corpus file
+CORPUS_VERSION = 1  # Version of the corpus format. Bumped when the layout changes
+CORPUS_HEADER = struct.Struct("<4sHH")  # Magic, version, unused
+RECORD_HEADER = struct.Struct("<Q")  # Number of bytes of a record
+INDEX_ENTRY = struct.Struct("<Q")  # Offset of a record's header in the file
+CORPUS_FOOTER = struct.Struct("<QQ4s")  # Offset of the index, number of records, magic
+
+
+#====================================================== CLASSES =======================================================#
+class CorpusWriter(object):
+    """Writes levels one at a time to a corpus file. Part of the Model
+
+    A corpus is a header, then each level packed with level.Level.to_bytes behind its length, then an index of record
+    offsets and a footer. Packed levels keep the seed and generator settings that made them, so every record can be
+    made again. Records are written as they come in and the index is written by close, so nothing but the offsets is
+    kept in memory. Opening an existing corpus appends to it
+    """
+
+    def __init__(self, pth):
+        """
+        Opens the corpus for writing, creating it if needed
+        :param pth: The path of the file
+        """
+        self.pth = pth
+        if os.path.exists(pth) and os.path.getsize(pth) > 0:
+            # Drop the old index and footer, they are written again on close
+            with CorpusReader(pth) as reader:
+                self._offsets = list(reader.offsets)
+                end = reader.data_end
+            self._file = open(pth, "r+b")
+            self._file.seek(end)
+            self._file.truncate()
+        else:
+            self._offsets = [][:]
+            self._file = open(pth, "wb")
+            self._file.write(CORPUS_HEADER.pack(CORPUS_MAGIC, CORPUS_VERSION, 0))
+
+    def __len__(self):
+        """
+        Returns the number of records written so far
+        :return: The number of records
+        """
+        return len(self._offsets)
+
+    def write(self, lvl):
+        """
+        Adds a level to the end of the corpus
+        :param lvl: The Level
+        :return: The index of the record
+        """
+        return self.write_bytes(lvl.to_bytes())
+
+    def write_bytes(self, data):
+        """
+        Adds an already packed level, such as GeneratedLevel.data, to the end of the corpus without unpacking it
+        :param data: The bytes from level.Level.to_bytes
+        :return: The index of the record
+        """
+        self._offsets.append(self._file.tell())
+        self._file.write(RECORD_HEADER.pack(len(data)))
+        self._file.write(data)
+        return len(self._offsets) - 1
+
+    def close(self):
+        """
+        Writes the index and footer and closes the file. Does nothing if already closed
+        :return: None
+        """
+        if self._file is None:
+            return
+        index_offset = self._file.tell()
+        self._file.write(b"".join(INDEX_ENTRY.pack(offset) for offset in self._offsets))
+        self._file.write(CORPUS_FOOTER.pack(index_offset, len(self._offsets), CORPUS_MAGIC))
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        """Lets the writer be used in a with statement that closes it"""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Closes the writer at the end of a with statement"""
+        self.close()
+
+
+class CorpusReader(object):
+    """Reads levels from a corpus file made by CorpusWriter. Part of the Model
+
+    Only the index is read when opened, so getting level N is one seek and one read. If the writer was never closed
+    and there is no index, the records are found by walking their length headers instead
+    """
+
+    def __init__(self, pth):
+        """
+        Opens the corpus for reading
+        :param pth: The path of the file
+        """
+        self.pth = pth
+        self._file = open(pth, "rb")
+        try:
+            self._read_index()
+        except Exception:
+            self._file.close()
+            raise
+
+    def _read_index(self):
+        """
+        Reads the header and the record offsets
+        :return: None
+        """
+        magic, version, _ = CORPUS_HEADER.unpack(self._file.read(CORPUS_HEADER.size))
+        if magic != CORPUS_MAGIC:
+            raise ValueError("Not a level corpus")
+        if version != CORPUS_VERSION:
+            raise ValueError("Unsupported level corpus version {}".format(version))
+
+        self._file.seek(0, os.SEEK_END)
+        size = self._file.tell()
+        if size >= CORPUS_HEADER.size + CORPUS_FOOTER.size:
+            self._file.seek(size - CORPUS_FOOTER.size)
+            index_offset, count, magic = CORPUS_FOOTER.unpack(self._file.read(CORPUS_FOOTER.size))
+            if magic == CORPUS_MAGIC and index_offset + count * INDEX_ENTRY.size + CORPUS_FOOTER.size == size:
+                self._file.seek(index_offset)
+                data = self._file.read(count * INDEX_ENTRY.size)
+                self.offsets = [INDEX_ENTRY.unpack_from(data, i * INDEX_ENTRY.size)[0] for i in range(count)]
+                self.data_end = index_offset
+                return
+
+        # No footer, so walk the records and stop at the first one cut short
+        self.offsets = [][:]
+        offset = CORPUS_HEADER.size
+        while offset + RECORD_HEADER.size <= size:
+            self._file.seek(offset)
+            record_len, = RECORD_HEADER.unpack(self._file.read(RECORD_HEADER.size))
+            if offset + RECORD_HEADER.size + record_len > size:
+                break
+            self.offsets.append(offset)
+            offset += RECORD_HEADER.size + record_len
+        self.data_end = offset
+
+    def __len__(self):
+        """
+        Returns the number of records
+        :return: The number of records
+        """
+        return len(self.offsets)
+
+    def read_bytes(self, index):
+        """
+        Returns a record without unpacking it
+        :param index: The index of the record. Negative indices count from the end
+        :return: The bytes from level.Level.to_bytes
+        """
+        self._file.seek(self.offsets[index])
+        record_len, = RECORD_HEADER.unpack(self._file.read(RECORD_HEADER.size))
+        return self._file.read(record_len)
+
+    def __getitem__(self, index):
+        """
+        Returns a level
+        :param index: The index of the record. Negative indices count from the end
+        :return: The Level, with the seed and settings that made it
+        """
+        return level.Level.from_bytes(self.read_bytes(index))
+
+    def __iter__(self):
+        """
+        Returns every level in order, reading one record at a time
+        :return: Iterator of Level
+        """
+        for index in range(len(self.offsets)):
+            yield self[index]
+
+    def close(self):
+        """
+        Closes the file
+        :return: None
+        """
+        self._file.close()
+
+    def __enter__(self):
+        """Lets the reader be used in a with statement that closes it"""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Closes the reader at the end of a with statement"""
+        self.close()
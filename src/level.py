@@ -9,8 +9,14 @@ ATCM 3311.0U1
 
 #====================================================== IMPORTS =======================================================#
 import blocks
+import sampling
 
+from collections import namedtuple
+import array
+import heapq
 import random
+import struct
+import sys
 
 
 #====================================================== CONSTS ========================================================#
@@ -18,11 +24,51 @@ X = 0  # Element of size tuple
 Y = 1  # Element of size tuple
 Z = 2  # Element of size tuple
 MINIMUM_SIZE = (1, 1, 2)  # Need room for at least a start block and an end block
+EMPTY_CODE = blocks.cell_code(blocks.BlockType.EMPTY, blocks.Orientation.NORTH)  # Cell code of an empty cell
+DEFAULT_BACKTRACK_DEPTH = 4  # Placements undone by each backtrack in LevelGenerator.generate_with_retries
+DEFAULT_MAX_ATTEMPTS = 10  # Fresh starts in LevelGenerator.generate_with_retries
+DEFAULT_MAX_BACKTRACKS = 50  # Backtracks per attempt in LevelGenerator.generate_with_retries
+STEER_OFFSETS = ((0, 0, -1), (0, 0, 1), (-1, 0, 0), (1, 0, 0))  # Neighbors counted as free space when steering
+STEER_SAMPLES = 8  # Remaining spots compared when steering toward the minimum length
+MAX_PENDING_PER_WORKER = 2  # Levels in flight per worker process in LevelGenerator.generate_many
+PROGRESS_INTERVAL = 64  # Placements between calls to the progress function of LevelGenerator.generate
+LEVEL_MAGIC = b"LVLG"  # First bytes of a packed level
+LEVEL_VERSION = 1  # Version of the packed level format. Bumped when the layout changes
+LEVEL_HEADER = struct.Struct("<4sHHiiiiII")  # Magic, version, unused, size X, Y, Z, length, sources, metadata bytes
+ARRAY_ALIGNMENT = 4  # Cell arrays of a packed level start on multiples of this, so they can be used in place
+SOURCE_HEADER = struct.Struct("<dI")  # Weight and number of path bytes of a packed source
+NO_PATH = 0xFFFFFFFF  # Number of path bytes for a source without a path
+GLYPH_TABLE = bytes(bytearray(ord(glyph) for glyph in  # Cell code to glyph table for bytes.translate
+                             blocks.GLYPHS_BY_CODE + ["?"] * (256 - len(blocks.GLYPHS_BY_CODE))))
+SOCKET_BACK_BITS = [blocks.SOCKET_BITS.get((-dx, -dy, -dz), 0)  # Socket bit pointing back along each socket
+                    for dx, dy, dz in blocks.SOCKET_OFFSETS]
 
 
 #====================================================== CLASSES =======================================================#
 class Level(object):
-    """Represents an instance level full of block instances. This is the Model"""
+    """Represents an instance level full of block instances. This is the Model
+
+    Cells are stored in flat typed arrays instead of one block object per cell. Each cell keeps a packed block type
+    and orientation code (see blocks.cell_code), its path length and an index into a table of (path, weight) sources.
+    Block objects are only made when asked for by get_block, so changing a returned block does not change the level;
+    use place_block instead
+
+    Each cell also keeps socket masks, one bit per entry of blocks.SOCKET_OFFSETS, that describe the blocks next to it.
+    The inbound mask has the neighbors that connect to the cell, the required mask has the inbound neighbors that
+    are not ramps (ramps connect through their dummy), and the forbidden mask has the neighbors that are filled but
+    don't connect to the cell. They are updated on every place_block, so checking whether a block fits a cell is a
+    few bitwise operations against the block's exit mask
+
+    Alongside the masks, each cell keeps the shortest path length of its inbound neighbors, so the length of a block
+    placed there is a lookup instead of a search (see get_predecessor_length and distance_at)
+
+    The filled cells are also indexed by block type, with a heap of dead ends by length and the box around them, so
+    iter_blocks, find_longest_dead_end and bounding_box take time in the number of placed blocks, not the volume
+
+    Levels can be saved to a versioned binary file and loaded again (see to_bytes). A level loaded with use_mmap reads
+    its cells straight from the file and is read only: the block queries work, but it can't be placed into or used for
+    generation. Use from_bytes(lvl.to_bytes()) to get an editable copy
+    """
 
     def __init__(self, size=MINIMUM_SIZE):
         """
@@ -30,8 +76,55 @@ class Level(object):
         :param size: The X, Y, and Z size of the level in blocks
         """
         self.size = size
-        self._lvl = [[[blocks.EmptyBlock() for k in range(size[Z])] for j in range(size[Y])] for i in range(size[X])]
         self.length = 0
+        self.seed = None  # Seed of the generator that made the level. None if unknown
+        self.settings = None  # Dict of settings (see LevelGenerator.get_settings) that made the level. None if unknown
+        self._mapping = None  # The mmap the cells are read from if loaded with use_mmap, else None
+        volume = size[X] * size[Y] * size[Z]
+        self._cells = array.array("B", [EMPTY_CODE]) * volume  # Packed block type and orientation
+        self._lengths = array.array("i", [-1]) * volume  # Path length of each block
+        self._source_ids = array.array("H", [0]) * volume  # Index into self._sources
+        self._sources = [(None, blocks.DEFAULT_WEIGHT)]  # (pth, weight) of placed blocks. 0 is for empty blocks
+        self._source_lookup = {self._sources[0]: 0}  # Reverse of self._sources
+        self._inbound = array.array("B", [0]) * volume  # Socket bits of neighbors that connect to each cell
+        self._required = array.array("B", [0]) * volume  # Socket bits of inbound neighbors that are not ramps
+        self._forbidden = array.array("B", [0]) * volume  # Socket bits of filled neighbors that don't connect
+        self._pred_lengths = array.array("i", [-1]) * volume  # Shortest length of the inbound neighbors. -1 if none
+        self._journal = None  # Old (pos, code, length, source_id) of changed cells for rollback. None if off
+        self._occupied = dict((block_type, set()) for block_type in blocks.BLOCK_TYPES  # Indices of filled cells
+                              if block_type != blocks.BlockType.EMPTY)
+        self._dead_ends = [][:]  # Heap of (-length, pos) of placed dead ends. Replaced ones are skipped on lookup
+        self._box = None  # Lists of the lowest and highest X, Y and Z of the filled cells. None if empty
+        self._box_stale = False  # Whether a cell was emptied since self._box was made
+        self._edges = [[0] * size[coord] for coord in [X, Y, Z]]  # Socket bits that leave the level, per coordinate
+        for bit, offset in enumerate(blocks.SOCKET_OFFSETS):
+            for coord in [X, Y, Z]:
+                for i in range(size[coord]):
+                    if not 0 <= i + offset[coord] < size[coord]:
+                        self._edges[coord][i] |= 1 << bit
+
+    def _index(self, pos):
+        """
+        Returns the index of a position in the flat cell arrays. X changes fastest, then Z, then Y
+        :param pos: The (X,Y,Z) position
+        :return: The index
+        """
+        return pos[X] + self.size[X] * (pos[Z] + self.size[Z] * pos[Y])
+
+    def _source_id(self, pth, weight):
+        """
+        Returns the index of a (path, weight) source, adding it to the table if needed
+        :param pth: The block's path
+        :param weight: The block's weight
+        :return: The index into self._sources
+        """
+        key = (pth, weight)
+        source_id = self._source_lookup.get(key)
+        if source_id is None:
+            source_id = len(self._sources)
+            self._sources.append(key)
+            self._source_lookup[key] = source_id
+        return source_id
 
     def is_valid(self, pos):
         """
@@ -39,11 +132,7 @@ class Level(object):
         :param pos: The (X,Y,Z) position
         :return: True if valid else False
         """
-        ret = True
-        for coord in [X,Y,Z]:
-            if pos[coord] < 0 or pos[coord] >= self.size[coord]:
-                ret = False
-        return ret
+        return 0 <= pos[X] < self.size[X] and 0 <= pos[Y] < self.size[Y] and 0 <= pos[Z] < self.size[Z]
 
     def is_empty(self, pos):
         """
@@ -53,72 +142,697 @@ class Level(object):
         """
         if not self.is_valid(pos):
             return None
-        if self._lvl[pos[X]][pos[Y]][pos[Z]].block_type == blocks.BlockType.EMPTY:
-            return True
+        return self._cells[self._index(pos)] == EMPTY_CODE
 
-    def place_block(self, block, pos):
+    def place_block(self, block, pos, length=None):
         """
         Place a block in the level
-        :param block: The block object to place
+        :param block: The block object or blocks.BlockPrototype to place
         :param pos: The position (X,Y,Z) in which to place it
+        :param length: The path length of the block. None means use the block's length
         :return: True if place was successful else False
         """
+        if self._mapping is not None:
+            raise ValueError("Memory mapped levels are read only")
         if self.is_valid(pos):
-            self._lvl[pos[X]][pos[Y]][pos[Z]] = block
+            if block.block_type == blocks.BlockType.EMPTY:
+                code = EMPTY_CODE  # Orientation of empty blocks is unused
+            else:
+                code = blocks.cell_code(block.block_type, block.orientation)
+            self._set_cell(pos, code, block.length if length is None else length,
+                           self._source_id(block.pth, block.weight))
             return True
         else:
             return False
 
+    def _set_cell(self, pos, code, length, source_id):
+        """
+        Sets every array for a cell and updates the socket masks of its neighbors
+        :param pos: The valid (X,Y,Z) position of the cell
+        :param code: The cell code
+        :param length: The path length
+        :param source_id: The index into self._sources
+        :return: None
+        """
+        idx = self._index(pos)
+        old_code = self._cells[idx]
+        if self._journal is not None:
+            self._journal.append((pos, old_code, self._lengths[idx], self._source_ids[idx]))
+        self._cells[idx] = code
+        self._lengths[idx] = length
+        self._source_ids[idx] = source_id
+        self._update_occupancy(idx, pos, old_code, code, length)
+
+        # This cell is in socket bit of each neighbor at pos - offset
+        exit_mask = blocks.EXIT_MASKS_BY_CODE[code]
+        is_ramp = blocks.cell_block_type(code) == blocks.BlockType.RAMP
+        for bit, offset in enumerate(blocks.SOCKET_OFFSETS):
+            spot = (pos[X] - offset[X], pos[Y] - offset[Y], pos[Z] - offset[Z])
+            if not self.is_valid(spot):
+                continue
+            spot_idx = self._index(spot)
+            mask = 1 << bit
+            self._inbound[spot_idx] &= ~mask
+            self._required[spot_idx] &= ~mask
+            self._forbidden[spot_idx] &= ~mask
+            if code != EMPTY_CODE:
+                if exit_mask & SOCKET_BACK_BITS[bit]:
+                    self._inbound[spot_idx] |= mask
+                    if not is_ramp:
+                        self._required[spot_idx] |= mask
+                else:
+                    self._forbidden[spot_idx] |= mask
+            self._pred_lengths[spot_idx] = self._shortest_inbound_length(spot, self._inbound[spot_idx])
+
+    def _update_occupancy(self, idx, pos, old_code, code, length):
+        """
+        Updates the index of filled cells after a cell changes
+        :param idx: The index of the cell
+        :param pos: The (X,Y,Z) position of the cell
+        :param old_code: The cell code before the change
+        :param code: The cell code after the change
+        :param length: The path length after the change
+        :return: None
+        """
+        if old_code != EMPTY_CODE:
+            self._occupied[blocks.cell_block_type(old_code)].discard(idx)
+            if code == EMPTY_CODE:
+                self._box_stale = True
+        if code != EMPTY_CODE:
+            block_type = blocks.cell_block_type(code)
+            self._occupied[block_type].add(idx)
+            if block_type == blocks.BlockType.DEAD_END:
+                heapq.heappush(self._dead_ends, (-length, pos))
+            self._grow_box(pos)
+
+    def _grow_box(self, pos):
+        """
+        Grows the box around the filled cells to hold a position
+        :param pos: The (X,Y,Z) position
+        :return: None
+        """
+        if self._box is None:
+            self._box = (list(pos), list(pos))
+            return
+        low, high = self._box
+        for coord in [X, Y, Z]:
+            if pos[coord] < low[coord]:
+                low[coord] = pos[coord]
+            elif pos[coord] > high[coord]:
+                high[coord] = pos[coord]
+
+    def _ensure_occupancy(self):
+        """
+        Builds the index of filled cells if the level was loaded without one (see load)
+        :return: None
+        """
+        if self._occupied is not None:
+            return
+        self._occupied = dict((block_type, set()) for block_type in blocks.BLOCK_TYPES
+                              if block_type != blocks.BlockType.EMPTY)
+        self._dead_ends = [][:]
+        self._box = None
+        self._box_stale = False
+        for idx, code in enumerate(self._cells):
+            if code != EMPTY_CODE:
+                self._update_occupancy(idx, self._position(idx), EMPTY_CODE, code, self._lengths[idx])
+
+    def _shortest_inbound_length(self, pos, mask):
+        """
+        Returns the shortest length of the inbound neighbors of a cell within a mask
+        :param pos: The (X,Y,Z) position of the cell
+        :param mask: The socket bits of the inbound neighbors to check
+        :return: The length. -1 if no neighbor in the mask
+        """
+        ret = -1
+        for bit, offset in enumerate(blocks.SOCKET_OFFSETS):
+            if mask & (1 << bit):
+                length = self._lengths[self._index((pos[X] + offset[X], pos[Y] + offset[Y], pos[Z] + offset[Z]))]
+                if ret == -1 or length < ret:
+                    ret = length
+        return ret
+
+    def start_journal(self):
+        """Starts recording cell changes so they can be rolled back"""
+        self._journal = [][:]
+
+    def stop_journal(self):
+        """Stops recording cell changes and forgets the recorded ones"""
+        self._journal = None
+
+    def checkpoint(self):
+        """
+        Returns a checkpoint for rollback. The journal must be started
+        :return: The checkpoint
+        """
+        return len(self._journal)
+
+    def rollback(self, checkpoint):
+        """
+        Undoes every cell change made since a checkpoint. The length attribute is not changed
+        :param checkpoint: The checkpoint
+        :return: None
+        """
+        journal = self._journal
+        self._journal = None  # Don't record the undoing
+        while len(journal) > checkpoint:
+            self._set_cell(*journal.pop())
+        self._journal = journal
+
+    def get_predecessor_length(self, pos, exit_mask=None):
+        """
+        Returns the shortest length of the blocks that connect to a cell, which is the length of the block a new block
+        there would follow
+        :param pos: The (X,Y,Z) position
+        :param exit_mask: Only count neighbors in these socket bits, such as a block's exit mask. None means all
+        :return: The length, or None if no neighbors connect
+        """
+        idx = self._index(pos)
+        inbound = self._inbound[idx]
+        if exit_mask is None or not inbound & ~exit_mask:
+            ret = self._pred_lengths[idx]
+        else:
+            ret = self._shortest_inbound_length(pos, inbound & exit_mask)  # Rare, skips a ramp that connects
+        return ret if ret != -1 else None
+
+    def distance_at(self, pos):
+        """
+        Returns the shortest path length from the start block to a position
+        :param pos: The (X,Y,Z) position
+        :return: The length of the block there, or for an empty cell the length a block connected to it would have.
+            None if invalid or nothing reaches it
+        """
+        if not self.is_valid(pos):
+            return None
+        idx = self._index(pos)
+        if self._cells[idx] != EMPTY_CODE:
+            return self._lengths[idx]
+        return self._pred_lengths[idx] + 1 if self._pred_lengths[idx] != -1 else None
+
+    def get_sockets(self, pos):
+        """
+        Returns the socket masks of a cell. A block fits if its exit mask has no forbidden bits, has at least one
+        inbound bit, and has every required bit
+        :param pos: The (X,Y,Z) position
+        :return: Tuple of the inbound, required and forbidden masks. Forbidden includes sockets leaving the level
+        """
+        idx = self._index(pos)
+        edges = self._edges[X][pos[X]] | self._edges[Y][pos[Y]] | self._edges[Z][pos[Z]]
+        return self._inbound[idx], self._required[idx], self._forbidden[idx] | edges
+
     def get_block(self, pos):
         """
         Returns the block at a position
         :param pos: The position (X,Y,Z) of the block
         :return: The block
         """
-        return self._lvl[pos[X]][pos[Y]][pos[Z]]
+        idx = self._index(pos)
+        code = self._cells[idx]
+        pth, weight = self._sources[self._source_ids[idx]]
+        blk = blocks.make_block(blocks.cell_block_type(code), pth=pth, weight=weight,
+                                orientation=blocks.cell_orientation(code))
+        blk.length = self._lengths[idx]
+        return blk
+
+    def get_block_type(self, pos):
+        """
+        Returns the type of the block at a position without making the block
+        :param pos: The position (X,Y,Z) of the block
+        :return: The BlockType
+        """
+        return blocks.cell_block_type(self._cells[self._index(pos)])
+
+    def get_length(self, pos):
+        """
+        Returns the path length of the block at a position without making the block
+        :param pos: The position (X,Y,Z) of the block
+        :return: The length. -1 for empty blocks
+        """
+        return self._lengths[self._index(pos)]
+
+    def adjacent(self, pos):
+        """
+        Returns all positions the block at a position connects to, without making the block
+        :param pos: The position (X,Y,Z) of the block
+        :return: List of adjacent positions
+        """
+        return blocks.apply_offsets(pos, blocks.ADJACENT_OFFSETS_BY_CODE[self._cells[self._index(pos)]])
+
+    def iter_positions(self, types=None):
+        """
+        Returns the positions of the filled cells, in the order they are stored (X changes fastest, then Z, then Y)
+        :param types: The BlockTypes to include. None means every type but empty
+        :return: Iterator of (X,Y,Z) positions
+        """
+        self._ensure_occupancy()
+        if types is None:
+            types = self._occupied.keys()
+        indices = [][:]
+        for block_type in types:
+            indices.extend(self._occupied.get(block_type, ()))
+        for idx in sorted(indices):
+            yield self._position(idx)
+
+    def iter_blocks(self, types=None):
+        """
+        Returns the filled cells and their blocks, in the order they are stored (X changes fastest, then Z, then Y)
+        :param types: The BlockTypes to include. None means every type but empty
+        :return: Iterator of tuples of the (X,Y,Z) position and the block
+        """
+        for pos in self.iter_positions(types):
+            yield pos, self.get_block(pos)
+
+    def count_blocks(self, types=None):
+        """
+        Returns the number of filled cells
+        :param types: The BlockTypes to include. None means every type but empty
+        :return: The number of cells
+        """
+        self._ensure_occupancy()
+        if types is None:
+            types = self._occupied.keys()
+        return sum(len(self._occupied.get(block_type, ())) for block_type in types)
+
+    def diff(self, other, types=None):
+        """
+        Returns the positions whose blocks differ between this level and another of the same size. Blocks differ if
+        their type, orientation or path differ. Lengths and weights are not compared
+        :param other: The other Level
+        :param types: Only compare blocks of these BlockTypes, as if the others were empty. None means every type but
+            empty
+        :return: List of (X,Y,Z) positions, in the order they are stored
+        """
+        if tuple(self.size) != tuple(other.size):
+            raise ValueError("Can't compare levels of different sizes")
+        self._ensure_occupancy()
+        other._ensure_occupancy()
+        types = set(self._occupied.keys() if types is None else types)
+        indices = set()
+        for block_type in types:
+            indices.update(self._occupied.get(block_type, ()))
+            indices.update(other._occupied.get(block_type, ()))
+        return [self._position(idx) for idx in sorted(indices)
+                if self._cell_key(idx, types) != other._cell_key(idx, types)]
+
+    def _cell_key(self, idx, types):
+        """
+        Returns what is compared by diff for a cell
+        :param idx: The index of the cell
+        :param types: The BlockTypes that are compared
+        :return: Tuple of the cell code and path, or None if the block isn't one of the types
+        """
+        code = self._cells[idx]
+        if blocks.cell_block_type(code) not in types:
+            return None
+        return code, self._sources[self._source_ids[idx]][0]
 
     def find_longest_dead_end(self):
         """
-        Returns the position of the longest dead end or None if there are no dead ends
+        Returns the position of the longest dead end or None if there are no dead ends. Ties go to the first position in
+        (X,Y,Z) order
         :return: The (X,Y,Z) position of the longest dead end
         """
-        max_len = -1
-        max_pos = None
-        for i in range(self.size[X]):
-            for j in range(self.size[Y]):
-                for k in range(self.size[Z]):
-                    blk = self.get_block((i, j, k))
-                    if blk.block_type == blocks.BlockType.DEAD_END:
-                        if blk.length > max_len:
-                            max_pos = (i, j, k)
-                            max_len = blk.length
-        return max_pos
+        self._ensure_occupancy()
+        while len(self._dead_ends) > 0:
+            neg_length, pos = self._dead_ends[0]
+            idx = self._index(pos)
+            if (blocks.cell_block_type(self._cells[idx]) == blocks.BlockType.DEAD_END
+                    and self._lengths[idx] == -neg_length):
+                return pos
+            heapq.heappop(self._dead_ends)  # Replaced since it was pushed
+        return None
+
+    def _position(self, idx):
+        """
+        Returns the position of an index in the flat cell arrays
+        :param idx: The index
+        :return: The (X,Y,Z) position
+        """
+        row, i = divmod(idx, self.size[X])
+        j, k = divmod(row, self.size[Z])
+        return i, j, k
+
+    def to_bytes(self):
+        """
+        Packs the level into a compact byte string. Everything is little endian:
+            - header (see LEVEL_HEADER) with the magic, version, size, length and table sizes
+            - UTF-8 JSON metadata with the seed and generator settings
+            - the (path, weight) source table, each a SOURCE_HEADER and the path bytes
+            - the cell code, length and source index arrays, each starting on a multiple of ARRAY_ALIGNMENT
+        :return: The bytes
+        """
+        import json  # Imported here so importing the module stays fast
+
+        # Seeds that aren't JSON values are kept as strings
+        metadata = json.dumps({"seed": self.seed, "settings": self.settings}, sort_keys=True, default=str)
+        metadata = metadata.encode("utf-8")
+        parts = [LEVEL_HEADER.pack(LEVEL_MAGIC, LEVEL_VERSION, 0, self.size[X], self.size[Y], self.size[Z],
+                                   self.length, len(self._sources), len(metadata)), metadata]
+        offset = LEVEL_HEADER.size + len(metadata)
+        for pth, weight in self._sources:
+            pth_bytes = pth.encode("utf-8") if pth is not None else b""
+            parts.append(SOURCE_HEADER.pack(weight, len(pth_bytes) if pth is not None else NO_PATH))
+            parts.append(pth_bytes)
+            offset += SOURCE_HEADER.size + len(pth_bytes)
+        for arr in [self._cells, self._lengths, self._source_ids]:
+            padding = -offset % ARRAY_ALIGNMENT
+            arr_bytes = array_to_bytes(arr)
+            parts.append(b"\0" * padding)
+            parts.append(arr_bytes)
+            offset += padding + len(arr_bytes)
+        return b"".join(parts)
+
+    @classmethod
+    def _read_header(cls, data):
+        """
+        Reads everything before the cell arrays of a packed level and makes a level to fill in
+        :param data: The bytes, or anything struct can unpack from such as an mmap
+        :return: Tuple of the Level without cells and the offset of each cell array
+        """
+        import json  # Imported here so importing the module stays fast
+
+        magic, version, _, size_x, size_y, size_z, length, source_count, metadata_len = \
+            LEVEL_HEADER.unpack_from(data, 0)
+        if magic != LEVEL_MAGIC:
+            raise ValueError("Not a packed level")
+        if version != LEVEL_VERSION:
+            raise ValueError("Unsupported packed level version {}".format(version))
+        offset = LEVEL_HEADER.size
+        metadata = json.loads(data[offset:offset + metadata_len].decode("utf-8"))
+        offset += metadata_len
+
+        lvl = cls.__new__(cls)  # The cell arrays are read or mapped by the caller
+        lvl.size = (size_x, size_y, size_z)
+        lvl.length = length
+        lvl.seed = metadata["seed"]
+        lvl.settings = metadata["settings"]
+        lvl._mapping = None
+        lvl._journal = None
+        lvl._occupied = None  # Built when first needed
+        lvl._sources = [][:]
+        for _ in range(source_count):
+            weight, pth_len = SOURCE_HEADER.unpack_from(data, offset)
+            offset += SOURCE_HEADER.size
+            if pth_len == NO_PATH:
+                pth = None
+            else:
+                pth = data[offset:offset + pth_len].decode("utf-8")
+                offset += pth_len
+            lvl._sources.append((pth, weight))
+        lvl._source_lookup = dict((source, i) for i, source in enumerate(lvl._sources))
+
+        volume = size_x * size_y * size_z
+        offsets = [][:]
+        for typecode in ["B", "i", "H"]:
+            offset += -offset % ARRAY_ALIGNMENT
+            offsets.append(offset)
+            offset += array.array(typecode).itemsize * volume
+        if offset > len(data):
+            raise ValueError("Packed level is truncated")
+        return lvl, offsets
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Unpacks a level made by to_bytes
+        :param data: The bytes
+        :return: The Level
+        """
+        header, offsets = cls._read_header(data)
+        lvl = cls(size=header.size)
+        lvl.length = header.length
+        lvl.seed = header.seed
+        lvl.settings = header.settings
+        lvl._sources = header._sources
+        lvl._source_lookup = header._source_lookup
+
+        # Read the arrays, then place every filled cell so the socket masks and lengths are rebuilt
+        arrays = [][:]
+        for arr, offset in zip([lvl._cells, lvl._lengths, lvl._source_ids], offsets):
+            arrays.append(array_from_bytes(arr.typecode, data[offset:offset + arr.itemsize * len(arr)]))
+        cells, lengths, source_ids = arrays
+        for idx, code in enumerate(cells):
+            if code != EMPTY_CODE:
+                lvl._set_cell(lvl._position(idx), code, lengths[idx], source_ids[idx])
+        return lvl
+
+    def save(self, pth):
+        """
+        Saves the level to a file in the format of to_bytes
+        :param pth: The path of the file
+        :return: None
+        """
+        with open(pth, "wb") as level_file:
+            level_file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, pth, use_mmap=False):
+        """
+        Loads a level saved by save
+        :param pth: The path of the file
+        :param use_mmap: Whether to memory map the file and read cells from it as needed instead of reading it all.
+            The level is read only and keeps the file open until close is called. Falls back to reading the file
+            where the arrays can't be used in place (Python 2 and big endian machines)
+        :return: The Level
+        """
+        with open(pth, "rb") as level_file:
+            if not use_mmap:
+                return cls.from_bytes(level_file.read())
+            import mmap  # Imported here so importing the module stays fast
+            mapping = mmap.mmap(level_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if sys.byteorder == "big" or not hasattr(memoryview, "cast"):
+            try:
+                return cls.from_bytes(mapping[:])
+            finally:
+                mapping.close()
+
+        try:
+            lvl, offsets = cls._read_header(mapping)
+        except ValueError:
+            mapping.close()
+            raise
+        lvl._mapping = mapping
+        view = memoryview(mapping)
+        volume = lvl.size[X] * lvl.size[Y] * lvl.size[Z]
+        arrays = [][:]
+        for typecode, offset in zip(["B", "i", "H"], offsets):
+            arrays.append(view[offset:offset + array.array(typecode).itemsize * volume].cast(typecode))
+        view.release()
+        lvl._cells, lvl._lengths, lvl._source_ids = arrays
+        lvl._inbound = lvl._required = lvl._forbidden = lvl._pred_lengths = lvl._edges = None  # Read only
+        return lvl
+
+    def close(self):
+        """
+        Closes the file of a level loaded with use_mmap. The level can't be used afterwards. Does nothing for other
+        levels
+        :return: None
+        """
+        if self._mapping is not None:
+            for arr in [self._cells, self._lengths, self._source_ids]:
+                arr.release()
+            self._mapping.close()
+            self._mapping = None
+
+    def __enter__(self):
+        """Lets a loaded level be used in a with statement that closes it"""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Closes the level at the end of a with statement"""
+        self.close()
+
+    def _row_bytes(self, layer, row, start=0, stop=None):
+        """
+        Returns the cell codes of part of a row of the level
+        :param layer: The Y position of the row
+        :param row: The Z position of the row
+        :param start: The first X position
+        :param stop: The X position after the last. None means the end of the row
+        :return: The cell codes as bytes, one per cell
+        """
+        idx = self._index((0, layer, row))
+        stop = self.size[X] if stop is None else stop
+        return array_to_bytes(self._cells[idx + start:idx + stop])
+
+    def bounding_box(self):
+        """
+        Returns the smallest box holding every filled cell
+        :return: Tuple of the lowest and highest (X,Y,Z) positions, or None if the level is empty
+        """
+        self._ensure_occupancy()
+        if self._box_stale:
+            self._box = None
+            self._box_stale = False
+            for pos in self.iter_positions():
+                self._grow_box(pos)
+        return (tuple(self._box[0]), tuple(self._box[1])) if self._box is not None else None
+
+    def _text_layers(self, crop=False):
+        """
+        Returns the text of each layer, top layer first. Rows are turned into text with one bytes.translate
+        :param crop: Whether to only show the bounding box of the filled cells
+        :return: Iterator of lists of lines, one list per layer
+        """
+        if crop:
+            box = self.bounding_box()
+            if box is None:
+                return
+            low, high = box
+        else:
+            low, high = (0, 0, 0), (self.size[X] - 1, self.size[Y] - 1, self.size[Z] - 1)
+        border = "."*(high[X] - low[X] + 3)  # Level border
+
+        for layer in reversed(range(low[Y], high[Y] + 1)):
+            lines = ["Layer {}:".format(layer), border]
+            for row in range(low[Z], high[Z] + 1):
+                glyphs = self._row_bytes(layer, row, low[X], high[X] + 1).translate(GLYPH_TABLE)
+                lines.append("." + glyphs.decode("ascii") + ".")
+            lines.append(border)
+            lines.append("")
+            yield lines
+
+    def write_text(self, text_file, crop=False):
+        """
+        Writes the text of str(level) to a file one layer at a time, without making the whole string
+        :param text_file: The file object, opened for text
+        :param crop: Whether to only show the bounding box of the filled cells
+        :return: None
+        """
+        for i, lines in enumerate(self._text_layers(crop)):
+            if i > 0:
+                text_file.write("\n")
+            text_file.write("\n".join(lines))
 
     def __str__(self):
         """
         Print representation of this level in layers
         :return: String representation of this level
         """
-        tmp = []
-        for layer in reversed(range(self.size[Y])):
-            # Print each layer
-            tmp.append("Layer {}:".format(layer))
-            tmp.append("."*(self.size[X] + 2))  # Level border
+        return "\n".join(line for lines in self._text_layers() for line in lines)
 
-            for row in range(self.size[Z]):
-                # Print each row
-                rowtxt = "."
 
-                for cell in range(self.size[X]):
-                    rowtxt += str(self._lvl[cell][layer][row])
+class Frontier(object):
+    """Positions waiting for a block. Part of the Controller
 
-                rowtxt += "."
-                tmp.append(rowtxt)
+    Keeps the positions in a list plus a position to index dict, so adding, checking membership and removing a random
+    position are all O(1). Removal swaps the chosen position with the last one before popping
+    """
 
-            tmp.append("."*(self.size[X] + 2))  # Level border
-            tmp.append("")
+    def __init__(self, positions=()):
+        """
+        Creates the frontier
+        :param positions: The (X,Y,Z) positions to start with
+        """
+        self._positions = [][:]
+        self._indices = dict()
+        self._journal = None  # (index, position) of pops and (None, position) of adds for rollback. None if off
+        for pos in positions:
+            self.add(pos)
+
+    def __len__(self):
+        return len(self._positions)
 
-        return "\n".join(tmp)
+    def __contains__(self, pos):
+        return pos in self._indices
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def add(self, pos):
+        """
+        Adds a position if it is not already in the frontier
+        :param pos: The (X,Y,Z) position
+        :return: True if added else False
+        """
+        if pos in self._indices:
+            return False
+        self._indices[pos] = len(self._positions)
+        self._positions.append(pos)
+        if self._journal is not None:
+            self._journal.append((None, pos))
+        return True
+
+    def pop_random(self, rng=random):
+        """
+        Removes and returns a uniformly random position
+        :param rng: The random number generator to use
+        :return: The (X,Y,Z) position
+        """
+        return self._pop_index(rng.randrange(len(self._positions)))
+
+    def pop_best_of(self, rng, count, key):
+        """
+        Removes and returns the best of a few uniformly random positions, which biases the choice toward high keys
+        while staying O(count)
+        :param rng: The random number generator to use
+        :param count: The number of positions to sample, with replacement
+        :param key: Function giving the score of a position
+        :return: The (X,Y,Z) position
+        """
+        best_idx = None
+        best_score = None
+        for _ in range(count):
+            idx = rng.randrange(len(self._positions))
+            score = key(self._positions[idx])
+            if best_idx is None or score > best_score:
+                best_idx = idx
+                best_score = score
+        return self._pop_index(best_idx)
+
+    def _pop_index(self, idx):
+        """
+        Removes and returns the position at an index of the list
+        :param idx: The index
+        :return: The (X,Y,Z) position
+        """
+        pos = self._positions[idx]
+        last = self._positions.pop()
+        if last != pos:
+            # Move the last position into the hole
+            self._positions[idx] = last
+            self._indices[last] = idx
+        del self._indices[pos]
+        if self._journal is not None:
+            self._journal.append((idx, pos))
+        return pos
+
+    def start_journal(self):
+        """Starts recording changes so they can be rolled back"""
+        self._journal = [][:]
+
+    def stop_journal(self):
+        """Stops recording changes and forgets the recorded ones"""
+        self._journal = None
+
+    def checkpoint(self):
+        """
+        Returns a checkpoint for rollback. The journal must be started
+        :return: The checkpoint
+        """
+        return len(self._journal)
+
+    def rollback(self, checkpoint):
+        """
+        Undoes every change made since a checkpoint, restoring the exact order of the positions
+        :param checkpoint: The checkpoint
+        :return: None
+        """
+        while len(self._journal) > checkpoint:
+            idx, pos = self._journal.pop()
+            if idx is None:
+                # Undo an add, which is always the last position
+                del self._indices[self._positions.pop()]
+            else:
+                # Undo a pop by moving the position that filled the hole back to the end
+                if idx < len(self._positions):
+                    moved = self._positions[idx]
+                    self._indices[moved] = len(self._positions)
+                    self._positions.append(moved)
+                    self._positions[idx] = pos
+                else:
+                    self._positions.append(pos)
+                self._indices[pos] = idx
 
 
 class CannotGenerateLevelError(Exception):
@@ -126,10 +840,120 @@ class CannotGenerateLevelError(Exception):
     pass
 
 
+class GenerationCancelledError(Exception):
+    """Represents a level generation stopped by its CancellationToken"""
+    pass
+
+
+class CancellationToken(object):
+    """Lets another thread stop a level generation in progress. Part of the Controller
+
+    The generator checks the token before every placement, so a cancelled generation stops within one step and
+    raises GenerationCancelledError. Setting a flag is atomic in Python, so no lock is needed
+    """
+
+    def __init__(self):
+        """Creates a token that isn't cancelled"""
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Asks the generation using the token to stop
+        :return: None
+        """
+        self.cancelled = True
+
+    def check(self):
+        """
+        Raises GenerationCancelledError if the token was cancelled
+        :return: None
+        """
+        if self.cancelled:
+            raise GenerationCancelledError("Level generation was cancelled")
+
+
+class GeneratedLevel(namedtuple("GeneratedLevel", ("index", "seed", "data", "error"))):
+    """One level of a batch from LevelGenerator.generate_many. Part of the Model
+
+    data is the packed level from Level.to_bytes, or None if the level could not be generated, in which case error is
+    the reason. Setting a generator's seed to seed makes the same level again
+    """
+    __slots__ = ()
+
+    def load(self):
+        """
+        Unpacks the level
+        :return: The Level, or None if the level could not be generated
+        """
+        return Level.from_bytes(self.data) if self.data is not None else None
+
+
+class GenerationState(object):
+    """A level partway through generation and everything needed to take the next step. Part of the Controller"""
+
+    def __init__(self, lvl, rng, remaining_spots, end_files):
+        """
+        Creates the state. The block prototype lists are filled in by the generator
+        :param lvl: The Level so far
+        :param rng: The random number generator
+        :param remaining_spots: The Frontier of spots waiting for a block
+        :param end_files: The list of end BlockFiles, for replacing a dead end if no end was placed
+        """
+        self.lvl = lvl
+        self.rng = rng
+        self.remaining_spots = remaining_spots
+        self.end_files = end_files
+        self.start_blocks = [][:]
+        self.end_blocks = [][:]
+        self.dead_end_blocks = [][:]
+        self.other_blocks = [][:]
+        self.placed_start = False
+        self.placed_end = False
+        self.longest = 0  # Longest length placed so far
+
+    def start_journal(self):
+        """Starts recording changes so they can be rolled back"""
+        self.lvl.start_journal()
+        self.remaining_spots.start_journal()
+
+    def stop_journal(self):
+        """Stops recording changes"""
+        self.lvl.stop_journal()
+        self.remaining_spots.stop_journal()
+
+    def checkpoint(self):
+        """
+        Returns a checkpoint for rollback. The journal must be started
+        :return: The checkpoint
+        """
+        return (self.lvl.checkpoint(), self.remaining_spots.checkpoint(), self.placed_start, self.placed_end,
+                self.lvl.length, self.longest)
+
+    def rollback(self, checkpoint):
+        """
+        Undoes every change made since a checkpoint
+        :param checkpoint: The checkpoint
+        :return: None
+        """
+        lvl_checkpoint, spots_checkpoint, self.placed_start, self.placed_end, self.lvl.length, self.longest = checkpoint
+        self.lvl.rollback(lvl_checkpoint)
+        self.remaining_spots.rollback(spots_checkpoint)
+
+
+class GenerationResult(namedtuple("GenerationResult", ("level", "seed", "attempts", "backtracks"))):
+    """Result of LevelGenerator.generate_with_retries. Part of the Model
+
+    seed is the seed of the attempt that made the level, attempts is the number of fresh starts used and backtracks is
+    the total number of backtracks over every attempt
+    """
+    __slots__ = ()
+
+
 class LevelGenerator(object):
     """Generates a level based on settings given. This is the Controller"""
 
-    def __init__(self, block_list, size=MINIMUM_SIZE, minimum_length=None, maximum_length=None, seed=None):
+    def __init__(self, block_list, size=MINIMUM_SIZE, minimum_length=None, maximum_length=None, seed=None,
+                 steer_to_minimum=False):
         """
         Creates a generator with the given settings. Settings can be changed later
         :param block_list: List of BlockFiles allowed in level generation. At least one start and end block must be
@@ -139,12 +963,44 @@ class LevelGenerator(object):
             suggestion - if forced, the program may have to end the level early
         :param maximum_length: The maximum length from start to finish. None means no maximum length
         :param seed: The seed for the random number generator. None means use a random seed
+        :param steer_to_minimum: Whether to steer generation toward reaching the minimum length. Until a block that
+            could be followed by an end of the minimum length is placed, the next spot is the farthest from the start
+            of a few random remaining spots, and non-branching blocks that follow walls are preferred there
         """
         self.block_list = block_list
         self.size = size
         self.minimum_length = minimum_length
         self.maximum_length = maximum_length
         self.seed = seed
+        self.steer_to_minimum = steer_to_minimum
+        self._sampler = sampling.WeightedSampler()  # Caches alias tables between choices and levels
+
+    def get_settings(self):
+        """
+        Returns the settings other than the seed as plain, picklable data, such as for sending to another process
+        :return: Dict of the settings
+        """
+        return {
+            "block_list": [(blockf.pth, blockf.block_type.value, blockf.weight) for blockf in self.block_list],
+            "size": tuple(self.size),
+            "minimum_length": self.minimum_length,
+            "maximum_length": self.maximum_length,
+            "steer_to_minimum": self.steer_to_minimum,
+        }
+
+    @classmethod
+    def from_settings(cls, settings, seed=None):
+        """
+        Creates a generator from settings made by get_settings
+        :param settings: Dict of the settings
+        :param seed: The seed for the random number generator
+        :return: The LevelGenerator
+        """
+        block_list = [blocks.BlockFile(pth, blocks.BLOCK_TYPES[block_type], weight=weight)
+                      for pth, block_type, weight in settings["block_list"]]
+        return cls(block_list, size=tuple(settings["size"]), minimum_length=settings["minimum_length"],
+                   maximum_length=settings["maximum_length"], seed=seed,
+                   steer_to_minimum=settings.get("steer_to_minimum", False))
 
     def check_size(self):
         """
@@ -156,250 +1012,220 @@ class LevelGenerator(object):
                 return False
         return True
 
-    def _check_all_pos(self, current_pos, lvl):
+    def _evaluate_candidates(self, current_pos, lvl, candidates, end_candidates, other_spots):
         """
-        Filter that makes sure all adjacent blocks are valid
-        :param current_pos: The block's position
+        Checks candidate blocks at a spot in a single pass. Each candidate's neighbors and the length of the block it
+        would follow are found once, then the checks run cheapest first and stop at the first failure:
+        1. All adjacent spots must be in the level
+        2. Adjacent blocks must be mutually adjacent, at least one must exist, and any block (other than a ramp) that
+           expects to connect to this spot must be connected to
+        3. End blocks need the minimum length reached (dead ends are OK if there are other spots) and other blocks need
+           the maximum length not reached
+        4. Ramps need an empty spot above them, not pending for some other block, and an empty spot past the top
+        :param current_pos: The spot's position
         :param lvl: The level
-        :return: The filter
+        :param candidates: The block prototypes to check with every rule
+        :param end_candidates: The end block prototypes to check without the length rules, used to force the end of
+            the level if no candidate is valid
+        :param other_spots: Frontier of other spots besides this one
+        :return: A tuple of the list of valid candidates and the list of valid forced end candidates
         """
-        def inner_filter(block):
-            for pos in block.adjacent(current_pos):
-                if not lvl.is_valid(pos):
-                    return False
-            return True
-        return inner_filter
+        # Masks of the blocks around this spot and the shortest length of those that connect to it
+        inbound, required, forbidden = lvl.get_sockets(current_pos)
+        pred_len = lvl.get_predecessor_length(current_pos)
 
-    def _get_connected_block_list(self, block, current_pos, lvl):
-        """
-        Returns a list of the blocks connected to the current block
-        :param block: The block to check
-        :param current_pos: The block's position
-        :param lvl: The level
-        :return: The list of connected blocks
-        """
-        spots = block.adjacent(current_pos)
-        spots = filter(lvl.is_valid, spots)
-        blist = [][:]
-        for spot in spots:
-            if not lvl.is_empty(spot):
-                blk = lvl.get_block(spot)
-                if current_pos in blk.adjacent(spot):
-                    # That block is adjacent to this and visa versa, therefore mutually adjacent
-                    blist.append(blk)
-        return blist
-
-    def _check_min_length(self, current_pos, lvl, other_spots):
-        """
-        Filter that checks the minimum length based on the adjacent blocks
-        :param current_pos: The block's position
-        :param lvl: The level
-        :param other_spots: Whether there are other spots. If so, dead ends are OK
-        :return: The filter
-        """
-        def inner_filter(block):
-            if block.block_type != blocks.BlockType.END and block.block_type != blocks.BlockType.DEAD_END:
-                return True  # Don't filter non-end blocks based off of minimum length
-            if other_spots and block.block_type == blocks.BlockType.DEAD_END:
-                return True  # Don't filter dead end blocks if there are other chances for an end
-            blist = self._get_connected_block_list(block, current_pos, lvl)
-            prev_len = min(blist, key=(lambda blk: blk.length))
-            return self.minimum_length <= prev_len.length + 1  # Keep end blocks if minimum length reached
-        return inner_filter
-
-    def _check_max_length(self, current_pos, lvl):
-        """
-        Filter that checks the minimum length based on the adjacent blocks
-        :param current_pos: The block's position
-        :param lvl: The level
-        :return: The filter
-        """
-        def inner_filter(block):
-            if block.block_type == blocks.BlockType.END or block.block_type == blocks.BlockType.DEAD_END:
-                return True  # Don't filter end blocks based off of maximum length
-            blist = self._get_connected_block_list(block, current_pos, lvl)
-            prev_len = min(blist, key=(lambda blk: blk.length))
-            return self.maximum_length > prev_len.length + 1  # Keep non-end blocks if max length not reached
-        return inner_filter
+        def prev_length(block):
+            # Returns the length of the block this one follows, or None if it does not fit here
+            exit_mask = block.exit_mask
+            if exit_mask & forbidden or required & ~exit_mask:
+                return None  # Leads off the edge, mismatches a block, or misses a block that connects to this
+            if not exit_mask & inbound:
+                return None  # Not connected to anything
+            if inbound & ~exit_mask:
+                return lvl.get_predecessor_length(current_pos, exit_mask)  # Skips a ramp, so not every inbound block
+            return pred_len
 
-    def _check_mutual_adjacent(self, current_pos, lvl):
-        """
-        Filter that makes sure that the block is mutually adjacent to any adjacent blocks. One spot must not be empty
-        :param current_pos: The block's position
-        :param lvl: The level
-        :return: The filter
-        """
-        def inner_filter(block):
-            spots = block.adjacent(current_pos)
-            spots = filter(lvl.is_valid, spots)
-            one_not_empty = False
-            for spot in spots:
-                if not lvl.is_empty(spot):
-                    one_not_empty = True
-                    blk = lvl.get_block(spot)
-                    if current_pos not in blk.adjacent(spot):
-                        # Mismatch, block exists but not mutually adjacent
-                        return False
-            if not one_not_empty:
-                return False
-            # Need to search for any blocks to which this block was supposed to be adjacent
-            possible_spots = [][:]
-            for j in [current_pos[Y], current_pos[Y]-1]:  # Y-1 needed for ramps
-                possible_spots.extend([(current_pos[X] + 1, j, current_pos[Z] + 0),
-                                       (current_pos[X] - 1, j, current_pos[Z] + 0),
-                                       (current_pos[X] + 0, j, current_pos[Z] + 1),
-                                       (current_pos[X] + 0, j, current_pos[Z] - 1)])
-            for spot in possible_spots:
-                if lvl.is_valid(spot) and not lvl.is_empty(spot):
-                    blk = lvl.get_block(spot)
-                    if current_pos in blk.adjacent(spot):
-                        # If this block is adjacent to that, that must be adjacent to this unless ramp
-                        if blk.block_type != blocks.BlockType.RAMP and spot not in block.adjacent(current_pos):
-                            return False
-            return True
-        return inner_filter
-
-
-    def _check_ramps(self, current_pos, lvl, other_spots):
-        """
-        Filter that makes sure ramps will work
-        :param current_pos: The ramp's position
-        :param lvl: The level
-        :param other_spots: The other pending spots
-        :return: The filter
-        """
-        def inner_filter(block):
-            if block.block_type != blocks.BlockType.RAMP:
-                return True  # This filter only affects ramps
-            # Make sure dummy spot is empty
+        def ramp_fits(block):
+            # Make sure the dummy spot is empty and not supposed to hold some other block
             dummy_spot = (current_pos[X], current_pos[Y] + 1, current_pos[Z])
-            if not lvl.is_empty(dummy_spot):
-                return False  # Remove this ramp
-            # Make sure the dummy spot is not supposed to hold some block
-            if dummy_spot in other_spots:
-                return False  # Remove this ramp
-            # Make tmp dummy and make sure its adjacent spot is empty
-            tmp_dummy = blocks.RampDummy(orientation=block.orientation)
-            for spot in tmp_dummy.adjacent(dummy_spot):
+            if not lvl.is_empty(dummy_spot) or dummy_spot in other_spots:
+                return False
+            # Make sure the dummy's adjacent spot is empty
+            dummy_offsets = blocks.ADJACENT_OFFSETS[(blocks.BlockType.RAMP_DUMMY, block.orientation)]
+            for spot in blocks.apply_offsets(dummy_spot, dummy_offsets):
                 if not lvl.is_empty(spot):
-                    return False  # Remove this ramp
-            return True  # Accept this ramp
-        return inner_filter
+                    return False
+            return True
 
+        valid = [][:]
+        for block in candidates:
+            prev_len = prev_length(block)
+            if prev_len is None:
+                continue
+            if block.block_type == blocks.BlockType.END or block.block_type == blocks.BlockType.DEAD_END:
+                # Only allow end blocks if the minimum length has been reached. Dead ends are OK if there are other spots
+                if self.minimum_length and (block.block_type == blocks.BlockType.END or len(other_spots) == 0):
+                    if self.minimum_length > prev_len + 1:
+                        continue
+            elif self.maximum_length and self.maximum_length <= prev_len + 1:
+                continue  # Only allow non-end blocks if the maximum length hasn't been reached
+            if block.block_type == blocks.BlockType.RAMP and not ramp_fits(block):
+                continue
+            valid.append(block)
 
-    def _all_orientations(self, blockf):
-        """
-        Returns blocks of all orientations from a BlockFile
-        :param blockf: The BlockFile
-        :return: A list of blocks of all orientations
-        """
-        return [blockf.make_block(orientation=blocks.Orientation.NORTH),
-                blockf.make_block(orientation=blocks.Orientation.WEST),
-                blockf.make_block(orientation=blocks.Orientation.SOUTH),
-                blockf.make_block(orientation=blocks.Orientation.EAST)]
+        forced = [block for block in end_candidates if prev_length(block) is not None]
+        return valid, forced
 
     def _get_valid_blocks(self, current_spot, lvl, placed_start, placed_end, start_blocks, end_blocks, dead_end_blocks,
-                          other_blocks, other_spots, force_end=False):
+                          other_blocks, other_spots):
         """
         Returns a list of valid blocks to go at a spot. Block must not lead off the edge of the world and must be
-        mutually adjacent to a block, unless it is the starting block
+        mutually adjacent to a block, unless it is the starting block. If no block is valid, the end blocks are checked
+        without the length limits to end the level
         :param current_spot: The spot to check for valid blocks
         :param lvl: The level so far
         :param placed_start: Whether the start block has been placed
         :param placed_end: Whether the end block has been placed
-        :param start_blocks: The list of start blocks
-        :param end_blocks: The list of end blocks
-        :param dead_end_blocks: The list of dead end blocks
-        :param other_blocks: The list of other blocks
-        :param other_spots: List of other spots besides this one
-        :param force_end: Whether to force placement of the end block. Should only be used for recursion
-        :return: A list of valid blocks at this spot
-        """
-        # List to return
-        ret = [][:]
-
-        # If start hasn't been placed, only suggest start blocks
+        :param start_blocks: The list of start block prototypes
+        :param end_blocks: The list of end block prototypes
+        :param dead_end_blocks: The list of dead end block prototypes
+        :param other_blocks: The list of other block prototypes
+        :param other_spots: Frontier of other spots besides this one
+        :return: A list of valid block prototypes at this spot
+        """
+        # If start hasn't been placed, only suggest start blocks that don't lead off the edge of the world
         if not placed_start:
-            for blockf in start_blocks:
-                ret.extend(self._all_orientations(blockf))
-            # Make sure all adjacent blocks are valid
-            ret = filter(self._check_all_pos(current_spot, lvl), ret)
-            return ret
-        else:
-            # Generate every possible block at this position
-            if force_end or not placed_end:
-                for blockf in end_blocks:
-                    ret.extend(self._all_orientations(blockf))
-            if not force_end:
-                for blockf in dead_end_blocks:
-                    ret.extend(self._all_orientations(blockf))
-                for blockf in other_blocks:
-                    ret.extend(self._all_orientations(blockf))
-
-            # Make sure all adjacent blocks are valid
-            ret = filter(self._check_all_pos(current_spot, lvl), ret)
-
-            # Make sure all blocks are mutually adjacent to any adjacent blocks
-            ret = filter(self._check_mutual_adjacent(current_spot, lvl), ret)
+            edges = lvl.get_sockets(current_spot)[2]  # Nothing is placed yet, so only the edges are forbidden
+            return [block for block in start_blocks if not block.exit_mask & edges]
 
-            # Only allow end blocks if the minimum length has been reached. Dead ends are OK if there are other spots
-            if not force_end and self.minimum_length:
-                ret = filter(self._check_min_length(current_spot, lvl, len(other_spots) > 0), ret)
+        # Generate every possible block at this position
+        candidates = (end_blocks if not placed_end else []) + dead_end_blocks + other_blocks
+        valid, forced = self._evaluate_candidates(current_spot, lvl, candidates, end_blocks, other_spots)
 
-            # Only allow non-end blocks if the maximum length hasn't been reached
-            if not force_end and self.maximum_length:
-                ret = filter(self._check_max_length(current_spot, lvl), ret)
+        # If there are no valid blocks, end the level
+        if len(valid) == 0:
+            if len(forced) == 0:
+                raise CannotGenerateLevelError("Could not find valid blocks and end forcing causes recursion")
+            return forced
+        return valid
 
-            # Filter the valid ramps
-            ret = filter(self._check_ramps(current_spot, lvl, other_spots), ret)
-
-            # If there are no valid blocks, end the level
-            if len(ret) == 0:
-                # Should not have recursed twice
-                if force_end:
-                    raise CannotGenerateLevelError("Could not find valid blocks and end forcing causes recursion")
-                return self._get_valid_blocks(current_spot, lvl, placed_start, placed_end, start_blocks, end_blocks,
-                                              dead_end_blocks, other_blocks, other_spots, True)
-
-            return ret
+    def _steer_blocks(self, current_spot, lvl, valid_blocks):
+        """
+        Narrows the valid blocks to those that best extend the main path. Blocks that don't branch are preferred, since
+        branches make shortcuts, and among them the ones that lead along walls (fewest free spots past the exit, but
+        not none), which leaves open space for the path to come back through later
+        :param current_spot: The spot being filled
+        :param lvl: The level so far
+        :param valid_blocks: The valid block prototypes at the spot
+        :return: The preferred block prototypes
+        """
+        best_blocks = [][:]
+        best_score = None
+        for block in valid_blocks:
+            if len(block.offsets) != 2:
+                continue
+            score = None
+            for spot in block.adjacent(current_spot):
+                if lvl.is_empty(spot):
+                    free = sum(1 for pos in blocks.apply_offsets(spot, STEER_OFFSETS) if lvl.is_empty(pos))
+                    score = free if score is None else min(score, free)
+            if score is None or score == 0:
+                continue  # Leads nowhere new or into a pocket
+            if best_score is None or score < best_score:
+                best_blocks = [block]
+                best_score = score
+            elif score == best_score:
+                best_blocks.append(block)
+        if len(best_blocks) > 0:
+            return best_blocks
+        open_blocks = [block for block in valid_blocks if block.block_type != blocks.BlockType.DEAD_END]
+        return open_blocks if len(open_blocks) > 0 else valid_blocks
 
-    def _choose_block(self, valid_blocks, current_spot):
+    def _choose_block(self, valid_blocks, current_spot, rng=random):
         """
         Chooses a random block based on weights
         :param valid_blocks: The list of valid blocks at current_spot
         :param current_spot: The current spot in question
-        :return: The chosen block and the spot for that block to go
+        :param rng: The random number generator to use
+        :return: The chosen block
         """
-        weight_sum = 0
-        for block in valid_blocks:
-            weight_sum += block.weight
+        return self._sampler.choose(valid_blocks, rng)
 
-        # To choose a random value, subtract from 1 until tmp < random_value
-        random_value = 1 - random.random()  # So 1 is included but 0 is not
-        tmp = 1
-        for block in valid_blocks:
-            tmp -= block.weight * 1.0 / weight_sum
-            if tmp < random_value:
-                return block
+    def generate_many(self, n, seeds=None, workers=None):
+        """
+        Generates a batch of levels, in parallel worker processes if asked. Only the settings and seeds are sent to
+        the workers, and only packed levels are sent back. Results are yielded as they finish, which may not be in
+        order, and only a few levels are in flight at once so memory stays bounded
+        :param n: The number of levels
+        :param seeds: The seed of each level. None means derive them from the seed (or a random master seed if there
+            is no seed) with sampling.derive_seed
+        :param workers: The number of worker processes. None means one per CPU, and 1 or less means generate in this
+            process without a pool
+        :return: Iterator of GeneratedLevel
+        """
+        if seeds is None:
+            master_seed = self.seed if self.seed is not None else random.SystemRandom().getrandbits(63)
+            seeds = [sampling.derive_seed(master_seed, index) for index in range(n)]
+        else:
+            seeds = list(seeds)
+            if len(seeds) < n:
+                raise ValueError("Need {} seeds but only {} were given".format(n, len(seeds)))
+        settings = self.get_settings()
+        if workers is None:
+            import multiprocessing  # Imported here since it is slow to import and only needed for pools
+            workers = multiprocessing.cpu_count()
 
-        # If we get here due to floating point error, just return a block
-        return valid_blocks[0]
+        if workers <= 1:
+            for index in range(n):
+                data, error = generate_level_data(settings, seeds[index])
+                yield GeneratedLevel(index, seeds[index], data, error)
+            return
 
-    def generate(self):
+        # Imported here since Maya's Python 2 may not have it
+        from concurrent import futures
+        with futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = dict()  # Future -> index
+            next_index = 0
+            while next_index < n or pending:
+                # Keep a couple of levels per worker in flight
+                while next_index < n and len(pending) < workers * MAX_PENDING_PER_WORKER:
+                    pending[pool.submit(generate_level_data, settings, seeds[next_index])] = next_index
+                    next_index += 1
+                done, _ = futures.wait(list(pending), return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    data, error = future.result()
+                    yield GeneratedLevel(index, seeds[index], data, error)
+
+    def make_rng(self, index=None):
         """
-        Generates and returns the level
-        :return: The Level
+        Makes a random number generator from the seed. Each index gives an independent child stream of the seed, so
+        levels made in batches or in parallel can be reproduced one at a time
+        :param index: The index of the child stream. None means use the seed itself
+        :return: The random.Random
+        """
+        if index is None:
+            return random.Random(self.seed)
+        if self.seed is None:
+            raise ValueError("Child streams need a seed")
+        return random.Random(sampling.derive_seed(self.seed, index))
+
+    def _start(self, rng=None):
+        """
+        Checks the settings and sets up a level to generate
+        :param rng: The random number generator to use. None means make one from the seed
+        :return: The GenerationState
         """
         # Level object
         if not self.check_size():
             raise CannotGenerateLevelError("Invalid Size ({},{},{})".format(self.size[X], self.size[Y], self.size[Z]))
         lvl = Level(size=self.size)
+        lvl.seed = self.seed
+        lvl.settings = self.get_settings()
 
-        # Random generator
-        if self.seed is not None:
-            random.seed(self.seed)
-        else:
-            random.seed(None)
+        # Random generator, owned by this run so other users of random are not affected
+        if rng is None:
+            rng = self.make_rng()
 
         # Separate out block file types
         start_blocks = [block for block in self.block_list if block.block_type == blocks.BlockType.START]
@@ -418,64 +1244,214 @@ class LevelGenerator(object):
         if len(other_blocks) < 1:
             raise CannotGenerateLevelError("Must have at least one intermediate block")
 
+        # Block files without a scene file would only make empty blocks
+        for blockf in self.block_list:
+            if not blockf.pth:
+                raise CannotGenerateLevelError("No scene file for the {} block"
+                                               .format(blocks.BLOCK_TYPE_STR[blockf.block_type]))
+
         # Pick random start location and make that the list of remaining spots list
-        remaining_spots = [(random.randint(0, self.size[X] - 1), 0, random.randint(0, self.size[Z] - 1))]
-        placed_start = False
-        placed_end = False
+        remaining_spots = Frontier([(rng.randint(0, self.size[X] - 1), 0, rng.randint(0, self.size[Z] - 1))])
 
-        # Main logic loop
-        while len(remaining_spots) > 0:
-            # Choose a random spot
-            random.shuffle(remaining_spots)
-            current_spot = remaining_spots.pop()
-
-            # Get a list of all valid blocks that could go in that spot
-            valid_blocks = self._get_valid_blocks(current_spot, lvl, placed_start, placed_end, start_blocks, end_blocks,
-                                                  dead_end_blocks, other_blocks, remaining_spots)
-
-            # Check to make sure that there are valid blocks
-            if len(valid_blocks) == 0:
-                raise CannotGenerateLevelError("Could not determine a valid block to place at ({},{},{})"
-                                               .format(current_spot[X], current_spot[Y], current_spot[Z]))
-
-            # Place a random block from the list
-            chosen_block = self._choose_block(valid_blocks, current_spot)
-            if chosen_block.block_type == blocks.BlockType.START:
-                placed_start = True
-                chosen_block.length = 1
-            else:
-                blist = self._get_connected_block_list(chosen_block, current_spot, lvl)
-                prev_len = min(blist, key=(lambda blk: blk.length))
-                chosen_block.length = prev_len.length + 1
-
-                # Special cases for some blocks
-                if chosen_block.block_type == blocks.BlockType.RAMP:
-                    dummy = blocks.RampDummy(orientation=chosen_block.orientation)
-                    dummy.length = chosen_block.length
-                    lvl.place_block(dummy, (current_spot[X], current_spot[Y] + 1, current_spot[Z]))
-                if chosen_block.block_type == blocks.BlockType.END:
-                    placed_end = True
-                    lvl.length = chosen_block.length
-
-            lvl.place_block(chosen_block, current_spot)
-
-            # Add all empty adjacent spots to the remaining blocks list
-            for pos in chosen_block.adjacent(current_spot):
-                if lvl.is_valid(pos) and lvl.is_empty(pos):
-                    if pos not in remaining_spots:
-                        remaining_spots.append(pos)
-
-        if not placed_end:
+        # Make the shared candidate prototypes once so no blocks are made while checking spots
+        state = GenerationState(lvl, rng, remaining_spots, end_blocks)
+        state.start_blocks = [proto for blockf in start_blocks for proto in blockf.make_prototypes()]
+        state.end_blocks = [proto for blockf in end_blocks for proto in blockf.make_prototypes()]
+        state.dead_end_blocks = [proto for blockf in dead_end_blocks for proto in blockf.make_prototypes()]
+        state.other_blocks = [proto for blockf in other_blocks for proto in blockf.make_prototypes()]
+        return state
+
+    def _step(self, state):
+        """
+        Places a block at a random remaining spot
+        :param state: The GenerationState. Must have remaining spots
+        :return: None
+        """
+        lvl = state.lvl
+        steering = (self.steer_to_minimum and self.minimum_length and state.placed_start
+                    and state.longest + 1 < self.minimum_length)
+
+        # Choose a random spot, or one far from the start to extend the main path when steering
+        if steering:
+            current_spot = state.remaining_spots.pop_best_of(state.rng, STEER_SAMPLES, lvl.distance_at)
+        else:
+            current_spot = state.remaining_spots.pop_random(state.rng)
+
+        # Get a list of all valid blocks that could go in that spot
+        valid_blocks = self._get_valid_blocks(current_spot, lvl, state.placed_start, state.placed_end,
+                                              state.start_blocks, state.end_blocks, state.dead_end_blocks,
+                                              state.other_blocks, state.remaining_spots)
+
+        # Keep the path going when steering
+        if steering:
+            valid_blocks = self._steer_blocks(current_spot, lvl, valid_blocks)
+
+        # Check to make sure that there are valid blocks
+        if len(valid_blocks) == 0:
+            raise CannotGenerateLevelError("Could not determine a valid block to place at ({},{},{})"
+                                           .format(current_spot[X], current_spot[Y], current_spot[Z]))
+
+        # Place a random block from the list
+        chosen_block = self._choose_block(valid_blocks, current_spot, state.rng)
+        if chosen_block.block_type == blocks.BlockType.START:
+            state.placed_start = True
+            chosen_length = 1
+        else:
+            chosen_length = lvl.get_predecessor_length(current_spot, chosen_block.exit_mask) + 1
+
+            # Special cases for some blocks
+            if chosen_block.block_type == blocks.BlockType.RAMP:
+                dummy = blocks.BlockPrototype(blocks.BlockType.RAMP_DUMMY, orientation=chosen_block.orientation)
+                lvl.place_block(dummy, (current_spot[X], current_spot[Y] + 1, current_spot[Z]), length=chosen_length)
+            if chosen_block.block_type == blocks.BlockType.END:
+                state.placed_end = True
+                lvl.length = chosen_length
+
+        lvl.place_block(chosen_block, current_spot, length=chosen_length)
+        state.longest = max(state.longest, chosen_length)
+
+        # Add all empty adjacent spots to the remaining blocks list
+        for pos in chosen_block.adjacent(current_spot):
+            if lvl.is_valid(pos) and lvl.is_empty(pos):
+                state.remaining_spots.add(pos)
+
+    def _finish(self, state):
+        """
+        Makes sure the level has an end once there are no remaining spots
+        :param state: The GenerationState
+        :return: None
+        """
+        lvl = state.lvl
+        if not state.placed_end:
             # Last effort, try replacing a dead end with an end
             dead_end_pos = lvl.find_longest_dead_end()
             if dead_end_pos is not None:
                 tmp_dead_end = lvl.get_block(dead_end_pos)
-                tmp_end = random.choice(end_blocks).make_block(orientation=tmp_dead_end.orientation)
+                tmp_end = self._sampler.choose(state.end_files, state.rng).make_block(
+                    orientation=tmp_dead_end.orientation)
                 tmp_end.length = tmp_dead_end.length
                 lvl.place_block(tmp_end, dead_end_pos)
-                placed_end = True
+                state.placed_end = True
                 lvl.length = tmp_end.length
             else:
                 raise CannotGenerateLevelError("Could not place end block")
 
-        return lvl
+    def generate(self, rng=None, cancel_token=None, progress=None):
+        """
+        Generates and returns the level. The same seed always gives the same level, though not the same level as
+        versions that shuffled every remaining spot each step. The global random module is never used or reseeded
+        :param rng: The random number generator to use, such as from make_rng. Anything with the methods of
+            random.Random works. None means make one from the seed
+        :param cancel_token: The CancellationToken to check before every placement. None means it can't be cancelled
+        :param progress: Function called every PROGRESS_INTERVAL placements with the number of blocks placed and the
+            number of remaining spots. It is called from the generating thread. None means don't report progress
+        :return: The Level
+        """
+        state = self._start(rng)
+
+        # Main logic loop
+        placed = 0
+        while len(state.remaining_spots) > 0:
+            if cancel_token is not None:
+                cancel_token.check()
+            self._step(state)
+            placed += 1
+            if progress is not None and placed % PROGRESS_INTERVAL == 0:
+                progress(placed, len(state.remaining_spots))
+
+        self._finish(state)
+        return state.lvl
+
+    def generate_with_retries(self, max_attempts=DEFAULT_MAX_ATTEMPTS, max_backtracks=DEFAULT_MAX_BACKTRACKS,
+                              backtrack_depth=DEFAULT_BACKTRACK_DEPTH, cancel_token=None, progress=None):
+        """
+        Generates a level, recovering from dead ends instead of giving up. When a spot has no valid blocks or no end
+        can be placed, the last few placements are undone and tried again with new random choices. Only after too
+        many backtracks is the attempt thrown away for a fresh start from a seed derived from the seed. The first
+        attempt uses the seed itself, so a level that generate() can make comes out the same
+        :param max_attempts: The number of fresh starts before giving up
+        :param max_backtracks: The number of backtracks allowed in each attempt
+        :param backtrack_depth: The number of placements undone by each backtrack
+        :param cancel_token: The CancellationToken to check before every placement. None means it can't be cancelled
+        :param progress: Function called every PROGRESS_INTERVAL placements with the number of blocks placed in the
+            current attempt and the number of remaining spots. It is called from the generating thread. None means
+            don't report progress
+        :return: The GenerationResult
+        """
+        master_seed = self.seed if self.seed is not None else random.SystemRandom().getrandbits(63)
+        total_backtracks = 0
+        error = None
+        for attempt in range(max_attempts):
+            seed = master_seed if attempt == 0 else sampling.derive_seed(master_seed, attempt)
+            state = self._start(random.Random(seed))
+            state.lvl.seed = seed
+            state.start_journal()
+            checkpoints = [][:]  # Checkpoint before each placement
+            backtracks = 0
+            while True:
+                try:
+                    if len(state.remaining_spots) > 0:
+                        if cancel_token is not None:
+                            cancel_token.check()
+                        checkpoints.append(state.checkpoint())
+                        self._step(state)
+                        if progress is not None and len(checkpoints) % PROGRESS_INTERVAL == 0:
+                            progress(len(checkpoints), len(state.remaining_spots))
+                        continue
+                    self._finish(state)
+                    state.stop_journal()
+                    return GenerationResult(state.lvl, seed, attempt + 1, total_backtracks + backtracks)
+                except CannotGenerateLevelError as err:
+                    # Dead state, so undo some placements or give up on this attempt
+                    error = err
+                    if backtracks >= max_backtracks or len(checkpoints) == 0:
+                        break
+                    backtracks += 1
+                    depth = min(backtrack_depth, len(checkpoints))
+                    state.rollback(checkpoints[-depth])
+                    del checkpoints[-depth:]
+            total_backtracks += backtracks
+        raise CannotGenerateLevelError("Could not generate a level in {} attempts: {}".format(max_attempts, error))
+
+
+#===================================================== FUNCTIONS =======================================================#
+def array_to_bytes(arr):
+    """
+    Returns the little endian bytes of an array
+    :param arr: The array.array
+    :return: The bytes
+    """
+    if sys.byteorder == "big":
+        arr = array.array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes() if hasattr(arr, "tobytes") else arr.tostring()
+
+
+def array_from_bytes(typecode, data):
+    """
+    Returns an array read from little endian bytes
+    :param typecode: The array.array typecode
+    :param data: The bytes
+    :return: The array.array
+    """
+    arr = array.array(typecode)
+    if hasattr(arr, "frombytes"):
+        arr.frombytes(data)
+    else:
+        arr.fromstring(data)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+
+def generate_level_data(settings, seed):
+    """
+    Generates one packed level. Runs in worker processes for LevelGenerator.generate_many
+    :param settings: Dict of generator settings from LevelGenerator.get_settings
+    :param seed: The seed for the level
+    :return: Tuple of the packed level (None on failure) and the error message (None on success)
+    """
+    try:
+        return LevelGenerator.from_settings(settings, seed=seed).generate().to_bytes(), None
+    except CannotGenerateLevelError as err:
+        return None, str(err)
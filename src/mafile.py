@@ -0,0 +1,552 @@
+"""
+mafile.py
+Asmita Chitale
+Assignment 03
+ATCM 3311.0U1
+07/24/2020
+"""
+
+
+#====================================================== IMPORTS =======================================================#
+import blocks
+
+from collections import namedtuple
+import io
+import math
+import os
+import re
+
+
+#====================================================== CONSTS ========================================================#
+X = 0  # Element of size tuple
+Y = 1  # Element of size tuple
+Z = 2  # Element of size tuple
+ASSET_VERSION = 3  # Version of the baked asset format. Bumped when it changes, so old cache files are not used
+DEFAULT_BLOCK_SIZE = (10.0, 5.0, 10.0)  # Default dimensions for a unit block in Maya
+DEFAULT_GROUP_NAME = "groupBlock"  # Default name for the group to look for within the Maya scenes
+ENCODING = "latin-1"  # Maya ASCII files are in the system code page. This reads and writes any byte unchanged
+HEADER_COMMANDS = ("requires", "currentUnit")  # Statements before the nodes that an asset keeps
+NODE_COMMANDS = ("setAttr", "addAttr", "deleteAttr", "lockNode")  # Statements that change the last created node
+PLACED_BLOCK_TYPES = tuple(blk_type for blk_type in blocks.BlockType  # Block types that have a scene file
+                           if blk_type not in (blocks.BlockType.EMPTY, blocks.BlockType.RAMP_DUMMY))
+READ_CHUNK_SIZE = 1 << 16  # Bytes read at a time when hashing a file
+RENAMED_COMMANDS = ("createNode", "connectAttr", "parent", "relationship")  # Statements whose strings name nodes
+SCENE_HEADER = u"//Maya ASCII 2019 scene\n//Name: {}\n"  # First lines of a written level scene, from the file name
+SCENE_FOOTER = u"// End of {}\n"  # Last line of a written level scene, from the file name
+SKIPPED_NODE_TYPES = ("script",)  # Node types that are never part of a block, such as the UI configuration
+STATEMENT_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"|;')  # A string, which may hold a ;, or the end of a statement
+STRING_PATTERN = re.compile(r'"((?:[^"\\]|\\.)*)"')  # A string of a statement
+TOKEN_PATTERN = re.compile(r'"((?:[^"\\]|\\.)*)"|([^\s"]+)')  # A string or a bare word of a statement
+TRANSFORM_ATTRIBUTES = (".t", ".translate", ".r", ".rotate")  # Attributes of the group replaced by the block transform
+
+
+#====================================================== CLASSES =======================================================#
+class MaFileError(Exception):
+    """Represents an error when a Maya ASCII file can't be read or doesn't have the block"""
+    pass
+
+
+class MaNode(namedtuple("MaNode", ("node_type", "name", "parent", "statements"))):
+    """A node of a Maya ASCII file. Part of the Model
+
+    statements are the texts of the createNode statement and every statement that changes the node after it, without
+    the ending semicolons. parent is None for nodes at the top of the scene
+    """
+    __slots__ = ()
+
+
+class BlockAsset(namedtuple("BlockAsset", ("group_name", "header", "nodes", "connections", "shared_nodes",
+                                             "shared_connections"))):
+    """The part of a block scene file that makes up the block. Part of the Model
+
+    nodes are the MaNodes of the group's hierarchy and every node they are built from (such as the polyCube feeding a
+    mesh), in the order of the file. header has the requires and currentUnit statements, and connections has the
+    connectAttr and parent statements from those nodes to themselves, Maya's default nodes or the shared nodes.
+    shared_nodes are what the block's nodes feed into and what feeds those, such as shading groups and their
+    materials, which every copy of the block can share. shared_connections has their connectAttr and relationship
+    statements. Node IDs are left out, so Maya makes new ones on import
+    """
+    __slots__ = ()
+
+    def to_dict(self):
+        """
+        Returns the asset as a dict of JSON values
+        :return: The dict
+        """
+        return {
+            "version": ASSET_VERSION,
+            "group_name": self.group_name,
+            "header": list(self.header),
+            "nodes": [list(node) for node in self.nodes],
+            "connections": list(self.connections),
+            "shared_nodes": [list(node) for node in self.shared_nodes],
+            "shared_connections": list(self.shared_connections),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Makes an asset from the dict of to_dict
+        :param data: The dict
+        :return: The BlockAsset
+        """
+        if data.get("version") != ASSET_VERSION:
+            raise MaFileError("Unsupported block asset version {}".format(data.get("version")))
+        return cls(data["group_name"], data["header"], [MaNode(*node) for node in data["nodes"]], data["connections"],
+                   [MaNode(*node) for node in data["shared_nodes"]], data["shared_connections"])
+
+    def write(self, ma_file):
+        """
+        Writes the asset as a Maya ASCII scene with only the block in it
+        :param ma_file: The file object, opened for text
+        :return: None
+        """
+        ma_file.write(u"//Maya ASCII scene\n")
+        for text in self.header:
+            ma_file.write(u"{};\n".format(text))
+        for node in self.nodes + self.shared_nodes:
+            ma_file.write(u"{};\n".format(node.statements[0]))
+            for text in node.statements[1:]:
+                ma_file.write(u"\t{};\n".format(text))
+        for text in self.connections + self.shared_connections:
+            ma_file.write(u"{};\n".format(text))
+
+
+class MaLevelWriter(object):
+    """Writes a level as one Maya ASCII scene without Maya. Part of the Controller
+
+    Every block is the node hierarchy of its scene file's group with each node's name followed by _i_j_k, so the
+    group is named {group_name}_{i}_{j}_{k} as in the scenes MayaSceneLevelGenerator makes, and the block's transform
+    set on the group. Shared nodes, such as shading groups, are written once per scene file and used by all of its
+    blocks. Each scene file is turned into a text template once, and blocks are written to the file as they come, so
+    memory doesn't grow with the size of the level
+    """
+
+    def __init__(self, block_dimensions=DEFAULT_BLOCK_SIZE, group_name=DEFAULT_GROUP_NAME, asset_cache_dir=None):
+        """
+        Initializes the writer
+        :param block_dimensions: The dimensions of a unit block. Must be square (X = Z) but can have any height
+        :param group_name: The name of the group containing the shapes comprising the block
+        :param asset_cache_dir: The directory of baked assets, so scene files are only read once. None means read the
+            scene files every time
+        """
+        self.block_dimensions = block_dimensions
+        self.group_name = group_name
+        self.asset_cache_dir = asset_cache_dir
+
+    def save(self, lvl, pth):
+        """
+        Writes the level to a Maya ASCII file. The file is only replaced once it is fully written
+        :param lvl: The Level
+        :param pth: The path of the file
+        :return: None
+        """
+        write_atomic(pth, lambda ma_file: self.write(lvl, ma_file, os.path.basename(pth)))
+
+    def write(self, lvl, ma_file, name="level.ma"):
+        """
+        Writes the level as a Maya ASCII scene
+        :param lvl: The Level
+        :param ma_file: The file object, opened for text
+        :param name: The file name written in the scene's header and footer
+        :return: The number of blocks written
+        """
+        pths = set(blk.pth for _, blk in lvl.iter_blocks(types=PLACED_BLOCK_TYPES))
+        placements = ((blk.pth, block_node_name(self.group_name, pos))
+                      + block_transform(pos, blk.orientation, self.block_dimensions)
+                      for pos, blk in lvl.iter_blocks(types=PLACED_BLOCK_TYPES))
+        return self.write_blocks(pths, placements, ma_file, name)
+
+    def write_blocks(self, pths, placements, ma_file, name="level.ma"):
+        """
+        Writes placed blocks as a Maya ASCII scene
+        :param pths: Iterable of the path of every scene file the blocks use
+        :param placements: Iterable of tuples of each block's scene file path, node name, (X,Y,Z) translation and
+            (X,Y,Z) rotation in degrees. Node names must start with the group name, as from block_node_name
+        :param ma_file: The file object, opened for text
+        :param name: The file name written in the scene's header and footer
+        :return: The number of blocks written
+        """
+        # Read each scene file once
+        pths = sorted(set(pths))
+        assets = dict((pth, load_block_asset(pth, self.group_name, self.asset_cache_dir)) for pth in pths)
+
+        ma_file.write(SCENE_HEADER.format(name))
+        header = [][:]
+        for pth in pths:
+            for text in assets[pth].header:
+                if text not in header and (not text.startswith("currentUnit")
+                                           or not any(line.startswith("currentUnit") for line in header)):
+                    header.append(text)
+        for text in header:
+            ma_file.write(u"{};\n".format(text))
+
+        # Shared nodes. Scene files with the same shared nodes and connections share them in the level, and other
+        # shared nodes are renamed if their names are taken
+        shared_names_by_key = dict()  # The shared nodes and connections of a scene file to their names in the level
+        written = set()  # Names of the shared nodes written
+        templates = dict()
+        for asset_idx, pth in enumerate(pths):
+            asset = assets[pth]
+            key = (tuple((node.name, node.parent, tuple(node.statements)) for node in asset.shared_nodes),
+                   tuple(asset.shared_connections))
+            shared_names = shared_names_by_key.get(key)
+            if shared_names is None:
+                shared_names = dict()
+                for node in asset.shared_nodes:
+                    new_name = node.name
+                    while new_name in written:
+                        new_name = "{}_{}".format(new_name, asset_idx)
+                    shared_names[node.name] = new_name
+                    written.add(new_name)
+                for node in asset.shared_nodes:
+                    self._write_node([rename_nodes(node.statements[0], shared_names)] + node.statements[1:], ma_file)
+                for text in asset.shared_connections:
+                    ma_file.write(u"{};\n".format(rename_nodes(text, shared_names)))
+                shared_names_by_key[key] = shared_names
+            templates[pth] = self._block_template(asset, shared_names)
+
+        # Then every block, from its scene file's template
+        count = 0
+        for pth, node_name, translation, rotation in placements:
+            if not node_name.startswith(self.group_name):
+                raise MaFileError("Block name {} doesn't start with {}".format(node_name, self.group_name))
+            ma_file.write(templates[pth].format(node_name[len(self.group_name):], float(translation[X]),
+                                                float(translation[Y]), float(translation[Z]), float(rotation[Y])))
+            count += 1
+        ma_file.write(SCENE_FOOTER.format(name))
+        return count
+
+    @staticmethod
+    def _write_node(statements, ma_file):
+        """
+        Writes a node's createNode statement and the statements that change it
+        :param statements: List of the statement texts
+        :param ma_file: The file object, opened for text
+        :return: None
+        """
+        ma_file.write(u"{};\n".format(statements[0]))
+        for text in statements[1:]:
+            ma_file.write(u"\t{};\n".format(text))
+
+    def _block_template(self, asset, shared_names):
+        """
+        Returns the text of a block of a scene file as a format string. Field 0 is the suffix of the node names,
+        fields 1 to 3 are the translation and field 4 is the rotation about Y
+        :param asset: The BlockAsset of the scene file
+        :param shared_names: Dict of each shared node's name to its name in the written scene
+        :return: The format string
+        """
+        new_names = dict(shared_names)
+        new_names.update((node.name, node.name + "{0}") for node in asset.nodes)
+        template = io.StringIO()
+        for node in asset.nodes:
+            statements = [rename_nodes(escape_braces(node.statements[0]), new_names)]
+            for text in node.statements[1:]:
+                tokens = statement_tokens(text)
+                if node.name == asset.group_name and tokens[0] == "setAttr" and tokens[1] in TRANSFORM_ATTRIBUTES:
+                    continue  # Replaced by the block transform
+                statements.append(escape_braces(text))
+            if node.name == asset.group_name:
+                statements.append(u'setAttr ".t" -type "double3" {1!r} {2!r} {3!r} ')
+                statements.append(u'setAttr ".r" -type "double3" 0 {4!r} 0 ')
+            self._write_node(statements, template)
+        for text in asset.connections:
+            template.write(u"{};\n".format(rename_nodes(escape_braces(text), new_names)))
+        return template.getvalue()
+
+
+#===================================================== FUNCTIONS =======================================================#
+def block_transform(pos, orientation, block_dimensions):
+    """
+    Returns the transform of a block in the scene. Blocks turn about the center of their base, which is folded into
+    the translation so the transform works without a pivot
+    :param pos: The (X,Y,Z) position of the block in the level
+    :param orientation: The block's Orientation
+    :param block_dimensions: The dimensions of a unit block
+    :return: Tuple of the (X,Y,Z) translation and the (X,Y,Z) rotation in degrees
+    """
+    angle = 90 * orientation.value
+    radians = math.radians(angle)
+    cos = round(math.cos(radians))  # Exact, since the angle is a multiple of 90
+    sin = round(math.sin(radians))
+    pivot_x = block_dimensions[X]/2.0
+    pivot_z = block_dimensions[Z]/2.0
+    translation = (pos[X] * block_dimensions[X] + pivot_x - (pivot_x * cos + pivot_z * sin),
+                   pos[Y] * block_dimensions[Y],
+                   pos[Z] * block_dimensions[Z] + pivot_z - (pivot_z * cos - pivot_x * sin))
+    return translation, (0, angle, 0)
+
+
+def block_node_name(group_name, pos):
+    """
+    Returns the name of the group node of a block in a level scene
+    :param group_name: The name of the group containing the shapes comprising the block in the scene file
+    :param pos: The (X,Y,Z) position of the block
+    :return: The name, {group_name}_{i}_{j}_{k}
+    """
+    return "{}_{}_{}_{}".format(group_name, pos[X], pos[Y], pos[Z])
+
+
+def iter_statements(lines):
+    """
+    Splits the lines of a Maya ASCII file into statements, one line at a time. Comment lines between statements are
+    skipped
+    :param lines: Iterable of lines, such as an open file
+    :return: Iterator of statement texts, without the ending semicolons
+    """
+    parts = [][:]  # Pieces of the statement so far
+    for line in lines:
+        if len(parts) == 0 and line.lstrip().startswith("//"):
+            continue
+        start = 0
+        for match in STATEMENT_PATTERN.finditer(line):
+            if match.group() == ";":
+                parts.append(line[start:match.start()])
+                text = "".join(parts).strip()
+                if len(text) > 0:
+                    yield text
+                parts = [][:]
+                start = match.end()
+        parts.append(line[start:])
+    text = "".join(parts).strip()
+    if len(text) > 0 and not text.startswith("//"):
+        yield text
+
+
+def statement_tokens(text):
+    """
+    Splits a statement into its command and arguments. Strings lose their quotes and escapes
+    :param text: The statement text
+    :return: List of tokens
+    """
+    tokens = [][:]
+    for match in TOKEN_PATTERN.finditer(text):
+        if match.group(2) is not None:
+            tokens.append(match.group(2))
+        else:
+            tokens.append(re.sub(r"\\(.)", r"\1", match.group(1)))
+    return tokens
+
+
+def flag_value(tokens, short_flag, long_flag):
+    """
+    Returns the value after a flag of a statement
+    :param tokens: The statement's tokens
+    :param short_flag: The flag's short name, such as -n
+    :param long_flag: The flag's long name, such as -name
+    :return: The value, or None if the flag isn't there
+    """
+    for i, token in enumerate(tokens[:-1]):
+        if token == short_flag or token == long_flag:
+            return tokens[i + 1]
+    return None
+
+
+def plug_node(plug):
+    """
+    Returns the node name of a plug or DAG path, such as pCubeShape1 for |groupBlock|pCube1|pCubeShape1.i
+    :param plug: The plug
+    :return: The node name
+    """
+    return plug.split(".", 1)[0].rsplit("|", 1)[-1]
+
+
+def read_block_asset(lines, group_name=DEFAULT_GROUP_NAME):
+    """
+    Reads the block out of a Maya ASCII file without Maya. The file is read one statement at a time, and only the
+    nodes that might be part of the block are kept
+    :param lines: Iterable of the lines of the file, such as an open file
+    :param group_name: The name of the group containing the shapes comprising the block
+    :return: The BlockAsset
+    """
+    header = [][:]
+    nodes = [][:]  # Every node that isn't shared with the scene, in order
+    links = [][:]  # (source node, destination node, statement text) of each connectAttr and parent
+    relationships = [][:]  # (set of nodes, statement text) of each relationship
+    current = None  # Node the node statements change
+    for text in iter_statements(lines):
+        command = text.split(None, 1)[0]
+        if command == "createNode":
+            tokens = statement_tokens(text)
+            current = None
+            if "-s" in tokens or "-shared" in tokens or tokens[1] in SKIPPED_NODE_TYPES:
+                continue  # Cameras and other nodes every scene has
+            parent = flag_value(tokens, "-p", "-parent")
+            current = MaNode(tokens[1], flag_value(tokens, "-n", "-name"),
+                             plug_node(parent) if parent is not None else None, [text])
+            nodes.append(current)
+        elif command in NODE_COMMANDS:
+            if current is not None:
+                current.statements.append(text)
+        elif command == "rename" and "-uid" in text.split():
+            continue  # The node's ID, which is left out so Maya makes a new one
+        elif command == "connectAttr" or command == "parent":
+            tokens = [token for token in statement_tokens(text)[1:] if not token.startswith("-")]
+            links.append((plug_node(tokens[0]), plug_node(tokens[-1]), text))
+            current = None
+        elif command == "relationship":
+            relationships.append((set(plug_node(token) for token in statement_tokens(text)[2:]), text))
+            current = None
+        else:
+            if command in HEADER_COMMANDS and len(nodes) == 0:
+                header.append(text)
+            current = None  # select and the like change nodes that aren't kept
+
+    if not any(node.name == group_name for node in nodes):
+        raise MaFileError("No group named {}".format(group_name))
+
+    # The group and everything under it
+    keep = set([group_name])
+    for node in nodes:
+        if node.parent in keep:
+            keep.add(node.name)
+
+    # Then everything feeding into those, such as construction history
+    add_sources(keep, links, set())
+
+    # Then what those feed into, such as shading groups, and everything feeding into those, such as materials
+    shared = set(destination for source, destination, _ in links
+                 if source in keep and destination not in keep and not destination.startswith(":"))
+    add_sources(shared, links, keep)
+
+    connections = [text for source, destination, text in links
+                   if source in keep and (destination in keep or destination in shared or destination.startswith(":"))]
+    shared_connections = [text for source, destination, text in links
+                          if source in shared and (destination in shared or destination.startswith(":"))]
+    shared_connections.extend(text for relationship_nodes, text in relationships if relationship_nodes & shared)
+    return BlockAsset(group_name, header, [node for node in nodes if node.name in keep], connections,
+                      [node for node in nodes if node.name in shared], shared_connections)
+
+
+def add_sources(names, links, exclude):
+    """
+    Adds every node feeding into a set of nodes, directly or not, to the set. Maya's default nodes are never added
+    :param names: The set of node names
+    :param links: List of (source node, destination node, statement text) of the connections
+    :param exclude: Set of node names not to add
+    :return: None
+    """
+    found = True
+    while found:
+        found = False
+        for source, destination, _ in links:
+            if destination in names and source not in names and source not in exclude and not source.startswith(":"):
+                names.add(source)
+                found = True
+
+
+def rename_nodes(text, new_names):
+    """
+    Renames the nodes named in the strings of a createNode, connectAttr, parent or relationship statement. Plugs and
+    DAG paths have each of their nodes renamed. Other statements are returned unchanged, since their strings are values
+    :param text: The statement text
+    :param new_names: Dict of node names to their new names. Nodes not in it keep their names
+    :return: The renamed statement text
+    """
+    if text.split(None, 1)[0] not in RENAMED_COMMANDS:
+        return text
+
+    def rename(match):
+        parts = match.group(1).split(".", 1)
+        parts[0] = "|".join(new_names.get(name, name) for name in parts[0].split("|"))
+        return u'"{}"'.format(".".join(parts))
+    return STRING_PATTERN.sub(rename, text)
+
+
+def escape_braces(text):
+    """
+    Escapes the braces of a text so it can be part of a format string
+    :param text: The text
+    :return: The escaped text
+    """
+    return text.replace(u"{", u"{{").replace(u"}", u"}}")
+
+
+def file_digest(pth, group_name=DEFAULT_GROUP_NAME):
+    """
+    Returns the hash that baked assets of a file are stored under. It changes with the file's contents, the group
+    name and ASSET_VERSION, but not the file's path or modification time
+    :param pth: The path of the Maya ASCII file
+    :param group_name: The name of the group containing the shapes comprising the block
+    :return: The hex digest
+    """
+    import hashlib  # Imported here so importing the module stays fast
+
+    digest = hashlib.sha256(u"{}\0{}\0".format(ASSET_VERSION, group_name).encode("utf-8"))
+    with open(pth, "rb") as ma_file:
+        for chunk in iter(lambda: ma_file.read(READ_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_block_asset(pth, group_name=DEFAULT_GROUP_NAME, cache_dir=None):
+    """
+    Returns the block of a Maya ASCII file, from a baked copy in the cache if the file was read before
+    :param pth: The path of the Maya ASCII file
+    :param group_name: The name of the group containing the shapes comprising the block
+    :param cache_dir: The directory of baked assets. None means always read the file
+    :return: The BlockAsset
+    """
+    import json  # Imported here so importing the module stays fast
+
+    if cache_dir is None:
+        with io.open(pth, encoding=ENCODING) as ma_file:
+            return read_block_asset(ma_file, group_name)
+
+    cache_pth = os.path.join(cache_dir, file_digest(pth, group_name) + ".json")
+    if os.path.exists(cache_pth):
+        with io.open(cache_pth, encoding="utf-8") as cache_file:
+            return BlockAsset.from_dict(json.load(cache_file))
+
+    with io.open(pth, encoding=ENCODING) as ma_file:
+        asset = read_block_asset(ma_file, group_name)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    write_atomic(cache_pth, lambda cache_file: cache_file.write(json.dumps(asset.to_dict()).encode("utf-8")),
+                 binary=True, replace=False)
+    return asset
+
+
+def bake_block_scene(pth, group_name=DEFAULT_GROUP_NAME, cache_dir=None):
+    """
+    Returns the path of a Maya ASCII file with only the block of another, writing it to the cache if needed. Importing
+    it skips the cameras, UI scripts and other nodes of the original
+    :param pth: The path of the Maya ASCII file
+    :param group_name: The name of the group containing the shapes comprising the block
+    :param cache_dir: The directory of baked assets
+    :return: The path of the baked file
+    """
+    baked_pth = os.path.join(cache_dir, file_digest(pth, group_name) + ".ma")
+    if not os.path.exists(baked_pth):
+        asset = load_block_asset(pth, group_name, cache_dir)
+        write_atomic(baked_pth, asset.write, replace=False)
+    return baked_pth
+
+
+def write_atomic(pth, write, binary=False, replace=True):
+    """
+    Writes a file so readers never see it half written. It is written to a temporary file next to it, which is renamed
+    once write returns and removed if write fails, so a failed write leaves the old file as it was
+    :param pth: The path of the file
+    :param write: Function to call with the file object to write to
+    :param binary: Whether the file is opened for bytes. Else it is opened for text in ENCODING with \\n line endings
+    :param replace: Whether to replace the file if it exists. False keeps it, for files named by the hash of their
+        contents, which several processes may write at once
+    :return: None
+    """
+    tmp_pth = "{}.{}.tmp".format(pth, os.getpid())
+    try:
+        if binary:
+            out_file = open(tmp_pth, "wb")
+        else:
+            out_file = io.open(tmp_pth, "w", encoding=ENCODING, newline="\n")
+        with out_file:
+            write(out_file)
+        if replace and os.path.exists(pth):
+            os.remove(pth)  # Renaming onto a file fails on Windows
+        if not os.path.exists(pth):  # Else someone else wrote it, and it's the same since the name is the hash
+            os.rename(tmp_pth, pth)
+    finally:
+        if os.path.exists(tmp_pth):
+            os.remove(tmp_pth)
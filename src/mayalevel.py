@@ -8,584 +8,320 @@ ATCM 3311.0U1
 
 
 #====================================================== IMPORTS =======================================================#
-import blocks
-import level
+import mafile
+import scene
 
-import logging
-import maya.OpenMayaUI as omui
-import pymel.core.general as pmcg
-import pymel.core.system as pmcs
-import PySide2
-import shiboken2
+import os
 
 
 #====================================================== CONSTS ========================================================#
-X = 0  # Element of size tuple
-Y = 1  # Element of size tuple
-Z = 2  # Element of size tuple
-DEFAULT_BLOCK_SIZE = (10.0, 5.0, 10.0)  # Default dimensions for a unit block in Maya
-DEFAULT_GROUP_NAME = "groupBlock"  # Default name for the group to look for within the Maya scenes
-LOG = logging.getLogger(__name__)
-MAXIMUM_BLOCK_DIMENSION = 1e6  # The code has no maximum, but for the sake of the UI, we should set one
-MAXIMUM_BLOCK_PRECISION = 2  # The code has no maximum, but for the sake of the UI, we should set one
-MAXIMUM_SIZE = (50, 10, 50)  # The code has no maximum, but for the sake of running quickly, we should set one
-MAXIMUM_LENGTH = MAXIMUM_SIZE[X] * MAXIMUM_SIZE[Y] * MAXIMUM_SIZE[Z]  # Longest possible path
-MAXIMUM_WEIGHT_DIMENSION = 1e6  # The code has no maximum, but for the sake of the UI, we should set one
-MAXIMUM_WEIGHT_PRECISION = 2  # The code has no maximum, but for the sake of the UI, we should set one
-VALID_BLOCK_TYPES = (  # List of block types to request in the UI
-    blocks.BlockType.START,
-    blocks.BlockType.END,
-    blocks.BlockType.DEAD_END,
-    blocks.BlockType.STRAIGHT,
-    blocks.BlockType.RAMP,
-    blocks.BlockType.T_INTERSECTION,
-    blocks.BlockType.CROSS,
-    blocks.BlockType.CURVED,
-)
+DEFAULT_BLOCK_SIZE = mafile.DEFAULT_BLOCK_SIZE  # Default dimensions for a unit block in Maya
+DEFAULT_GROUP_NAME = mafile.DEFAULT_GROUP_NAME  # Default name for the group to look for within the Maya scenes
+INSTANCER_NAME = "levelBlockInstancer"  # Name of the instancer in SceneMode.INSTANCER
+INSTANCER_PARTICLES_NAME = "levelBlockParticles"  # Name of the particles placing the blocks in SceneMode.INSTANCER
+TEMPLATE_GROUP_NAME = "levelBlockTemplates"  # Name of the hidden group holding the imported block scenes
+TEMPLATE_NAME_FORMAT = "{}_template_{}"  # Name of an imported block scene from the group name and a number
 
 
-#===================================================== FUNCTIONS =======================================================#
-def maya_main_window():
-    """Return the maya main window widget"""
-    main_window = omui.MQtUtil.mainWindow()
-    return shiboken2.wrapInstance(long(main_window), PySide2.QtWidgets.QWidget)
+#====================================================== CLASSES =======================================================#
+class BlockTemplateCache(object):
+    """Imports each block scene file once and copies it for every block that uses it. Part of the Controller
 
+    The imported scenes are kept as templates in a hidden group. Templates are keyed by path and modification time, so
+    a block scene that was edited since it was imported is imported again. With an asset cache directory, only the
+    block is imported, from a copy baked by mafile, instead of the whole scene file. PyMEL is imported when first
+    used, so the module loads outside Maya
+    """
 
-#====================================================== CLASSES =======================================================#
-class MayaSceneLevelGenerator(object):
-    """Generates a Maya scene based of a Level model. Part of the Controller"""
+    def __init__(self, asset_cache_dir=None):
+        """
+        Creates an empty cache
+        :param asset_cache_dir: The directory of blocks baked by mafile.bake_block_scene. None means import the scene
+            files themselves
+        """
+        self.asset_cache_dir = asset_cache_dir
+        self._templates = dict()  # Path -> (modification time, template node name)
+        self._count = 0  # Number of templates made, for unique names
 
-    def __init__(self, lvl, block_dimensions=DEFAULT_BLOCK_SIZE, group_name=DEFAULT_GROUP_NAME):
+    def clear(self):
         """
-        Sets up the generator
-        :param lvl: The level data to create
-        :param block_dimensions: The dimensions of a unit block. Must be square (X = Z) but can have any height
+        Forgets every template, such as after a new scene. Does not delete the template nodes
+        :return: None
+        """
+        self._templates = dict()
+
+    def _template_group(self):
+        """
+        Returns the hidden group holding the templates, making it if needed
+        :return: The group's name
+        """
+        import pymel.core.general as pmcg
+
+        if not pmcg.objExists(TEMPLATE_GROUP_NAME):
+            pmcg.group(empty=True, name=TEMPLATE_GROUP_NAME)
+            pmcg.hide(TEMPLATE_GROUP_NAME)
+        return TEMPLATE_GROUP_NAME
+
+    def get_template(self, pth, group_name):
+        """
+        Returns the template for a block scene file, importing it if it isn't cached or was changed since
+        :param pth: The path of the block scene file
+        :param group_name: The name of the group containing the shapes comprising the block in the scene file
+        :return: The template node's name
+        """
+        import pymel.core.general as pmcg
+        import pymel.core.system as pmcs
+
+        mtime = os.path.getmtime(pth)
+        cached = self._templates.get(pth)
+        if cached is not None and pmcg.objExists(cached[1]):
+            if cached[0] == mtime:
+                return cached[1]
+            pmcg.delete(cached[1])  # Out of date
+
+        # Import the scene once and move it out of the way
+        if self.asset_cache_dir is not None:
+            pmcs.importFile(pmcs.Path(mafile.bake_block_scene(pth, group_name, self.asset_cache_dir)))
+        else:
+            pmcs.importFile(pmcs.Path(pth))
+        self._count += 1
+        name = TEMPLATE_NAME_FORMAT.format(group_name, self._count)
+        pmcg.rename(group_name, name)
+        pmcg.parent(name, self._template_group())
+        self._templates[pth] = (mtime, name)
+        return name
+
+    def make_block(self, pth, group_name, new_name, instance=False):
+        """
+        Makes a copy of a block scene file's template at the top of the scene
+        :param pth: The path of the block scene file
+        :param group_name: The name of the group containing the shapes comprising the block in the scene file
+        :param new_name: The name of the copy
+        :param instance: Whether to instance the template, sharing its shapes, instead of duplicating it
+        :return: The copy's name
+        """
+        import pymel.core.general as pmcg
+
+        template = self.get_template(pth, group_name)
+        if instance:
+            node = pmcg.instance(template, name=new_name)[0]
+        else:
+            node = pmcg.duplicate(template, name=new_name)[0]
+        pmcg.parent(node, world=True)
+        return node.name()
+
+
+class MayaSceneBackend(scene.SceneBackend):
+    """Makes the nodes of blocks in the open Maya scene. Part of the Controller
+
+    Each block scene file is imported once per scene and copied for every block that uses it. Undo and viewport
+    refresh are off during a batch. maya.cmds and PyMEL are imported when first used, so the module loads outside Maya
+    """
+
+    def __init__(self, group_name=DEFAULT_GROUP_NAME, asset_cache_dir=None):
+        """
+        Sets up the backend
         :param group_name: The name of the group containing the shapes comprising the block in each scene file
+        :param asset_cache_dir: The directory of blocks baked by mafile, so only the block of each scene file is
+            imported. None means import the scene files themselves
         """
-        self.lvl = lvl
-        self.block_dimensions = block_dimensions
         self.group_name = group_name
+        self._templates = BlockTemplateCache(asset_cache_dir)  # Each block scene file is imported once per scene
+        self._undo_state = None  # Whether undo was on before the batch
+        self._suspended = False  # Whether undo and viewport refresh are off for the batch
 
-    def generate(self):
+    def begin_batch(self):
         """
-        Generate the maya scene file
+        Turns off undo and viewport refresh
         :return: None
         """
-        # Clear the scene for the level
-        pmcs.newFile(force=True)
-
-        # Pivot for rotation
-        pivot = (self.block_dimensions[X]/2.0, 0, self.block_dimensions[Z]/2.0)
+        self.resume_batch()
 
-        # Go through each level item and place block
-        for i in range(self.lvl.size[X]):
-            for j in range(self.lvl.size[Y]):
-                for k in range(self.lvl.size[Z]):
-                    blk = self.lvl.get_block((i, j, k))
-
-                    # Don't worry about Empty or RampDummy blocks
-                    if blk.block_type != blocks.BlockType.EMPTY and blk.block_type != blocks.BlockType.RAMP_DUMMY:
-                        # Load the scene file
-                        pmcs.importFile(pmcs.Path(blk.pth))
+    def end_batch(self, completed=True):
+        """
+        Turns undo and viewport refresh back on
+        :param completed: Whether every change of the batch was made. Unused, the blocks placed so far are kept
+        :return: None
+        """
+        self.pause_batch()
 
-                        # Give block a unique name
-                        new_name = "{}_{}_{}_{}".format(self.group_name, i, j, k)
-                        pmcg.rename(self.group_name, new_name)
+    def pause_batch(self):
+        """
+        Turns undo and viewport refresh back on between chunks, so what the user does meanwhile can be undone and the
+        viewport shows the blocks placed so far
+        :return: None
+        """
+        import maya.cmds as cmds
 
-                        # Rotate it based on the orientation
+        if not self._suspended:
+            return
+        cmds.refresh(suspend=False)
+        cmds.undoInfo(stateWithoutFlush=self._undo_state)
+        self._suspended = False
 
-                        pmcg.rotate(new_name, [0, 90 * int(blk.orientation), 0], pivot=pivot)
+    def resume_batch(self):
+        """
+        Turns off undo and viewport refresh again for the next chunk. Undo is only turned back on afterwards if it was
+        on now, in case the user changed it between chunks
+        :return: None
+        """
+        import maya.cmds as cmds
 
-                        # Move it to the correct spot
-                        new_spot = [i * self.block_dimensions[X],
-                                    j * self.block_dimensions[Y],
-                                    k * self.block_dimensions[Z]]
-                        pmcg.move(new_name, new_spot)
+        if self._suspended:
+            return
+        self._undo_state = cmds.undoInfo(query=True, stateWithoutFlush=True)
+        cmds.undoInfo(stateWithoutFlush=False)
+        cmds.refresh(suspend=True)
+        self._suspended = True
 
+    def clear(self):
+        """
+        Makes a new scene, which also deletes the templates
+        :return: None
+        """
+        import pymel.core.system as pmcs
 
-class MayaSceneLevelGeneratorUI(PySide2.QtWidgets.QDialog):
-    """Maya Scene Level Generator UI Class. Is the View"""
+        pmcs.newFile(force=True)
+        self._templates.clear()
 
-    def __init__(self):
-        """Constructor, take needed actions"""
-        # Passing the class make this Python 2 and Python 3 compatible
-        super(MayaSceneLevelGeneratorUI, self).__init__(parent=maya_main_window())
+    def place_block(self, placement, mode):
+        """
+        Puts one block in the scene
+        :param placement: The BlockPlacement
+        :param mode: The SceneMode
+        :return: None
+        """
+        self.place_blocks([placement], mode, lambda phase: None)
 
-        # Create the generators needed
-        self._level_gen = level.LevelGenerator([blocks.BlockFile("", blk_type) for blk_type in VALID_BLOCK_TYPES])
-        self._scene_gen = MayaSceneLevelGenerator(None)  # Fill in level at button press time
+    def place_blocks(self, placements, mode, lap):
+        """
+        Puts blocks in the scene, importing each scene file before making any copies
+        :param placements: List of BlockPlacement
+        :param mode: The SceneMode
+        :param lap: Function to call with the name of each phase as it ends
+        :return: None
+        """
+        if mode == scene.SceneMode.INSTANCER:
+            self._place_instancer(placements, lap)
+            return
+        import maya.cmds as cmds
+
+        # Import each scene file once
+        for pth in set(placement.pth for placement in placements):
+            self._templates.get_template(pth, self.group_name)
+        lap("import")
+
+        # Copy the templates, with unique names
+        instance = mode == scene.SceneMode.INSTANCE
+        names = [self._templates.make_block(placement.pth, self.group_name, placement.name, instance=instance)
+                 for placement in placements]
+        lap("copy")
+
+        # One transform per node, straight through maya.cmds since it skips PyMEL's wrapping
+        for name, placement in zip(names, placements):
+            cmds.xform(name, translation=placement.translation, rotation=placement.rotation)
+        lap("transform")
+
+    def delete_blocks(self, names):
+        """
+        Deletes the nodes of blocks in one command, skipping any deleted by hand
+        :param names: List of the blocks' node names
+        :return: None
+        """
+        import maya.cmds as cmds
 
-        # Window things
-        self.setWindowTitle("Maya Scene Level Generator")
-        self.resize(500, 200)
-        self.setWindowFlags(self.windowFlags() ^ PySide2.QtCore.Qt.WindowContextHelpButtonHint)
+        names = cmds.ls(names) if len(names) > 0 else [][:]
+        if len(names) > 0:
+            cmds.delete(names)
 
-        # Set up for the first time
-        self._create_widgets()
-        self._create_layout()
-        self._refresh_view()
-        self._create_connections()  # Order matters, since refreshing triggers connections
+    def blocks_exist(self, names):
+        """
+        Returns whether the nodes of blocks are all in the scene, in one command. A name matching more than one node
+        counts as missing, since the scene wasn't made by the generator
+        :param names: List of the blocks' node names
+        :return: True if every node is in the scene else False
+        """
+        import maya.cmds as cmds
 
-        print(self._level_gen.block_list)  # TODO delete
+        return len(names) == 0 or len(cmds.ls(names)) == len(names)
 
-    def _refresh_view(self):
+    def _place_instancer(self, placements, lap):
         """
-        Refreshes the window with new data
-        :param from_spinbox: Whether this request is coming from a spinbox. If so, no need to update spinboxes
+        Places every block with one particle instancer. Each block is a particle with the index of its scene file's
+        template and its rotation, all set at once from arrays
+        :param placements: List of BlockPlacement
+        :param lap: Function to call with the name of each phase as it ends
         :return: None
         """
-        # Level Size
-        self._level_size_x_spinbox.setValue(self._level_gen.size[X])
-        self._level_size_y_spinbox.setValue(self._level_gen.size[Y])
-        self._level_size_z_spinbox.setValue(self._level_gen.size[Z])
-
-        # Minimum Length
-        self._minimum_length_checkbox.setChecked(self._level_gen.minimum_length is not None)
-        self._minimum_length_spinbox.setValue(self._level_gen.minimum_length
-                                              if self._level_gen.minimum_length is not None else 0)
-        self._minimum_length_spinbox.setEnabled(self._level_gen.minimum_length is not None)
-
-        # Maximum Length
-        self._maximum_length_checkbox.setChecked(self._level_gen.maximum_length is not None)
-        self._maximum_length_spinbox.setValue(self._level_gen.maximum_length
-                                              if self._level_gen.maximum_length is not None else MAXIMUM_LENGTH)
-        self._maximum_length_spinbox.setEnabled(self._level_gen.maximum_length is not None)
-
-        # Seed
-        self._seed_checkbox.setChecked(self._level_gen.seed is not None)
-        self._seed_le.setText(str(self._level_gen.seed) if self._level_gen.seed is not None else "")
-        self._seed_le.setEnabled(self._level_gen.seed is not None)
-
-        # Block Size
-        self._block_size_x_spinbox.setValue(self._scene_gen.block_dimensions[X])
-        self._block_size_y_spinbox.setValue(self._scene_gen.block_dimensions[Y])
-        self._block_size_z_spinbox.setValue(self._scene_gen.block_dimensions[Z])
-
-        # Group Name
-        self._group_name_le.setText(self._scene_gen.group_name)
-
-        # Object Block List
-        for blk_type in VALID_BLOCK_TYPES:
-            idx = VALID_BLOCK_TYPES.index(blk_type)
-            self._object_blocks[blk_type]["pth_le"].setText(self._level_gen.block_list[idx].pth)
-            self._object_blocks[blk_type]["weight_spinbox"].setValue(self._level_gen.block_list[idx].weight)
-
-    def _create_widgets(self):
-        """Create widgets for the UI"""
-        # Generator Settings Group
-        self._generator_group_box = PySide2.QtWidgets.QGroupBox()
-        self._generator_group_box.setTitle("Level Generator Settings")
-
-        # Level Size
-        self._level_size_lbl = PySide2.QtWidgets.QLabel("Level Size")
-        # X
-        self._level_size_x_lbl = PySide2.QtWidgets.QLabel("X")
-        self._level_size_x_spinbox = PySide2.QtWidgets.QSpinBox()
-        self._level_size_x_spinbox.setMinimum(level.MINIMUM_SIZE[X])
-        self._level_size_x_spinbox.setMaximum(MAXIMUM_SIZE[X])
-        # Y
-        self._level_size_y_lbl = PySide2.QtWidgets.QLabel("Y")
-        self._level_size_y_spinbox = PySide2.QtWidgets.QSpinBox()
-        self._level_size_y_spinbox.setMinimum(level.MINIMUM_SIZE[Y])
-        self._level_size_x_spinbox.setMaximum(MAXIMUM_SIZE[Y])
-        # Z
-        self._level_size_z_lbl = PySide2.QtWidgets.QLabel("Z")
-        self._level_size_z_spinbox = PySide2.QtWidgets.QSpinBox()
-        self._level_size_z_spinbox.setMinimum(level.MINIMUM_SIZE[Z])
-        self._level_size_x_spinbox.setMaximum(MAXIMUM_SIZE[Z])
-
-        # Minimum Length
-        self._minimum_length_checkbox = PySide2.QtWidgets.QCheckBox("Minimum Length")
-        self._minimum_length_spinbox = PySide2.QtWidgets.QSpinBox()
-        self._minimum_length_spinbox.setMinimum(0)  # Negative minimum lengths don't make sense
-        self._minimum_length_spinbox.setMaximum(MAXIMUM_LENGTH)  # Minimum lengths > max length doesn't make sense
-
-        # Maximum Length
-        self._maximum_length_checkbox = PySide2.QtWidgets.QCheckBox("Maximum Length")
-        self._maximum_length_spinbox = PySide2.QtWidgets.QSpinBox()
-        self._maximum_length_spinbox.setMinimum(2)  # Maximum lengths < 2 don't make sense
-        self._maximum_length_spinbox.setMaximum(MAXIMUM_LENGTH)  # Maximum lengths > max length doesn't make sense
-
-        # Seed
-        self._seed_checkbox = PySide2.QtWidgets.QCheckBox("Seed")
-        self._seed_le = PySide2.QtWidgets.QLineEdit()
-
-        # Scene Settings Group
-        self._scene_group_box = PySide2.QtWidgets.QGroupBox()
-        self._scene_group_box.setTitle("Maya Scene Settings")
-
-        # Block Size
-        self._block_size_lbl = PySide2.QtWidgets.QLabel("Block Size")
-        # X
-        self._block_size_x_lbl = PySide2.QtWidgets.QLabel("X")
-        self._block_size_x_spinbox = PySide2.QtWidgets.QDoubleSpinBox()
-        self._block_size_x_spinbox.setMinimum(0)
-        self._block_size_x_spinbox.setMaximum(MAXIMUM_BLOCK_DIMENSION)
-        self._block_size_x_spinbox.setDecimals(MAXIMUM_BLOCK_PRECISION)
-        self._block_size_x_spinbox.setSingleStep(float("1e-{}".format(MAXIMUM_BLOCK_PRECISION)))
-        # Y
-        self._block_size_y_lbl = PySide2.QtWidgets.QLabel("Y")
-        self._block_size_y_spinbox = PySide2.QtWidgets.QDoubleSpinBox()
-        self._block_size_y_spinbox.setMinimum(0)
-        self._block_size_y_spinbox.setMaximum(MAXIMUM_BLOCK_DIMENSION)
-        self._block_size_y_spinbox.setDecimals(MAXIMUM_BLOCK_PRECISION)
-        self._block_size_x_spinbox.setSingleStep(float("1e-{}".format(MAXIMUM_BLOCK_PRECISION)))
-        # Z
-        self._block_size_z_lbl = PySide2.QtWidgets.QLabel("Z")
-        self._block_size_z_spinbox = PySide2.QtWidgets.QDoubleSpinBox()
-        self._block_size_z_spinbox.setMinimum(0)
-        self._block_size_z_spinbox.setMaximum(MAXIMUM_BLOCK_DIMENSION)
-        self._block_size_z_spinbox.setDecimals(MAXIMUM_BLOCK_PRECISION)
-        self._block_size_x_spinbox.setSingleStep(float("1e-{}".format(MAXIMUM_BLOCK_PRECISION)))
-
-        # Group Name
-        self._group_name_lbl = PySide2.QtWidgets.QLabel("Maya Group Name")
-        self._group_name_le = PySide2.QtWidgets.QLineEdit()
-
-        # Object Block Group
-        self._block_group_box = PySide2.QtWidgets.QGroupBox()
-        self._block_group_box.setTitle("Object Block Settings")
-
-        # Object Blocks
-        self._object_blocks = dict()
-        for blk_type in VALID_BLOCK_TYPES:
-            self._object_blocks[blk_type] = dict()
-            self._object_blocks[blk_type]["group"] = PySide2.QtWidgets.QGroupBox()
-            self._object_blocks[blk_type]["group"].setTitle(blocks.BLOCK_TYPE_STR[blk_type])
-            self._object_blocks[blk_type]["group"].setStyleSheet("QGroupBox{border: 5px solid #444444;}")
-
-            # Path
-            self._object_blocks[blk_type]["pth_lbl"] = PySide2.QtWidgets.QLabel("Path")
-            self._object_blocks[blk_type]["pth_le"] = PySide2.QtWidgets.QLineEdit()
-
-            # Weight
-            self._object_blocks[blk_type]["weight_lbl"] = PySide2.QtWidgets.QLabel("Weight")
-            self._object_blocks[blk_type]["weight_spinbox"] = PySide2.QtWidgets.QDoubleSpinBox()
-            self._object_blocks[blk_type]["weight_spinbox"].setMinimum(0)
-            self._object_blocks[blk_type]["weight_spinbox"].setMaximum(MAXIMUM_WEIGHT_DIMENSION)
-            self._object_blocks[blk_type]["weight_spinbox"].setDecimals(MAXIMUM_WEIGHT_PRECISION)
-            self._object_blocks[blk_type]["weight_spinbox"].setSingleStep(
-                float("1e-{}".format(MAXIMUM_WEIGHT_PRECISION)))
-
-        # Buttons
-        self._cancel_btn = PySide2.QtWidgets.QPushButton("Cancel")
-        self._generate_btn = PySide2.QtWidgets.QPushButton("Generate")
-
-    def _create_layout(self):
-        """Lay out the UI elements"""
-        # Level Size
-        self._level_size_lay = PySide2.QtWidgets.QHBoxLayout()
-        self._level_size_lay.addWidget(self._level_size_lbl)
-        self._level_size_lay.addSpacing(10)
-        self._level_size_lay.addWidget(self._level_size_x_lbl)
-        self._level_size_lay.addWidget(self._level_size_x_spinbox)
-        self._level_size_lay.addSpacing(5)
-        self._level_size_lay.addWidget(self._level_size_y_lbl)
-        self._level_size_lay.addWidget(self._level_size_y_spinbox)
-        self._level_size_lay.addSpacing(5)
-        self._level_size_lay.addWidget(self._level_size_z_lbl)
-        self._level_size_lay.addWidget(self._level_size_z_spinbox)
-        self._level_size_lay.addStretch()
-
-        # Minimum Length
-        self._minimum_length_lay = PySide2.QtWidgets.QHBoxLayout()
-        self._minimum_length_lay.addWidget(self._minimum_length_checkbox)
-        self._minimum_length_lay.addSpacing(5)
-        self._minimum_length_lay.addWidget(self._minimum_length_spinbox)
-        self._minimum_length_lay.addStretch()
-
-        # Minimum Length
-        self._maximum_length_lay = PySide2.QtWidgets.QHBoxLayout()
-        self._maximum_length_lay.addWidget(self._maximum_length_checkbox)
-        self._maximum_length_lay.addSpacing(5)
-        self._maximum_length_lay.addWidget(self._maximum_length_spinbox)
-        self._maximum_length_lay.addStretch()
-
-        # Seed
-        self._seed_lay = PySide2.QtWidgets.QHBoxLayout()
-        self._seed_lay.addWidget(self._seed_checkbox)
-        self._seed_lay.addSpacing(5)
-        self._seed_lay.addWidget(self._seed_le)
-
-        # Generator Settings Group Box
-        self._generator_lay = PySide2.QtWidgets.QVBoxLayout()
-        self._generator_lay.addLayout(self._level_size_lay)
-        self._generator_lay.addLayout(self._minimum_length_lay)
-        self._generator_lay.addLayout(self._maximum_length_lay)
-        self._generator_lay.addLayout(self._seed_lay)
-        self._generator_group_box.setLayout(self._generator_lay)
-
-        # Block Size
-        self._block_size_lay = PySide2.QtWidgets.QHBoxLayout()
-        self._block_size_lay.addWidget(self._block_size_lbl)
-        self._block_size_lay.addSpacing(10)
-        self._block_size_lay.addWidget(self._block_size_x_lbl)
-        self._block_size_lay.addWidget(self._block_size_x_spinbox)
-        self._block_size_lay.addSpacing(5)
-        self._block_size_lay.addWidget(self._block_size_y_lbl)
-        self._block_size_lay.addWidget(self._block_size_y_spinbox)
-        self._block_size_lay.addSpacing(5)
-        self._block_size_lay.addWidget(self._block_size_z_lbl)
-        self._block_size_lay.addWidget(self._block_size_z_spinbox)
-        self._block_size_lay.addStretch()
-
-        # Group Name
-        self._group_name_lay = PySide2.QtWidgets.QHBoxLayout()
-        self._group_name_lay.addWidget(self._group_name_lbl)
-        self._group_name_lay.addSpacing(10)
-        self._group_name_lay.addWidget(self._group_name_le)
-
-        # Maya Scene Group Box
-        self._scene_lay = PySide2.QtWidgets.QVBoxLayout()
-        self._scene_lay.addLayout(self._block_size_lay)
-        self._scene_lay.addLayout(self._group_name_lay)
-        self._scene_group_box.setLayout(self._scene_lay)
-
-        # Object Blocks
-        for blk_type in VALID_BLOCK_TYPES:
-            # Path
-            self._object_blocks[blk_type]["pth_lay"] = PySide2.QtWidgets.QHBoxLayout()
-            self._object_blocks[blk_type]["pth_lay"].addWidget(self._object_blocks[blk_type]["pth_lbl"])
-            self._object_blocks[blk_type]["pth_lay"].addSpacing(10)
-            self._object_blocks[blk_type]["pth_lay"].addWidget(self._object_blocks[blk_type]["pth_le"])
-            
-            # Weight
-            self._object_blocks[blk_type]["weight_lay"] = PySide2.QtWidgets.QHBoxLayout()
-            self._object_blocks[blk_type]["weight_lay"].addWidget(self._object_blocks[blk_type]["weight_lbl"])
-            self._object_blocks[blk_type]["weight_lay"].addSpacing(10)
-            self._object_blocks[blk_type]["weight_lay"].addWidget(self._object_blocks[blk_type]["weight_spinbox"])
-            self._object_blocks[blk_type]["weight_lay"].addStretch()
-
-            # Object Block Group
-            self._object_blocks[blk_type]["group_lay"] = PySide2.QtWidgets.QVBoxLayout()
-            self._object_blocks[blk_type]["group_lay"].addSpacing(15)
-            self._object_blocks[blk_type]["group_lay"].addLayout(self._object_blocks[blk_type]["pth_lay"])
-            self._object_blocks[blk_type]["group_lay"].addLayout(self._object_blocks[blk_type]["weight_lay"])
-            self._object_blocks[blk_type]["group"].setLayout(self._object_blocks[blk_type]["group_lay"])
-
-        # Object Block Group Box
-        self._block_lay = PySide2.QtWidgets.QVBoxLayout()
-        for blk_type in VALID_BLOCK_TYPES:
-            self._block_lay.addWidget(self._object_blocks[blk_type]["group"])
-        self._block_group_box.setLayout(self._block_lay)
-
-        # Buttons
-        self._button_lay = PySide2.QtWidgets.QHBoxLayout()
-        self._button_lay.addWidget(self._cancel_btn)
-        self._block_size_lay.addSpacing(5)
-        self._button_lay.addWidget(self._generate_btn)
-
-        # Main
-        self._main_lay = PySide2.QtWidgets.QVBoxLayout()
-        self._main_lay.addWidget(self._generator_group_box)
-        self._main_lay.addWidget(self._scene_group_box)
-        self._main_lay.addWidget(self._block_group_box)
-        self._main_lay.addLayout(self._button_lay)
-
-        # Set the layout
-        self.setLayout(self._main_lay)
-
-    def _create_connections(self):
-        """Connect widget signals to slots"""
-        # Level Size
-        self._level_size_x_spinbox.valueChanged.connect(self._set_x_size)
-        self._level_size_y_spinbox.valueChanged.connect(self._set_y_size)
-        self._level_size_z_spinbox.valueChanged.connect(self._set_z_size)
-
-        # Minimum Length
-        self._minimum_length_checkbox.toggled.connect(self._checked_minimum)
-        self._minimum_length_spinbox.valueChanged.connect(self._set_minimum)
-
-        # Maximum Length
-        self._maximum_length_checkbox.toggled.connect(self._checked_maximum)
-        self._maximum_length_spinbox.valueChanged.connect(self._set_maximum)
-
-        # Seed
-        self._seed_checkbox.toggled.connect(self._checked_seed)
-        self._seed_le.textEdited.connect(self._set_seed)
-        
-        # Block Size
-        self._block_size_x_spinbox.valueChanged.connect(self._set_x_block_size)
-        self._block_size_y_spinbox.valueChanged.connect(self._set_y_block_size)
-        self._block_size_z_spinbox.valueChanged.connect(self._set_z_block_size)
-
-        # Group Name
-        self._group_name_le.textEdited.connect(self._set_group_name)
-
-        # Object Blocks
-        for blk_type in VALID_BLOCK_TYPES:
-            self._object_blocks[blk_type]["pth_le"].textEdited.connect(self._object_block_pth(blk_type))
-            self._object_blocks[blk_type]["weight_spinbox"].valueChanged.connect(self._object_block_weight(blk_type))
-
-        # Buttons
-        self._cancel_btn.clicked.connect(self._cancel)
-        self._generate_btn.clicked.connect(self._generate)
-
-    def _block_signals(self):
-        """Block signals while updating info"""
-        self._minimum_length_spinbox.blockSignals(True)
-        self._maximum_length_spinbox.blockSignals(True)
-        self._seed_le.blockSignals(True)
-
-    def _unblock_signals(self):
-        """Unblock signals after updating info"""
-        self._minimum_length_spinbox.blockSignals(False)
-        self._maximum_length_spinbox.blockSignals(False)
-        self._seed_le.blockSignals(False)
-
-    @PySide2.QtCore.Slot()
-    def _set_x_size(self):
-        """Sets the X dimension of the level size"""
-        self._level_gen.size = (self._level_size_x_spinbox.value(),
-                                self._level_gen.size[Y],
-                                self._level_gen.size[Z])
-        self._refresh_view()
-
-    @PySide2.QtCore.Slot()
-    def _set_y_size(self):
-        """Sets the Y dimension of the level size"""
-        self._level_gen.size = (self._level_gen.size[X],
-                                self._level_size_y_spinbox.value(),
-                                self._level_gen.size[Z])
-        self._refresh_view()
-
-    @PySide2.QtCore.Slot()
-    def _set_z_size(self):
-        """Sets the Z dimension of the level size"""
-        self._level_gen.size = (self._level_gen.size[X],
-                                self._level_gen.size[Y],
-                                self._level_size_z_spinbox.value())
-        self._refresh_view()
-
-    @PySide2.QtCore.Slot()
-    def _checked_minimum(self):
-        """Toggles whether a minimum value is set"""
-        self._block_signals()
-        if self._minimum_length_checkbox.isChecked():
-            # Minimum length enabled
-            self._level_gen.minimum_length = 0
-        else:
-            # Minimum length disabled
-            self._level_gen.minimum_length = None
-        self._refresh_view()
-        self._unblock_signals()
-
-    @PySide2.QtCore.Slot()
-    def _set_minimum(self):
-        """Sets the minimum length"""
-        self._level_gen.minimum_length = self._minimum_length_spinbox.value()
-        self._refresh_view()
-
-    @PySide2.QtCore.Slot()
-    def _checked_maximum(self):
-        """Toggles whether a maximum value is set"""
-        self._block_signals()
-        if self._maximum_length_checkbox.isChecked():
-            # Maximum length enabled
-            self._level_gen.maximum_length = MAXIMUM_LENGTH
-        else:
-            # Maximum length disabled
-            self._level_gen.maximum_length = None
-        self._refresh_view()
-        self._unblock_signals()
-
-    @PySide2.QtCore.Slot()
-    def _set_maximum(self):
-        """Sets the maximum length"""
-        self._level_gen.maximum_length = self._maximum_length_spinbox.value()
-        self._refresh_view()
-
-    @PySide2.QtCore.Slot()
-    def _checked_seed(self):
-        """Toggles whether a seed is set"""
-        self._block_signals()
-        if self._seed_checkbox.isChecked():
-            # Seed enabled
-            self._level_gen.seed = ""
-        else:
-            # Seed disabled (use random seed)
-            self._level_gen.seed = None
-        self._refresh_view()
-        self._unblock_signals()
-
-    @PySide2.QtCore.Slot()
-    def _set_seed(self):
-        """Sets the seed"""
-        self._level_gen.seed = self._seed_le.text()
-        self._refresh_view()
-
-    @PySide2.QtCore.Slot()
-    def _set_x_block_size(self):
-        """Sets the X dimension of the block size"""
-        self._scene_gen.block_dimensions = (self._block_size_x_spinbox.value(),
-                                            self._scene_gen.block_dimensions[Y],
-                                            self._scene_gen.block_dimensions[Z])
-        self._refresh_view()
-
-    @PySide2.QtCore.Slot()
-    def _set_y_block_size(self):
-        """Sets the Y dimension of the block size"""
-        self._scene_gen.block_dimensions = (self._scene_gen.block_dimensions[X],
-                                            self._block_size_y_spinbox.value(),
-                                            self._scene_gen.block_dimensions[Z])
-        self._refresh_view()
-
-    @PySide2.QtCore.Slot()
-    def _set_z_block_size(self):
-        """Sets the Z dimension of the block size"""
-        self._scene_gen.block_dimensions = (self._scene_gen.block_dimensions[X],
-                                            self._scene_gen.block_dimensions[Y],
-                                            self._block_size_z_spinbox.value())
-        self._refresh_view()
-
-    @PySide2.QtCore.Slot()
-    def _set_group_name(self):
-        """Sets the group name for reading the Maya scene files"""
-        self._scene_gen.group_name = self._group_name_le.text()
-        self._refresh_view()
-
-    def _object_block_pth(self, blk_type):
-        """
-        Returns the Slot for editing an object block's path
-        :param blk_type: The block type
-        :return: The Slot
-        """
-        @PySide2.QtCore.Slot()
-        def inner_slot():
-            idx = VALID_BLOCK_TYPES.index(blk_type)
-            self._level_gen.block_list[idx].pth = self._object_blocks[blk_type]["pth_le"].text()
-            self._refresh_view()
-        return inner_slot
-
-    def _object_block_weight(self, blk_type):
-        """
-        Returns the Slot for editing an object block's weight
-        :param blk_type: The block type
-        :return: The Slot
-        """
-        @PySide2.QtCore.Slot()
-        def inner_slot():
-            idx = VALID_BLOCK_TYPES.index(blk_type)
-            self._level_gen.block_list[idx].weight = self._object_blocks[blk_type]["weight_spinbox"].value()
-            self._refresh_view()
-        return inner_slot
-
-    @PySide2.QtCore.Slot()
-    def _cancel(self):
-        """Quits the dialog"""
-        self.close()
-
-    @PySide2.QtCore.Slot()
-    def _generate(self):
-        """Generates the level"""
-        # Try to generate level and report errors
-        try:
-            self._scene_gen.lvl = self._level_gen.generate()
-            self._scene_gen.generate()
-        except level.CannotGenerateLevelError as err:
-            LOG.error(err.message)
-
-        # Give warning if minimum length not met
-        if self._scene_gen.lvl.length < self._level_gen.minimum_length:
-            LOG.warn("Level length {} is less than desired minimum {}".format(self._scene_gen.lvl.length,
-                                                                              self._level_gen.minimum_length))
+        import pymel.core.effects as pmce
+
+        # Build the per particle arrays
+        pths = [][:]
+        object_indices = dict()  # Path -> index into pths
+        indices = [][:]
+        for placement in placements:
+            if placement.pth not in object_indices:
+                object_indices[placement.pth] = len(pths)
+                pths.append(placement.pth)
+            indices.append(object_indices[placement.pth])
+        if len(placements) == 0:
+            return
+
+        templates = [self._templates.get_template(pth, self.group_name) for pth in pths]
+        lap("import")
+        _, shape = pmce.particle(position=[placement.translation for placement in placements],
+                                 name=INSTANCER_PARTICLES_NAME)
+        shape.isDynamic.set(False)  # The blocks don't move
+
+        # Set both the current and initial state of the per particle attributes
+        for attr_name, data_type, values in [("objectIndexPP", "doubleArray", indices),
+                                             ("rotationPP", "vectorArray",
+                                              [placement.rotation for placement in placements])]:
+            for name in [attr_name, attr_name + "0"]:
+                shape.addAttr(name, dataType=data_type)
+                shape.attr(name).set(values, type=data_type)
+
+        pmce.particleInstancer(shape, addObject=True, object=templates, objectIndex="objectIndexPP",
+                               rotation="rotationPP", name=INSTANCER_NAME)
+        lap("instancer")
+
+
+class MayaSceneLevelGenerator(scene.SceneLevelGenerator):
+    """Generates a Maya scene based of a Level model. Part of the Controller"""
+
+    def __init__(self, lvl, block_dimensions=DEFAULT_BLOCK_SIZE, group_name=DEFAULT_GROUP_NAME,
+                 mode=scene.SceneMode.DUPLICATE, asset_cache_dir=None):
+        """
+        Sets up the generator
+        :param lvl: The level data to create
+        :param block_dimensions: The dimensions of a unit block. Must be square (X = Z) but can have any height
+        :param group_name: The name of the group containing the shapes comprising the block in each scene file
+        :param mode: The SceneMode. Instances share the shapes of their scene file, so they are lighter but editing one
+            edits every block from the same file. The instancer is lightest, but its blocks can't be edited one by one
+        :param asset_cache_dir: The directory of blocks baked by mafile, so only the block of each scene file is
+            imported. None means import the scene files themselves
+        """
+        super(MayaSceneLevelGenerator, self).__init__(lvl, MayaSceneBackend(group_name, asset_cache_dir),
+                                                      block_dimensions, group_name, mode)
+
+    @property
+    def group_name(self):
+        """The name of the group containing the shapes comprising the block in each scene file"""
+        return self.backend.group_name
+
+    @group_name.setter
+    def group_name(self, group_name):
+        """Sets the group name of the generator and its backend"""
+        self.backend.group_name = group_name
+
+
+#===================================================== FUNCTIONS =======================================================#
+def MayaSceneLevelGeneratorUI():
+    """
+    Makes the UI, which lives in mayalevelui so PySide2 is only imported when the UI is opened. Kept so code that opens
+    the UI with mayalevel.MayaSceneLevelGeneratorUI() still works
+    :return: The mayalevelui.MayaSceneLevelGeneratorUI
+    """
+    import mayalevelui
+
+    return mayalevelui.MayaSceneLevelGeneratorUI()
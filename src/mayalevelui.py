@@ -0,0 +1,727 @@
+"""
+mayalevelui.py
+Asmita Chitale
+Assignment 03
+ATCM 3311.0U1
+07/24/2020
+"""
+
+
+#====================================================== IMPORTS =======================================================#
+import blocks
+import level
+import mayalevel
+import scene
+
+import logging
+import maya.OpenMayaUI as omui
+import PySide2
+import shiboken2
+
+
+#====================================================== CONSTS ========================================================#
+X = 0  # Element of size tuple
+Y = 1  # Element of size tuple
+Z = 2  # Element of size tuple
+LOG = logging.getLogger(__name__)
+MAXIMUM_BLOCK_DIMENSION = 1e6  # The code has no maximum, but for the sake of the UI, we should set one
+MAXIMUM_BLOCK_PRECISION = 2  # The code has no maximum, but for the sake of the UI, we should set one
+MAXIMUM_SIZE = (50, 10, 50)  # The code has no maximum, but for the sake of running quickly, we should set one
+MAXIMUM_LENGTH = MAXIMUM_SIZE[X] * MAXIMUM_SIZE[Y] * MAXIMUM_SIZE[Z]  # Longest possible path
+MAXIMUM_WEIGHT_DIMENSION = 1e6  # The code has no maximum, but for the sake of the UI, we should set one
+MAXIMUM_WEIGHT_PRECISION = 2  # The code has no maximum, but for the sake of the UI, we should set one
+SCENE_CHUNK_SIZE = 200  # Blocks placed per event loop tick while building the scene, so Maya stays responsive
+VALID_BLOCK_TYPES = (  # List of block types to request in the UI
+    blocks.BlockType.START,
+    blocks.BlockType.END,
+    blocks.BlockType.DEAD_END,
+    blocks.BlockType.STRAIGHT,
+    blocks.BlockType.RAMP,
+    blocks.BlockType.T_INTERSECTION,
+    blocks.BlockType.CROSS,
+    blocks.BlockType.CURVED,
+)
+
+
+#===================================================== FUNCTIONS =======================================================#
+def maya_main_window():
+    """Return the maya main window widget"""
+    main_window = omui.MQtUtil.mainWindow()
+    return shiboken2.wrapInstance(long(main_window), PySide2.QtWidgets.QWidget)
+
+
+#====================================================== CLASSES =======================================================#
+class LevelGenerationThread(PySide2.QtCore.QThread):
+    """Generates a level in a worker thread so the UI stays responsive. Part of the Controller
+
+    The thread has its own LevelGenerator, so the settings in the UI can change while it runs. Levels are made with
+    generate_with_retries, so a dead end is backtracked out of instead of failing the whole level. Signals are emitted
+    from the worker thread and reach slots in the UI through Qt's event loop
+    """
+    progress = PySide2.QtCore.Signal(int, int)  # Blocks placed and remaining spots, every few placements
+    generated = PySide2.QtCore.Signal(object)  # The Level, once done
+    failed = PySide2.QtCore.Signal(str)  # The reason the level couldn't be generated
+    cancelled = PySide2.QtCore.Signal()  # Emitted instead of generated if cancel was called
+
+    def __init__(self, level_gen, parent=None):
+        """
+        Sets up the thread
+        :param level_gen: The LevelGenerator to use. Only the thread should use it while the thread runs
+        :param parent: The parent QObject, which keeps the thread alive
+        """
+        super(LevelGenerationThread, self).__init__(parent)
+        self._level_gen = level_gen
+        self._cancel_token = level.CancellationToken()
+
+    def cancel(self):
+        """
+        Asks the generation to stop. It stops within one placement and emits cancelled
+        :return: None
+        """
+        self._cancel_token.cancel()
+
+    def is_cancelled(self):
+        """
+        Returns whether cancel was called, even if the level was already done
+        :return: True if cancelled else False
+        """
+        return self._cancel_token.cancelled
+
+    def run(self):
+        """Generates the level, reporting progress and the result through signals"""
+        try:
+            result = self._level_gen.generate_with_retries(cancel_token=self._cancel_token,
+                                                           progress=self.progress.emit)
+        except level.GenerationCancelledError:
+            self.cancelled.emit()
+        except level.CannotGenerateLevelError as err:
+            self.failed.emit(str(err))
+        except Exception as err:
+            # Anything else would end the thread without a signal and leave the UI waiting
+            LOG.exception("Level generation failed")
+            self.failed.emit("Level generation failed: {}".format(err))
+        else:
+            LOG.info("Generated level with seed {} in {} attempts and {} backtracks"
+                     .format(result.seed, result.attempts, result.backtracks))
+            self.generated.emit(result.level)
+
+
+class MayaSceneLevelGeneratorUI(PySide2.QtWidgets.QDialog):
+    """Maya Scene Level Generator UI Class. Is the View"""
+
+    def __init__(self):
+        """Constructor, take needed actions"""
+        # Passing the class make this Python 2 and Python 3 compatible
+        super(MayaSceneLevelGeneratorUI, self).__init__(parent=maya_main_window())
+
+        # Create the generators needed
+        self._level_gen = level.LevelGenerator([blocks.BlockFile("", blk_type) for blk_type in VALID_BLOCK_TYPES])
+        self._scene_gen = mayalevel.MayaSceneLevelGenerator(None)  # Fill in level at button press time
+        self._generation_thread = None  # The LevelGenerationThread while a level is generated
+        self._scene_steps = None  # Iterator building the scene a chunk at a time while the scene is built
+
+        # Window things
+        self.setWindowTitle("Maya Scene Level Generator")
+        self.resize(500, 200)
+        self.setWindowFlags(self.windowFlags() ^ PySide2.QtCore.Qt.WindowContextHelpButtonHint)
+
+        # Set up for the first time
+        self._create_widgets()
+        self._create_layout()
+        self._refresh_view()
+        self._create_connections()  # Order matters, since refreshing triggers connections
+
+    def _refresh_view(self):
+        """
+        Refreshes the window with new data
+        :param from_spinbox: Whether this request is coming from a spinbox. If so, no need to update spinboxes
+        :return: None
+        """
+        # Level Size
+        self._level_size_x_spinbox.setValue(self._level_gen.size[X])
+        self._level_size_y_spinbox.setValue(self._level_gen.size[Y])
+        self._level_size_z_spinbox.setValue(self._level_gen.size[Z])
+
+        # Minimum Length
+        self._minimum_length_checkbox.setChecked(self._level_gen.minimum_length is not None)
+        self._minimum_length_spinbox.setValue(self._level_gen.minimum_length
+                                              if self._level_gen.minimum_length is not None else 0)
+        self._minimum_length_spinbox.setEnabled(self._level_gen.minimum_length is not None)
+
+        # Maximum Length
+        self._maximum_length_checkbox.setChecked(self._level_gen.maximum_length is not None)
+        self._maximum_length_spinbox.setValue(self._level_gen.maximum_length
+                                              if self._level_gen.maximum_length is not None else MAXIMUM_LENGTH)
+        self._maximum_length_spinbox.setEnabled(self._level_gen.maximum_length is not None)
+
+        # Seed
+        self._seed_checkbox.setChecked(self._level_gen.seed is not None)
+        self._seed_le.setText(str(self._level_gen.seed) if self._level_gen.seed is not None else "")
+        self._seed_le.setEnabled(self._level_gen.seed is not None)
+
+        # Block Size
+        self._block_size_x_spinbox.setValue(self._scene_gen.block_dimensions[X])
+        self._block_size_y_spinbox.setValue(self._scene_gen.block_dimensions[Y])
+        self._block_size_z_spinbox.setValue(self._scene_gen.block_dimensions[Z])
+
+        # Group Name
+        self._group_name_le.setText(self._scene_gen.group_name)
+
+        # Scene Mode
+        self._scene_mode_cmb.setCurrentIndex(self._scene_gen.mode.value)
+
+        # Object Block List
+        for blk_type in VALID_BLOCK_TYPES:
+            idx = VALID_BLOCK_TYPES.index(blk_type)
+            self._object_blocks[blk_type]["pth_le"].setText(self._level_gen.block_list[idx].pth)
+            self._object_blocks[blk_type]["weight_spinbox"].setValue(self._level_gen.block_list[idx].weight)
+
+    def _create_widgets(self):
+        """Create widgets for the UI"""
+        # Generator Settings Group
+        self._generator_group_box = PySide2.QtWidgets.QGroupBox()
+        self._generator_group_box.setTitle("Level Generator Settings")
+
+        # Level Size
+        self._level_size_lbl = PySide2.QtWidgets.QLabel("Level Size")
+        # X
+        self._level_size_x_lbl = PySide2.QtWidgets.QLabel("X")
+        self._level_size_x_spinbox = PySide2.QtWidgets.QSpinBox()
+        self._level_size_x_spinbox.setMinimum(level.MINIMUM_SIZE[X])
+        self._level_size_x_spinbox.setMaximum(MAXIMUM_SIZE[X])
+        # Y
+        self._level_size_y_lbl = PySide2.QtWidgets.QLabel("Y")
+        self._level_size_y_spinbox = PySide2.QtWidgets.QSpinBox()
+        self._level_size_y_spinbox.setMinimum(level.MINIMUM_SIZE[Y])
+        self._level_size_x_spinbox.setMaximum(MAXIMUM_SIZE[Y])
+        # Z
+        self._level_size_z_lbl = PySide2.QtWidgets.QLabel("Z")
+        self._level_size_z_spinbox = PySide2.QtWidgets.QSpinBox()
+        self._level_size_z_spinbox.setMinimum(level.MINIMUM_SIZE[Z])
+        self._level_size_x_spinbox.setMaximum(MAXIMUM_SIZE[Z])
+
+        # Minimum Length
+        self._minimum_length_checkbox = PySide2.QtWidgets.QCheckBox("Minimum Length")
+        self._minimum_length_spinbox = PySide2.QtWidgets.QSpinBox()
+        self._minimum_length_spinbox.setMinimum(0)  # Negative minimum lengths don't make sense
+        self._minimum_length_spinbox.setMaximum(MAXIMUM_LENGTH)  # Minimum lengths > max length doesn't make sense
+
+        # Maximum Length
+        self._maximum_length_checkbox = PySide2.QtWidgets.QCheckBox("Maximum Length")
+        self._maximum_length_spinbox = PySide2.QtWidgets.QSpinBox()
+        self._maximum_length_spinbox.setMinimum(2)  # Maximum lengths < 2 don't make sense
+        self._maximum_length_spinbox.setMaximum(MAXIMUM_LENGTH)  # Maximum lengths > max length doesn't make sense
+
+        # Seed
+        self._seed_checkbox = PySide2.QtWidgets.QCheckBox("Seed")
+        self._seed_le = PySide2.QtWidgets.QLineEdit()
+
+        # Scene Settings Group
+        self._scene_group_box = PySide2.QtWidgets.QGroupBox()
+        self._scene_group_box.setTitle("Maya Scene Settings")
+
+        # Block Size
+        self._block_size_lbl = PySide2.QtWidgets.QLabel("Block Size")
+        # X
+        self._block_size_x_lbl = PySide2.QtWidgets.QLabel("X")
+        self._block_size_x_spinbox = PySide2.QtWidgets.QDoubleSpinBox()
+        self._block_size_x_spinbox.setMinimum(0)
+        self._block_size_x_spinbox.setMaximum(MAXIMUM_BLOCK_DIMENSION)
+        self._block_size_x_spinbox.setDecimals(MAXIMUM_BLOCK_PRECISION)
+        self._block_size_x_spinbox.setSingleStep(float("1e-{}".format(MAXIMUM_BLOCK_PRECISION)))
+        # Y
+        self._block_size_y_lbl = PySide2.QtWidgets.QLabel("Y")
+        self._block_size_y_spinbox = PySide2.QtWidgets.QDoubleSpinBox()
+        self._block_size_y_spinbox.setMinimum(0)
+        self._block_size_y_spinbox.setMaximum(MAXIMUM_BLOCK_DIMENSION)
+        self._block_size_y_spinbox.setDecimals(MAXIMUM_BLOCK_PRECISION)
+        self._block_size_x_spinbox.setSingleStep(float("1e-{}".format(MAXIMUM_BLOCK_PRECISION)))
+        # Z
+        self._block_size_z_lbl = PySide2.QtWidgets.QLabel("Z")
+        self._block_size_z_spinbox = PySide2.QtWidgets.QDoubleSpinBox()
+        self._block_size_z_spinbox.setMinimum(0)
+        self._block_size_z_spinbox.setMaximum(MAXIMUM_BLOCK_DIMENSION)
+        self._block_size_z_spinbox.setDecimals(MAXIMUM_BLOCK_PRECISION)
+        self._block_size_x_spinbox.setSingleStep(float("1e-{}".format(MAXIMUM_BLOCK_PRECISION)))
+
+        # Group Name
+        self._group_name_lbl = PySide2.QtWidgets.QLabel("Maya Group Name")
+        self._group_name_le = PySide2.QtWidgets.QLineEdit()
+
+        # Scene Mode
+        self._scene_mode_lbl = PySide2.QtWidgets.QLabel("Scene Mode")
+        self._scene_mode_cmb = PySide2.QtWidgets.QComboBox()
+        for mode in scene.SceneMode:
+            self._scene_mode_cmb.addItem(scene.SCENE_MODE_STR[mode])
+
+        # Object Block Group
+        self._block_group_box = PySide2.QtWidgets.QGroupBox()
+        self._block_group_box.setTitle("Object Block Settings")
+
+        # Object Blocks
+        self._object_blocks = dict()
+        for blk_type in VALID_BLOCK_TYPES:
+            self._object_blocks[blk_type] = dict()
+            self._object_blocks[blk_type]["group"] = PySide2.QtWidgets.QGroupBox()
+            self._object_blocks[blk_type]["group"].setTitle(blocks.BLOCK_TYPE_STR[blk_type])
+            self._object_blocks[blk_type]["group"].setStyleSheet("QGroupBox{border: 5px solid #444444;}")
+
+            # Path
+            self._object_blocks[blk_type]["pth_lbl"] = PySide2.QtWidgets.QLabel("Path")
+            self._object_blocks[blk_type]["pth_le"] = PySide2.QtWidgets.QLineEdit()
+
+            # Weight
+            self._object_blocks[blk_type]["weight_lbl"] = PySide2.QtWidgets.QLabel("Weight")
+            self._object_blocks[blk_type]["weight_spinbox"] = PySide2.QtWidgets.QDoubleSpinBox()
+            self._object_blocks[blk_type]["weight_spinbox"].setMinimum(0)
+            self._object_blocks[blk_type]["weight_spinbox"].setMaximum(MAXIMUM_WEIGHT_DIMENSION)
+            self._object_blocks[blk_type]["weight_spinbox"].setDecimals(MAXIMUM_WEIGHT_PRECISION)
+            self._object_blocks[blk_type]["weight_spinbox"].setSingleStep(
+                float("1e-{}".format(MAXIMUM_WEIGHT_PRECISION)))
+
+        # Progress
+        self._progress_lbl = PySide2.QtWidgets.QLabel("")
+        self._progress_bar = PySide2.QtWidgets.QProgressBar()
+        self._progress_bar.setVisible(False)
+
+        # Buttons
+        self._cancel_btn = PySide2.QtWidgets.QPushButton("Cancel")
+        self._generate_btn = PySide2.QtWidgets.QPushButton("Generate")
+
+    def _create_layout(self):
+        """Lay out the UI elements"""
+        # Level Size
+        self._level_size_lay = PySide2.QtWidgets.QHBoxLayout()
+        self._level_size_lay.addWidget(self._level_size_lbl)
+        self._level_size_lay.addSpacing(10)
+        self._level_size_lay.addWidget(self._level_size_x_lbl)
+        self._level_size_lay.addWidget(self._level_size_x_spinbox)
+        self._level_size_lay.addSpacing(5)
+        self._level_size_lay.addWidget(self._level_size_y_lbl)
+        self._level_size_lay.addWidget(self._level_size_y_spinbox)
+        self._level_size_lay.addSpacing(5)
+        self._level_size_lay.addWidget(self._level_size_z_lbl)
+        self._level_size_lay.addWidget(self._level_size_z_spinbox)
+        self._level_size_lay.addStretch()
+
+        # Minimum Length
+        self._minimum_length_lay = PySide2.QtWidgets.QHBoxLayout()
+        self._minimum_length_lay.addWidget(self._minimum_length_checkbox)
+        self._minimum_length_lay.addSpacing(5)
+        self._minimum_length_lay.addWidget(self._minimum_length_spinbox)
+        self._minimum_length_lay.addStretch()
+
+        # Minimum Length
+        self._maximum_length_lay = PySide2.QtWidgets.QHBoxLayout()
+        self._maximum_length_lay.addWidget(self._maximum_length_checkbox)
+        self._maximum_length_lay.addSpacing(5)
+        self._maximum_length_lay.addWidget(self._maximum_length_spinbox)
+        self._maximum_length_lay.addStretch()
+
+        # Seed
+        self._seed_lay = PySide2.QtWidgets.QHBoxLayout()
+        self._seed_lay.addWidget(self._seed_checkbox)
+        self._seed_lay.addSpacing(5)
+        self._seed_lay.addWidget(self._seed_le)
+
+        # Generator Settings Group Box
+        self._generator_lay = PySide2.QtWidgets.QVBoxLayout()
+        self._generator_lay.addLayout(self._level_size_lay)
+        self._generator_lay.addLayout(self._minimum_length_lay)
+        self._generator_lay.addLayout(self._maximum_length_lay)
+        self._generator_lay.addLayout(self._seed_lay)
+        self._generator_group_box.setLayout(self._generator_lay)
+
+        # Block Size
+        self._block_size_lay = PySide2.QtWidgets.QHBoxLayout()
+        self._block_size_lay.addWidget(self._block_size_lbl)
+        self._block_size_lay.addSpacing(10)
+        self._block_size_lay.addWidget(self._block_size_x_lbl)
+        self._block_size_lay.addWidget(self._block_size_x_spinbox)
+        self._block_size_lay.addSpacing(5)
+        self._block_size_lay.addWidget(self._block_size_y_lbl)
+        self._block_size_lay.addWidget(self._block_size_y_spinbox)
+        self._block_size_lay.addSpacing(5)
+        self._block_size_lay.addWidget(self._block_size_z_lbl)
+        self._block_size_lay.addWidget(self._block_size_z_spinbox)
+        self._block_size_lay.addStretch()
+
+        # Group Name
+        self._group_name_lay = PySide2.QtWidgets.QHBoxLayout()
+        self._group_name_lay.addWidget(self._group_name_lbl)
+        self._group_name_lay.addSpacing(10)
+        self._group_name_lay.addWidget(self._group_name_le)
+
+        # Scene Mode
+        self._scene_mode_lay = PySide2.QtWidgets.QHBoxLayout()
+        self._scene_mode_lay.addWidget(self._scene_mode_lbl)
+        self._scene_mode_lay.addSpacing(10)
+        self._scene_mode_lay.addWidget(self._scene_mode_cmb)
+        self._scene_mode_lay.addStretch()
+
+        # Maya Scene Group Box
+        self._scene_lay = PySide2.QtWidgets.QVBoxLayout()
+        self._scene_lay.addLayout(self._block_size_lay)
+        self._scene_lay.addLayout(self._group_name_lay)
+        self._scene_lay.addLayout(self._scene_mode_lay)
+        self._scene_group_box.setLayout(self._scene_lay)
+
+        # Object Blocks
+        for blk_type in VALID_BLOCK_TYPES:
+            # Path
+            self._object_blocks[blk_type]["pth_lay"] = PySide2.QtWidgets.QHBoxLayout()
+            self._object_blocks[blk_type]["pth_lay"].addWidget(self._object_blocks[blk_type]["pth_lbl"])
+            self._object_blocks[blk_type]["pth_lay"].addSpacing(10)
+            self._object_blocks[blk_type]["pth_lay"].addWidget(self._object_blocks[blk_type]["pth_le"])
+            
+            # Weight
+            self._object_blocks[blk_type]["weight_lay"] = PySide2.QtWidgets.QHBoxLayout()
+            self._object_blocks[blk_type]["weight_lay"].addWidget(self._object_blocks[blk_type]["weight_lbl"])
+            self._object_blocks[blk_type]["weight_lay"].addSpacing(10)
+            self._object_blocks[blk_type]["weight_lay"].addWidget(self._object_blocks[blk_type]["weight_spinbox"])
+            self._object_blocks[blk_type]["weight_lay"].addStretch()
+
+            # Object Block Group
+            self._object_blocks[blk_type]["group_lay"] = PySide2.QtWidgets.QVBoxLayout()
+            self._object_blocks[blk_type]["group_lay"].addSpacing(15)
+            self._object_blocks[blk_type]["group_lay"].addLayout(self._object_blocks[blk_type]["pth_lay"])
+            self._object_blocks[blk_type]["group_lay"].addLayout(self._object_blocks[blk_type]["weight_lay"])
+            self._object_blocks[blk_type]["group"].setLayout(self._object_blocks[blk_type]["group_lay"])
+
+        # Object Block Group Box
+        self._block_lay = PySide2.QtWidgets.QVBoxLayout()
+        for blk_type in VALID_BLOCK_TYPES:
+            self._block_lay.addWidget(self._object_blocks[blk_type]["group"])
+        self._block_group_box.setLayout(self._block_lay)
+
+        # Buttons
+        self._button_lay = PySide2.QtWidgets.QHBoxLayout()
+        self._button_lay.addWidget(self._cancel_btn)
+        self._block_size_lay.addSpacing(5)
+        self._button_lay.addWidget(self._generate_btn)
+
+        # Main
+        self._main_lay = PySide2.QtWidgets.QVBoxLayout()
+        self._main_lay.addWidget(self._generator_group_box)
+        self._main_lay.addWidget(self._scene_group_box)
+        self._main_lay.addWidget(self._block_group_box)
+        self._main_lay.addWidget(self._progress_lbl)
+        self._main_lay.addWidget(self._progress_bar)
+        self._main_lay.addLayout(self._button_lay)
+
+        # Set the layout
+        self.setLayout(self._main_lay)
+
+    def _create_connections(self):
+        """Connect widget signals to slots"""
+        # Level Size
+        self._level_size_x_spinbox.valueChanged.connect(self._set_x_size)
+        self._level_size_y_spinbox.valueChanged.connect(self._set_y_size)
+        self._level_size_z_spinbox.valueChanged.connect(self._set_z_size)
+
+        # Minimum Length
+        self._minimum_length_checkbox.toggled.connect(self._checked_minimum)
+        self._minimum_length_spinbox.valueChanged.connect(self._set_minimum)
+
+        # Maximum Length
+        self._maximum_length_checkbox.toggled.connect(self._checked_maximum)
+        self._maximum_length_spinbox.valueChanged.connect(self._set_maximum)
+
+        # Seed
+        self._seed_checkbox.toggled.connect(self._checked_seed)
+        self._seed_le.textEdited.connect(self._set_seed)
+        
+        # Block Size
+        self._block_size_x_spinbox.valueChanged.connect(self._set_x_block_size)
+        self._block_size_y_spinbox.valueChanged.connect(self._set_y_block_size)
+        self._block_size_z_spinbox.valueChanged.connect(self._set_z_block_size)
+
+        # Group Name
+        self._group_name_le.textEdited.connect(self._set_group_name)
+
+        # Scene Mode
+        self._scene_mode_cmb.currentIndexChanged.connect(self._set_scene_mode)
+
+        # Object Blocks
+        for blk_type in VALID_BLOCK_TYPES:
+            self._object_blocks[blk_type]["pth_le"].textEdited.connect(self._object_block_pth(blk_type))
+            self._object_blocks[blk_type]["weight_spinbox"].valueChanged.connect(self._object_block_weight(blk_type))
+
+        # Buttons
+        self._cancel_btn.clicked.connect(self._cancel)
+        self._generate_btn.clicked.connect(self._generate)
+
+    def _block_signals(self):
+        """Block signals while updating info"""
+        self._minimum_length_spinbox.blockSignals(True)
+        self._maximum_length_spinbox.blockSignals(True)
+        self._seed_le.blockSignals(True)
+
+    def _unblock_signals(self):
+        """Unblock signals after updating info"""
+        self._minimum_length_spinbox.blockSignals(False)
+        self._maximum_length_spinbox.blockSignals(False)
+        self._seed_le.blockSignals(False)
+
+    @PySide2.QtCore.Slot()
+    def _set_x_size(self):
+        """Sets the X dimension of the level size"""
+        self._level_gen.size = (self._level_size_x_spinbox.value(),
+                                self._level_gen.size[Y],
+                                self._level_gen.size[Z])
+        self._refresh_view()
+
+    @PySide2.QtCore.Slot()
+    def _set_y_size(self):
+        """Sets the Y dimension of the level size"""
+        self._level_gen.size = (self._level_gen.size[X],
+                                self._level_size_y_spinbox.value(),
+                                self._level_gen.size[Z])
+        self._refresh_view()
+
+    @PySide2.QtCore.Slot()
+    def _set_z_size(self):
+        """Sets the Z dimension of the level size"""
+        self._level_gen.size = (self._level_gen.size[X],
+                                self._level_gen.size[Y],
+                                self._level_size_z_spinbox.value())
+        self._refresh_view()
+
+    @PySide2.QtCore.Slot()
+    def _checked_minimum(self):
+        """Toggles whether a minimum value is set"""
+        self._block_signals()
+        if self._minimum_length_checkbox.isChecked():
+            # Minimum length enabled, and generation steered toward reaching it
+            self._level_gen.minimum_length = 0
+            self._level_gen.steer_to_minimum = True
+        else:
+            # Minimum length disabled
+            self._level_gen.minimum_length = None
+            self._level_gen.steer_to_minimum = False
+        self._refresh_view()
+        self._unblock_signals()
+
+    @PySide2.QtCore.Slot()
+    def _set_minimum(self):
+        """Sets the minimum length"""
+        self._level_gen.minimum_length = self._minimum_length_spinbox.value()
+        self._refresh_view()
+
+    @PySide2.QtCore.Slot()
+    def _checked_maximum(self):
+        """Toggles whether a maximum value is set"""
+        self._block_signals()
+        if self._maximum_length_checkbox.isChecked():
+            # Maximum length enabled
+            self._level_gen.maximum_length = MAXIMUM_LENGTH
+        else:
+            # Maximum length disabled
+            self._level_gen.maximum_length = None
+        self._refresh_view()
+        self._unblock_signals()
+
+    @PySide2.QtCore.Slot()
+    def _set_maximum(self):
+        """Sets the maximum length"""
+        self._level_gen.maximum_length = self._maximum_length_spinbox.value()
+        self._refresh_view()
+
+    @PySide2.QtCore.Slot()
+    def _checked_seed(self):
+        """Toggles whether a seed is set"""
+        self._block_signals()
+        if self._seed_checkbox.isChecked():
+            # Seed enabled
+            self._level_gen.seed = ""
+        else:
+            # Seed disabled (use random seed)
+            self._level_gen.seed = None
+        self._refresh_view()
+        self._unblock_signals()
+
+    @PySide2.QtCore.Slot()
+    def _set_seed(self):
+        """Sets the seed"""
+        self._level_gen.seed = self._seed_le.text()
+        self._refresh_view()
+
+    @PySide2.QtCore.Slot()
+    def _set_x_block_size(self):
+        """Sets the X dimension of the block size"""
+        self._scene_gen.block_dimensions = (self._block_size_x_spinbox.value(),
+                                            self._scene_gen.block_dimensions[Y],
+                                            self._scene_gen.block_dimensions[Z])
+        self._refresh_view()
+
+    @PySide2.QtCore.Slot()
+    def _set_y_block_size(self):
+        """Sets the Y dimension of the block size"""
+        self._scene_gen.block_dimensions = (self._scene_gen.block_dimensions[X],
+                                            self._block_size_y_spinbox.value(),
+                                            self._scene_gen.block_dimensions[Z])
+        self._refresh_view()
+
+    @PySide2.QtCore.Slot()
+    def _set_z_block_size(self):
+        """Sets the Z dimension of the block size"""
+        self._scene_gen.block_dimensions = (self._scene_gen.block_dimensions[X],
+                                            self._scene_gen.block_dimensions[Y],
+                                            self._block_size_z_spinbox.value())
+        self._refresh_view()
+
+    @PySide2.QtCore.Slot()
+    def _set_group_name(self):
+        """Sets the group name for reading the Maya scene files"""
+        self._scene_gen.group_name = self._group_name_le.text()
+        self._refresh_view()
+
+    @PySide2.QtCore.Slot()
+    def _set_scene_mode(self):
+        """Sets how the level is built in the Maya scene"""
+        self._scene_gen.mode = scene.SceneMode(self._scene_mode_cmb.currentIndex())
+        self._refresh_view()
+
+    def _object_block_pth(self, blk_type):
+        """
+        Returns the Slot for editing an object block's path
+        :param blk_type: The block type
+        :return: The Slot
+        """
+        @PySide2.QtCore.Slot()
+        def inner_slot():
+            idx = VALID_BLOCK_TYPES.index(blk_type)
+            self._level_gen.block_list[idx].pth = self._object_blocks[blk_type]["pth_le"].text()
+            self._refresh_view()
+        return inner_slot
+
+    def _object_block_weight(self, blk_type):
+        """
+        Returns the Slot for editing an object block's weight
+        :param blk_type: The block type
+        :return: The Slot
+        """
+        @PySide2.QtCore.Slot()
+        def inner_slot():
+            idx = VALID_BLOCK_TYPES.index(blk_type)
+            self._level_gen.block_list[idx].weight = self._object_blocks[blk_type]["weight_spinbox"].value()
+            self._refresh_view()
+        return inner_slot
+
+    def _is_busy(self):
+        """
+        Returns whether a level is being generated or built
+        :return: True if busy else False
+        """
+        return self._generation_thread is not None or self._scene_steps is not None
+
+    @PySide2.QtCore.Slot()
+    def _cancel(self):
+        """Stops the level being generated or built, or quits the dialog if there is none"""
+        if self._generation_thread is not None:
+            self._generation_thread.cancel()  # Finishes in _level_cancelled
+        elif self._scene_steps is not None:
+            self._scene_steps.close()  # Ends the scene batch, and the next update makes the scene again
+            self._finish_generation("Cancelled")
+        else:
+            self.close()
+
+    @PySide2.QtCore.Slot()
+    def _generate(self):
+        """Starts generating the level in a worker thread. The scene is built once it is done"""
+        if self._is_busy():
+            return
+
+        # The thread gets its own generator, so the UI can change the settings while it runs
+        level_gen = level.LevelGenerator.from_settings(self._level_gen.get_settings(), seed=self._level_gen.seed)
+        self._generation_thread = LevelGenerationThread(level_gen, parent=self)
+        self._generation_thread.progress.connect(self._level_progress)
+        self._generation_thread.generated.connect(self._level_generated)
+        self._generation_thread.failed.connect(self._level_failed)
+        self._generation_thread.cancelled.connect(self._level_cancelled)
+        self._generation_thread.finished.connect(self._generation_thread.deleteLater)
+
+        # The scene settings are read by each chunk of the scene build, so they can't change until it is done
+        self._generate_btn.setEnabled(False)
+        self._scene_group_box.setEnabled(False)
+        self._progress_lbl.setText("Generating level")
+        self._progress_bar.setRange(0, 0)  # Busy, since the number of blocks isn't known yet
+        self._progress_bar.setVisible(True)
+        self._generation_thread.start()
+
+    @PySide2.QtCore.Slot(int, int)
+    def _level_progress(self, placed, remaining):
+        """Shows how far the level generation is"""
+        self._progress_lbl.setText("Generating level: placed {} blocks, {} spots open".format(placed, remaining))
+
+    @PySide2.QtCore.Slot(object)
+    def _level_generated(self, lvl):
+        """Starts building the scene of the generated level, a chunk at a time"""
+        cancelled = self._generation_thread.is_cancelled()  # Cancel may come after the level was done
+        self._generation_thread = None
+        if cancelled:
+            self._finish_generation("Cancelled")
+            return
+
+        # Steering makes it rare, but give warning if minimum length still not met
+        if self._level_gen.minimum_length is not None and lvl.length < self._level_gen.minimum_length:
+            LOG.warn("Level length {} is less than desired minimum {}".format(lvl.length,
+                                                                              self._level_gen.minimum_length))
+
+        self._progress_lbl.setText("Building scene")
+        self._scene_steps = self._scene_gen.iter_update(lvl, SCENE_CHUNK_SIZE)
+        PySide2.QtCore.QTimer.singleShot(0, self._build_scene_chunk)
+
+    @PySide2.QtCore.Slot(str)
+    def _level_failed(self, reason):
+        """Reports a level that couldn't be generated"""
+        self._generation_thread = None
+        LOG.error(reason)
+        self._finish_generation(reason)
+
+    @PySide2.QtCore.Slot()
+    def _level_cancelled(self):
+        """Reports a cancelled level generation"""
+        self._generation_thread = None
+        self._finish_generation("Cancelled")
+
+    @PySide2.QtCore.Slot()
+    def _build_scene_chunk(self):
+        """Places the next chunk of blocks in the scene, then lets Maya handle events before the next one"""
+        if self._scene_steps is None:
+            return  # Cancelled
+        try:
+            placed, total = next(self._scene_steps)
+        except StopIteration:
+            self._finish_generation("Built level of length {}".format(self._scene_gen.lvl.length))
+            return
+        except Exception:
+            self._finish_generation("Failed to build scene")
+            raise
+        self._progress_bar.setRange(0, total)
+        self._progress_bar.setValue(placed)
+        self._progress_lbl.setText("Building scene: placed {} of {} blocks".format(placed, total))
+        PySide2.QtCore.QTimer.singleShot(0, self._build_scene_chunk)
+
+    def _finish_generation(self, message):
+        """
+        Goes back to waiting for the Generate button
+        :param message: The message to show
+        :return: None
+        """
+        self._scene_steps = None
+        self._progress_bar.setVisible(False)
+        self._progress_lbl.setText(message)
+        self._generate_btn.setEnabled(True)
+        self._scene_group_box.setEnabled(True)
+
+    def closeEvent(self, event):
+        """Stops any level being generated or built before the dialog closes"""
+        if self._generation_thread is not None:
+            self._generation_thread.cancel()
+            self._generation_thread.wait()
+            self._generation_thread = None
+        if self._scene_steps is not None:
+            self._scene_steps.close()
+            self._scene_steps = None
+        super(MayaSceneLevelGeneratorUI, self).closeEvent(event)
@@ -0,0 +1,109 @@
+"""
+sampling.py
+Asmita Chitale
+Assignment 03
+ATCM 3311.0U1
+07/24/2020
+"""
+
+
+#====================================================== IMPORTS =======================================================#
+import random
+
+
+#====================================================== CONSTS ========================================================#
+DEFAULT_CACHE_SIZE = 256  # Number of alias tables to keep before the cache is cleared
+
+
+#====================================================== CLASSES =======================================================#
+class WeightedSampler(object):
+    """Chooses random items based on their weights using the alias method. Part of the Controller
+
+    Alias tables are cached by the list of weights, so choosing from a list of candidates seen before is O(1). Every
+    choice uses exactly one random draw, so the same seed always gives the same choices
+    """
+
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE):
+        """
+        Creates the sampler
+        :param cache_size: The number of alias tables to keep before the cache is cleared
+        """
+        self.cache_size = cache_size
+        self._tables = dict()  # Weights tuple -> (probabilities, aliases)
+
+    def _table(self, weights):
+        """
+        Returns the alias table for a list of weights, building it if needed
+        :param weights: Tuple of weights
+        :return: Tuple of the list of probabilities and the list of aliases
+        """
+        table = self._tables.get(weights)
+        if table is None:
+            if len(self._tables) >= self.cache_size:
+                self._tables.clear()
+            table = build_alias_table(weights)
+            self._tables[weights] = table
+        return table
+
+    def choose(self, items, rng=random):
+        """
+        Chooses a random item based on weights
+        :param items: The list of items to choose from. Each must have a weight attribute
+        :param rng: The random number generator to use
+        :return: The chosen item
+        """
+        probabilities, aliases = self._table(tuple(item.weight for item in items))
+
+        # Split one draw into the column and the coin flip for that column
+        value = rng.random() * len(items)
+        column = int(value)
+        if value - column < probabilities[column]:
+            return items[column]
+        return items[aliases[column]]
+
+
+#===================================================== FUNCTIONS =======================================================#
+def derive_seed(seed, index):
+    """
+    Derives the seed of an independent child stream from a master seed. Uses a hash that does not change between
+    processes or Python versions, so child streams can be rebuilt anywhere
+    :param seed: The master seed
+    :param index: The index of the child stream
+    :return: The child seed, a 64 bit integer
+    """
+    import hashlib  # Imported here so importing the module stays fast
+
+    digest = hashlib.sha256("{}/{}".format(seed, index).encode("utf-8")).hexdigest()
+    return int(digest[:16], 16)
+
+
+def build_alias_table(weights):
+    """
+    Builds a Vose alias table. If no weight is positive, every item is equally likely
+    :param weights: The list of weights
+    :return: Tuple of the list of probabilities and the list of aliases
+    """
+    count = len(weights)
+    total = float(sum(weights))
+    if total <= 0:
+        return [1.0] * count, list(range(count))
+
+    # Scale so the average column is 1
+    scaled = [weight * count / total for weight in weights]
+    probabilities = [1.0] * count
+    aliases = list(range(count))
+    small = [i for i in range(count) if scaled[i] < 1.0]
+    large = [i for i in range(count) if scaled[i] >= 1.0]
+    while small and large:
+        less = small.pop()
+        more = large.pop()
+        probabilities[less] = scaled[less]
+        aliases[less] = more
+        scaled[more] -= 1.0 - scaled[less]
+        if scaled[more] < 1.0:
+            small.append(more)
+        else:
+            large.append(more)
+
+    # Anything left over is 1 up to floating point error
+    return probabilities, aliases
@@ -0,0 +1,437 @@
+"""
+scene.py
+Asmita Chitale
+Assignment 03
+ATCM 3311.0U1
+07/24/2020
+"""
+
+
+#====================================================== IMPORTS =======================================================#
+import mafile
+
+from collections import namedtuple, OrderedDict
+from enum import Enum
+import logging
+import os
+import time
+
+
+#====================================================== CONSTS ========================================================#
+DEFAULT_BLOCK_SIZE = mafile.DEFAULT_BLOCK_SIZE  # Default dimensions for a unit block in Maya
+DEFAULT_GROUP_NAME = mafile.DEFAULT_GROUP_NAME  # Default name for the group to look for within the Maya scenes
+LOG = logging.getLogger(__name__)
+PLACED_BLOCK_TYPES = mafile.PLACED_BLOCK_TYPES  # Block types that have a scene file
+
+
+#====================================================== CLASSES =======================================================#
+class SceneMode(Enum):
+    """Enums for the ways a level can be built in the scene"""
+    DUPLICATE = 0  # Every block has its own copy of its scene file's shapes
+    INSTANCE = 1  # Every block is a transform instancing its scene file's shapes
+    INSTANCER = 2  # One instancer places every block from a particle per block
+
+
+# This is a const but closely linked and related to SceneMode
+SCENE_MODE_STR = {  # Get scene mode as a string for the user
+    SceneMode.DUPLICATE: "Duplicate",
+    SceneMode.INSTANCE: "Instance",
+    SceneMode.INSTANCER: "Instancer",
+}
+
+
+class BlockPlacement(namedtuple("BlockPlacement", ("pth", "name", "translation", "rotation"))):
+    """A block to put in the scene. Part of the Model
+
+    pth is the block's scene file, name is the name of its node, and translation and rotation are (X,Y,Z) tuples, the
+    rotation in degrees
+    """
+    __slots__ = ()
+
+
+class SceneBackend(object):
+    """Makes and deletes the nodes of blocks in a scene. Part of the Controller
+
+    SceneLevelGenerator works out what to place and calls the backend, so the same level can be built in Maya, in a
+    file or in memory. Every change happens between begin_batch and end_batch
+    """
+
+    def begin_batch(self):
+        """
+        Starts a batch of changes
+        :return: None
+        """
+        pass
+
+    def end_batch(self, completed=True):
+        """
+        Ends a batch of changes. Called even if the batch failed or was cancelled partway
+        :param completed: Whether every change of the batch was made
+        :return: None
+        """
+        pass
+
+    def pause_batch(self):
+        """
+        Lets the scene be used between chunks of a batch, such as by the user while a UI handles events. Only called
+        between begin_batch and end_batch, and followed by resume_batch or end_batch
+        :return: None
+        """
+        pass
+
+    def resume_batch(self):
+        """
+        Goes on with a batch after pause_batch
+        :return: None
+        """
+        pass
+
+    def clear(self):
+        """
+        Deletes everything in the scene
+        :return: None
+        """
+        raise NotImplementedError()
+
+    def place_block(self, placement, mode):
+        """
+        Puts one block in the scene
+        :param placement: The BlockPlacement
+        :param mode: The SceneMode
+        :return: None
+        """
+        raise NotImplementedError()
+
+    def place_blocks(self, placements, mode, lap):
+        """
+        Puts blocks in the scene. Backends that are faster with every block at once override this
+        :param placements: List of BlockPlacement
+        :param mode: The SceneMode
+        :param lap: Function to call with the name of each phase as it ends
+        :return: None
+        """
+        for placement in placements:
+            self.place_block(placement, mode)
+        lap("place")
+
+    def delete_blocks(self, names):
+        """
+        Deletes the nodes of blocks. Names not in the scene, such as blocks deleted by hand, are skipped
+        :param names: List of the blocks' node names
+        :return: None
+        """
+        raise NotImplementedError()
+
+    def blocks_exist(self, names):
+        """
+        Returns whether the nodes of blocks are all in the scene
+        :param names: List of the blocks' node names
+        :return: True if every node is in the scene else False
+        """
+        raise NotImplementedError()
+
+
+class RecordingSceneBackend(SceneBackend):
+    """Keeps the scene in memory and records every call, for tests and benchmarks without Maya. Part of the Model
+
+    calls has a tuple of the method name and arguments of every call, in order, and blocks has the BlockPlacement and
+    SceneMode of every block in the scene by node name
+    """
+
+    def __init__(self):
+        """Creates an empty scene"""
+        self.calls = [][:]
+        self.blocks = OrderedDict()
+
+    def begin_batch(self):
+        """Records the start of a batch"""
+        self.calls.append(("begin_batch",))
+
+    def end_batch(self, completed=True):
+        """Records the end of a batch and whether it was completed"""
+        self.calls.append(("end_batch", completed))
+
+    def pause_batch(self):
+        """Records a pause between chunks"""
+        self.calls.append(("pause_batch",))
+
+    def resume_batch(self):
+        """Records the end of a pause"""
+        self.calls.append(("resume_batch",))
+
+    def clear(self):
+        """Deletes every block"""
+        self.calls.append(("clear",))
+        self.blocks = OrderedDict()
+
+    def place_block(self, placement, mode):
+        """
+        Adds a block
+        :param placement: The BlockPlacement
+        :param mode: The SceneMode
+        :return: None
+        """
+        self.calls.append(("place_block", placement, mode))
+        self.blocks[placement.name] = (placement, mode)
+
+    def delete_blocks(self, names):
+        """
+        Deletes blocks, skipping names not in the scene
+        :param names: List of the blocks' node names
+        :return: None
+        """
+        self.calls.append(("delete_blocks", list(names)))
+        for name in names:
+            self.blocks.pop(name, None)
+
+    def blocks_exist(self, names):
+        """
+        Returns whether blocks are all in the scene
+        :param names: List of the blocks' node names
+        :return: True if every block is in the scene else False
+        """
+        return all(name in self.blocks for name in names)
+
+
+class MaFileSceneBackend(SceneBackend):
+    """Keeps the scene in memory and writes it to a Maya ASCII file at the end of every batch. Part of the Controller
+
+    The file is written with mafile.MaLevelWriter, so Maya isn't needed. Every SceneMode is written as duplicated
+    blocks. To write a level straight to a file without keeping its blocks, use mafile.MaLevelWriter.save instead
+    """
+
+    def __init__(self, pth, group_name=DEFAULT_GROUP_NAME, asset_cache_dir=None):
+        """
+        Creates an empty scene
+        :param pth: The path of the Maya ASCII file to write
+        :param group_name: The name of the group containing the shapes comprising the block in each scene file
+        :param asset_cache_dir: The directory of baked assets, so scene files are only read once. None means read the
+            scene files every time
+        """
+        self.pth = pth
+        self.group_name = group_name
+        self.asset_cache_dir = asset_cache_dir
+        self.blocks = OrderedDict()  # Node name -> BlockPlacement
+
+    def end_batch(self, completed=True):
+        """
+        Writes the scene to the file. A batch that wasn't completed leaves the file as it was
+        :param completed: Whether every change of the batch was made
+        :return: None
+        """
+        if not completed:
+            return
+        writer = mafile.MaLevelWriter(group_name=self.group_name, asset_cache_dir=self.asset_cache_dir)
+        mafile.write_atomic(self.pth, lambda ma_file: writer.write_blocks(
+            set(placement.pth for placement in self.blocks.values()), self.blocks.values(), ma_file,
+            os.path.basename(self.pth)))
+
+    def clear(self):
+        """Deletes every block"""
+        self.blocks = OrderedDict()
+
+    def place_block(self, placement, mode):
+        """
+        Adds a block
+        :param placement: The BlockPlacement
+        :param mode: The SceneMode. Unused, every block is duplicated
+        :return: None
+        """
+        self.blocks[placement.name] = placement
+
+    def delete_blocks(self, names):
+        """
+        Deletes blocks, skipping names not in the scene
+        :param names: List of the blocks' node names
+        :return: None
+        """
+        for name in names:
+            self.blocks.pop(name, None)
+
+    def blocks_exist(self, names):
+        """
+        Returns whether blocks are all in the scene
+        :param names: List of the blocks' node names
+        :return: True if every block is in the scene else False
+        """
+        return all(name in self.blocks for name in names)
+
+
+class SceneLevelGenerator(object):
+    """Generates a scene based of a Level model through a SceneBackend. Part of the Controller"""
+
+    def __init__(self, lvl, backend, block_dimensions=DEFAULT_BLOCK_SIZE, group_name=DEFAULT_GROUP_NAME,
+                 mode=SceneMode.DUPLICATE):
+        """
+        Sets up the generator
+        :param lvl: The level data to create
+        :param backend: The SceneBackend that makes the nodes
+        :param block_dimensions: The dimensions of a unit block. Must be square (X = Z) but can have any height
+        :param group_name: The name of the group containing the shapes comprising the block in each scene file
+        :param mode: The SceneMode. Instances share the shapes of their scene file, so they are lighter but editing one
+            edits every block from the same file. The instancer is lightest, but its blocks can't be edited one by one
+        """
+        self.lvl = lvl
+        self.backend = backend
+        self.block_dimensions = block_dimensions
+        self.group_name = group_name
+        self.mode = mode
+        self._scene_lvl = None  # The level in the scene, if made by this generator
+        self._scene_settings = None  # The settings the level in the scene was made with
+        self.timings = [][:]  # Tuples of each phase's name and seconds taken by the last build, in order
+
+    def _settings(self):
+        """
+        Returns the settings that change how a level looks in the scene
+        :return: Tuple of the settings
+        """
+        return tuple(self.block_dimensions), self.group_name, self.mode
+
+    def generate(self):
+        """
+        Generate the scene. Every transform is worked out before any node is made, and the whole scene is built in one
+        batch of the backend. The time of each phase is logged
+        :return: List of tuples of each phase's name and seconds taken, in order
+        """
+        for _ in self.iter_generate():
+            pass
+        return self.timings
+
+    def update(self, lvl):
+        """
+        Changes the scene to show another level, only deleting and making the blocks whose type, orientation or path
+        changed. Blocks are found by their {group_name}_{i}_{j}_{k} names. Falls back to generate if the scene wasn't
+        made by this generator, the settings or level size changed, the mode is SceneMode.INSTANCER, or any block of
+        the last level is missing from the scene, such as after a new scene was opened or blocks were deleted by hand
+        :param lvl: The new Level
+        :return: List of tuples of each phase's name and seconds taken, in order
+        """
+        for _ in self.iter_update(lvl):
+            pass
+        return self.timings
+
+    def iter_generate(self, chunk_size=None):
+        """
+        Generates the scene a chunk of blocks at a time, so a UI can handle events between chunks. The batch of the
+        backend is paused between chunks, so the scene can be used, and is ended if the iterator is closed early,
+        such as to cancel. The timings are in timings once it is done
+        :param chunk_size: The number of blocks placed per chunk. None means place every block in one chunk
+        :return: Iterator of tuples of the number of blocks placed so far and the number to place, after each chunk
+        """
+        return self._build(lambda lap: self._generate_scene(lap, chunk_size))
+
+    def iter_update(self, lvl, chunk_size=None):
+        """
+        Changes the scene to show another level like update, a chunk of blocks at a time like iter_generate
+        :param lvl: The new Level
+        :param chunk_size: The number of blocks placed per chunk. None means place every block in one chunk
+        :return: Iterator of tuples of the number of blocks placed so far and the number to place, after each chunk
+        """
+        old_lvl = self._scene_lvl
+        self.lvl = lvl
+        if (old_lvl is None or self._scene_settings != self._settings() or self.mode == SceneMode.INSTANCER
+                or tuple(old_lvl.size) != tuple(lvl.size)
+                or not self.backend.blocks_exist([mafile.block_node_name(self.group_name, pos)
+                                                  for pos in old_lvl.iter_positions(types=PLACED_BLOCK_TYPES)])):
+            return self.iter_generate(chunk_size)
+        return self._build(lambda lap: self._update_nodes(old_lvl, lap, chunk_size))
+
+    def _build(self, build):
+        """
+        Changes the scene in one batch of the backend, timing each phase. Phases that happen once per chunk are added
+        up. The timings are kept in timings and logged once the build is done
+        :param build: Function that changes the scene, given a function to call with the name of each phase as it ends.
+            Returns an iterator of progress tuples, one per chunk
+        :return: Iterator of the progress tuples of build
+        """
+        timings = OrderedDict()
+        lap_start = [time.time()]
+
+        def lap(phase):
+            now = time.time()
+            timings[phase] = timings.get(phase, 0.0) + now - lap_start[0]
+            lap_start[0] = now
+
+        self.backend.begin_batch()
+        self._scene_lvl = None  # Unknown if the build fails or is cancelled partway
+        completed = False
+        try:
+            for progress in build(lap):
+                self.backend.pause_batch()
+                yield progress
+                self.backend.resume_batch()
+            self._scene_lvl = self.lvl
+            self._scene_settings = self._settings()
+            completed = True
+        finally:
+            self.backend.end_batch(completed)
+
+        self.timings = list(timings.items())
+        LOG.info("Built scene in {:.3f}s ({})".format(sum(seconds for _, seconds in self.timings),
+                                                      ", ".join("{} {:.3f}s".format(phase, seconds)
+                                                                for phase, seconds in self.timings)))
+
+    def _generate_scene(self, lap, chunk_size=None):
+        """
+        Makes a new scene with every block of the level
+        :param lap: Function to call with the name of each phase as it ends
+        :param chunk_size: The number of blocks placed per chunk. None means place every block in one chunk
+        :return: Iterator of tuples of the number of blocks placed so far and the number to place, after each chunk
+        """
+        self.backend.clear()
+        lap("new scene")
+        placements = self._placements(self.lvl.iter_blocks(types=PLACED_BLOCK_TYPES))
+        lap("plan")
+        for progress in self._place_chunks(placements, lap, chunk_size):
+            yield progress
+
+    def _update_nodes(self, old_lvl, lap, chunk_size=None):
+        """
+        Replaces the nodes of the blocks that differ between the level in the scene and the new level
+        :param old_lvl: The Level in the scene
+        :param lap: Function to call with the name of each phase as it ends
+        :param chunk_size: The number of blocks placed per chunk. None means place every block in one chunk
+        :return: Iterator of tuples of the number of blocks placed so far and the number to place, after each chunk
+        """
+        changed = old_lvl.diff(self.lvl, types=PLACED_BLOCK_TYPES)
+        lap("diff")
+
+        self.backend.delete_blocks([mafile.block_node_name(self.group_name, pos) for pos in changed
+                                    if old_lvl.get_block_type(pos) in PLACED_BLOCK_TYPES])
+        lap("delete")
+
+        placements = self._placements((pos, self.lvl.get_block(pos)) for pos in changed
+                                      if self.lvl.get_block_type(pos) in PLACED_BLOCK_TYPES)
+        lap("plan")
+        for progress in self._place_chunks(placements, lap, chunk_size):
+            yield progress
+
+    def _place_chunks(self, placements, lap, chunk_size=None):
+        """
+        Places blocks a chunk at a time. The instancer is always made in one chunk, since it places every block at once
+        :param placements: List of BlockPlacement
+        :param lap: Function to call with the name of each phase as it ends
+        :param chunk_size: The number of blocks placed per chunk. None means place every block in one chunk
+        :return: Iterator of tuples of the number of blocks placed so far and the number to place, after each chunk
+        """
+        if chunk_size is None or self.mode == SceneMode.INSTANCER:
+            chunk_size = max(len(placements), 1)
+        for start in range(0, len(placements), chunk_size):
+            self.backend.place_blocks(placements[start:start + chunk_size], self.mode, lap)
+            yield min(start + chunk_size, len(placements)), len(placements)
+        if len(placements) == 0:
+            yield 0, 0
+
+    def _placements(self, placed_blocks):
+        """
+        Works out the name and transform of blocks
+        :param placed_blocks: Iterable of tuples of the (X,Y,Z) position and the block. There must be no Empty or
+            RampDummy blocks, since they have no scene file
+        :return: List of BlockPlacement
+        """
+        placements = [][:]
+        for pos, blk in placed_blocks:
+            translation, rotation = mafile.block_transform(pos, blk.orientation, self.block_dimensions)
+            placements.append(BlockPlacement(blk.pth, mafile.block_node_name(self.group_name, pos), translation,
+                                             rotation))
+        return placements
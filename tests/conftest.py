@@ -0,0 +1,20 @@
+"""
+conftest.py
+Asmita Chitale
+Assignment 03
+ATCM 3311.0U1
+07/24/2020
+"""
+
+
+#====================================================== IMPORTS =======================================================#
+import os
+import sys
+
+
+#====================================================== CONSTS ========================================================#
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)  # Directory of the repository
+SCENES_DIR = os.path.join(ROOT_DIR, "scenes")  # Directory of the example block scene files
+SRC_DIR = os.path.join(ROOT_DIR, "src")  # Directory of the modules, which import each other by name
+
+sys.path.insert(0, SRC_DIR)
@@ -0,0 +1,201 @@
+"""
+mayastandin.py
+Asmita Chitale
+Assignment 03
+ATCM 3311.0U1
+07/24/2020
+"""
+
+
+#====================================================== IMPORTS =======================================================#
+import types
+
+
+#====================================================== CLASSES =======================================================#
+class StandInNode(object):
+    """A node returned by the stand-in PyMEL, with just the methods the generator uses. Part of the Model"""
+
+    def __init__(self, maya, name):
+        """
+        Creates the node
+        :param maya: The MayaStandIn that made it
+        :param name: The node's name
+        """
+        self._maya = maya
+        self._name = name
+
+    def name(self):
+        """Returns the node's name"""
+        return self._name
+
+    def addAttr(self, attr_name, **kwargs):
+        """Records adding an attribute"""
+        self._maya.record("node.addAttr", self._name, attr_name, **kwargs)
+
+    def attr(self, attr_name):
+        """Returns a plug of the node"""
+        return StandInPlug(self._maya, "{}.{}".format(self._name, attr_name))
+
+    def __getattr__(self, attr_name):
+        """Returns a plug of the node, such as node.isDynamic"""
+        if attr_name.startswith("_"):
+            raise AttributeError(attr_name)
+        return self.attr(attr_name)
+
+
+class StandInPlug(object):
+    """A plug of a StandInNode. Part of the Model"""
+
+    def __init__(self, maya, name):
+        """
+        Creates the plug
+        :param maya: The MayaStandIn that made it
+        :param name: The plug's name, node.attribute
+        """
+        self._maya = maya
+        self._name = name
+
+    def set(self, *args, **kwargs):
+        """Records setting the plug"""
+        self._maya.record("plug.set", self._name, *args, **kwargs)
+
+
+class MayaStandIn(object):
+    """Stands in for maya.cmds and PyMEL outside Maya, recording every call. Part of the Model
+
+    Only the functions MayaSceneBackend uses are there. The scene is a set of node names, enough for objExists and ls
+    to answer like Maya. Importing a file adds its group. calls has a tuple of each call's name, arguments and keyword
+    arguments, in order
+    """
+
+    def __init__(self, group_name):
+        """
+        Creates the modules with an empty scene
+        :param group_name: The name of the group that importing a block scene file adds
+        """
+        self.group_name = group_name
+        self.calls = [][:]
+        self.nodes = set()
+        self.modules = dict()
+
+        cmds = self._module("maya.cmds", ["undoInfo", "refresh", "xform", "ls", "delete"])
+        maya = self._module("maya", [])
+        maya.cmds = cmds
+        general = self._module("pymel.core.general", ["objExists", "group", "hide", "delete", "rename", "parent",
+                                                      "instance", "duplicate"])
+        system = self._module("pymel.core.system", ["importFile", "newFile"])
+        system.Path = lambda pth: pth
+        effects = self._module("pymel.core.effects", ["particle", "particleInstancer"])
+        core = self._module("pymel.core", [])
+        core.general = general
+        core.system = system
+        core.effects = effects
+        pymel = self._module("pymel", [])
+        pymel.core = core
+
+    def install(self, monkeypatch):
+        """
+        Puts the modules in sys.modules until the test ends
+        :param monkeypatch: The pytest monkeypatch fixture
+        :return: None
+        """
+        import sys
+
+        for name, module in self.modules.items():
+            monkeypatch.setitem(sys.modules, name, module)
+
+    def record(self, function_name, *args, **kwargs):
+        """
+        Records a call
+        :param function_name: The full name of the function, such as maya.cmds.xform
+        :return: None
+        """
+        self.calls.append((function_name, args, kwargs))
+
+    def called(self, name):
+        """
+        Returns the calls of a function
+        :param name: The name of the function, such as maya.cmds.xform
+        :return: List of tuples of the arguments and keyword arguments of each call
+        """
+        return [(args, kwargs) for call_name, args, kwargs in self.calls if call_name == name]
+
+    def _module(self, module_name, function_names):
+        """
+        Makes a stand-in module whose functions record their calls and then act on the scene
+        :param module_name: The full name of the module
+        :param function_names: The names of the functions
+        :return: The module
+        """
+        module = types.ModuleType(module_name)
+        for function_name in function_names:
+            setattr(module, function_name, self._function(module_name, function_name))
+        self.modules[module_name] = module
+        return module
+
+    def _function(self, module_name, function_name):
+        """
+        Makes a function that records its calls and then calls the method of the same name, if any
+        :param module_name: The full name of the function's module
+        :param function_name: The name of the function
+        :return: The function
+        """
+        act = getattr(self, "_" + function_name, None)
+
+        def function(*args, **kwargs):
+            self.record("{}.{}".format(module_name, function_name), *args, **kwargs)
+            return act(*args, **kwargs) if act is not None else None
+        return function
+
+    def _undoInfo(self, query=False, **kwargs):
+        """Answers undo queries as if undo is on"""
+        return True if query else None
+
+    def _ls(self, names):
+        """Returns the names that are in the scene"""
+        return [name for name in names if name in self.nodes]
+
+    def _delete(self, names):
+        """Removes nodes from the scene"""
+        for name in names if isinstance(names, list) else [names]:
+            self.nodes.discard(name)
+
+    def _objExists(self, name):
+        """Returns whether a node is in the scene"""
+        return name in self.nodes
+
+    def _group(self, empty=False, name=None):
+        """Adds a group to the scene"""
+        self.nodes.add(name)
+
+    def _rename(self, old_name, new_name):
+        """Renames a node in the scene"""
+        self.nodes.discard(old_name)
+        self.nodes.add(new_name)
+
+    def _instance(self, template, name=None):
+        """Adds an instance to the scene"""
+        self.nodes.add(name)
+        return [StandInNode(self, name)]
+
+    def _duplicate(self, template, name=None):
+        """Adds a copy to the scene"""
+        self.nodes.add(name)
+        return [StandInNode(self, name)]
+
+    def _importFile(self, pth):
+        """Adds the group of a block scene file to the scene"""
+        self.nodes.add(self.group_name)
+
+    def _newFile(self, force=False):
+        """Empties the scene"""
+        self.nodes = set()
+
+    def _particle(self, position=None, name=None):
+        """Adds particles to the scene, returning the transform and shape"""
+        self.nodes.add(name)
+        return StandInNode(self, name), StandInNode(self, name + "Shape")
+
+    def _particleInstancer(self, shape, name=None, **kwargs):
+        """Adds an instancer to the scene"""
+        self.nodes.add(name)
@@ -0,0 +1,88 @@
+"""
+test_corpus.py
+Asmita Chitale
+Assignment 03
+ATCM 3311.0U1
+07/24/2020
+"""
+
+
+#====================================================== IMPORTS =======================================================#
+import corpus
+import level
+import test_level
+
+import pytest
+
+
+#===================================================== FUNCTIONS =======================================================#
+def write_corpus(pth, seeds):
+    """
+    Writes a corpus of generated levels
+    :param pth: The path of the file
+    :param seeds: The seed of each level
+    :return: List of the packed levels, in order
+    """
+    packed = [test_level.make_level(seed=seed).to_bytes() for seed in seeds]
+    with corpus.CorpusWriter(pth) as writer:
+        for data in packed:
+            writer.write_bytes(data)
+        assert len(writer) == len(packed)
+    return packed
+
+
+def test_random_access(tmpdir):
+    """Any record can be read by index, from either end, and unpacks to the level that was written"""
+    pth = str(tmpdir.join("levels.corpus"))
+    packed = write_corpus(pth, range(5))
+    with corpus.CorpusReader(pth) as reader:
+        assert len(reader) == 5
+        assert reader.read_bytes(3) == packed[3]
+        assert reader.read_bytes(-1) == packed[4]
+        assert reader.read_bytes(0) == packed[0]
+        assert [lvl.to_bytes() for lvl in reader] == packed
+        assert reader[2].seed == 2
+
+
+def test_append(tmpdir):
+    """Opening an existing corpus adds records after the old ones"""
+    pth = str(tmpdir.join("levels.corpus"))
+    packed = write_corpus(pth, [0, 1])
+    with corpus.CorpusWriter(pth) as writer:
+        assert len(writer) == 2
+        writer.write(level.Level.from_bytes(packed[0]))
+    with corpus.CorpusReader(pth) as reader:
+        assert [reader.read_bytes(index) for index in range(len(reader))] == packed + packed[:1]
+
+
+def test_recover_without_footer(tmpdir):
+    """Records of a writer that was never closed are found by their length headers, up to one cut short"""
+    pth = str(tmpdir.join("levels.corpus"))
+    packed = write_corpus(pth, range(3))
+    with corpus.CorpusReader(pth) as reader:
+        data_end = reader.data_end
+        last_offset = reader.offsets[-1]
+    with open(pth, "r+b") as corpus_file:
+        corpus_file.truncate(data_end)
+    with corpus.CorpusReader(pth) as reader:
+        assert [reader.read_bytes(index) for index in range(len(reader))] == packed
+
+    with open(pth, "r+b") as corpus_file:
+        corpus_file.truncate(last_offset + 20)
+    with corpus.CorpusReader(pth) as reader:
+        assert [reader.read_bytes(index) for index in range(len(reader))] == packed[:2]
+    with corpus.CorpusWriter(pth) as writer:
+        writer.write_bytes(packed[2])
+    with corpus.CorpusReader(pth) as reader:
+        assert [reader.read_bytes(index) for index in range(len(reader))] == packed
+
+
+def test_rejects_other_files(tmpdir):
+    """Files that aren't a corpus, or are a newer version, are refused"""
+    pth = tmpdir.join("other.corpus")
+    pth.write_binary(b"NOPE" + b"\0" * 20)
+    with pytest.raises(ValueError, match="Not a level corpus"):
+        corpus.CorpusReader(str(pth))
+    pth.write_binary(corpus.CORPUS_HEADER.pack(corpus.CORPUS_MAGIC, corpus.CORPUS_VERSION + 1, 0))
+    with pytest.raises(ValueError, match="version"):
+        corpus.CorpusReader(str(pth))
@@ -0,0 +1,299 @@
+"""
+test_level.py
+Asmita Chitale
+Assignment 03
+ATCM 3311.0U1
+07/24/2020
+"""
+
+
+#====================================================== IMPORTS =======================================================#
+import blocks
+import conftest
+import level
+import sampling
+
+import hashlib
+import io
+import os
+import random
+
+import pytest
+
+
+#====================================================== CONSTS ========================================================#
+SCENE_NAMES = {  # Example scene file of each block type that has one
+    blocks.BlockType.START: "Start_1.ma",
+    blocks.BlockType.END: "End_1.ma",
+    blocks.BlockType.DEAD_END: "DeadEnd_1.ma",
+    blocks.BlockType.STRAIGHT: "Straight_1.ma",
+    blocks.BlockType.RAMP: "Ramp_1.ma",
+    blocks.BlockType.T_INTERSECTION: "TIntersection_1.ma",
+    blocks.BlockType.CROSS: "Cross_1.ma",
+    blocks.BlockType.CURVED: "Curved_1.ma",
+}
+
+
+#===================================================== FUNCTIONS =======================================================#
+def block_list():
+    """
+    Returns a block file of every type with its example scene file
+    :return: List of BlockFile
+    """
+    return [blocks.BlockFile(os.path.join(conftest.SCENES_DIR, name), block_type)
+            for block_type, name in SCENE_NAMES.items()]
+
+
+def make_level(seed=1, size=(6, 2, 6)):
+    """
+    Generates a level from the example scene files
+    :param seed: The seed
+    :param size: The (X,Y,Z) size
+    :return: The Level
+    """
+    return level.LevelGenerator(block_list(), size=size, seed=seed).generate()
+
+
+def cells(lvl):
+    """
+    Returns every placed block of a level in a form that can be compared
+    :param lvl: The Level
+    :return: List of tuples of the position, type, orientation, length and path
+    """
+    return [(pos, blk.block_type, blk.orientation, blk.length, blk.pth) for pos, blk in lvl.iter_blocks()]
+
+
+def snapshot(lvl):
+    """
+    Returns copies of everything about a level that rollback must restore
+    :param lvl: The Level
+    :return: Tuple of the cell arrays, the occupancy index and the bounding box
+    """
+    arrays = tuple(list(arr) for arr in [lvl._cells, lvl._lengths, lvl._source_ids, lvl._inbound, lvl._required,
+                                         lvl._forbidden, lvl._pred_lengths])
+    occupied = dict((block_type, set(indices)) for block_type, indices in lvl._occupied.items())
+    return arrays, occupied, lvl.bounding_box(), lvl.find_longest_dead_end()
+
+
+def test_generate_without_scene_files():
+    """Block files without a path are reported instead of failing partway through generation"""
+    block_list = [blocks.BlockFile("", blk_type) for blk_type in blocks.BlockType
+                  if blk_type not in (blocks.BlockType.EMPTY, blocks.BlockType.RAMP_DUMMY)]
+    generator = level.LevelGenerator.from_settings(level.LevelGenerator(block_list, size=(5, 2, 5)).get_settings())
+    with pytest.raises(level.CannotGenerateLevelError):
+        generator.generate()
+
+
+def test_block_file_without_scene_file():
+    """One block file without a path stops every way of generating before anything is placed, naming its type"""
+    files = block_list()
+    files[[blockf.block_type for blockf in files].index(blocks.BlockType.CURVED)].pth = ""
+    generator = level.LevelGenerator(files, size=(6, 2, 6), seed=1)
+    message = "No scene file for the {} block".format(blocks.BLOCK_TYPE_STR[blocks.BlockType.CURVED])
+    with pytest.raises(level.CannotGenerateLevelError, match=message):
+        generator.generate()
+    with pytest.raises(level.CannotGenerateLevelError, match=message):
+        generator.generate_with_retries()
+    generated, = generator.generate_many(1, workers=1)
+    assert generated.data is None and generated.error == message
+
+
+def test_frontier_pop_and_rollback():
+    """Pops remove a position in O(1) by swapping with the last, and rollback restores the exact order"""
+    positions = [(i, 0, 0) for i in range(6)]
+    frontier = level.Frontier(positions)
+    assert not frontier.add((0, 0, 0))
+    frontier.start_journal()
+    checkpoint = frontier.checkpoint()
+
+    rng = random.Random(3)
+    popped = [frontier.pop_random(rng) for _ in range(3)]
+    frontier.add((9, 9, 9))
+    popped.append(frontier.pop_best_of(rng, 4, lambda pos: pos[0]))
+    assert len(set(popped)) == 4 and len(frontier) == 3
+    assert sorted(list(frontier) + popped) == sorted(positions + [(9, 9, 9)])
+    assert all(pos not in frontier for pos in popped)
+
+    frontier.rollback(checkpoint)
+    assert list(frontier) == positions
+    assert all(pos in frontier for pos in positions) and (9, 9, 9) not in frontier
+    assert frontier.pop_random(random.Random(3)) == popped[0]
+
+
+def test_alias_table_matches_weights():
+    """Each item gets a share of the columns equal to its share of the weights"""
+    weights = [1.0, 3.0, 0.0, 4.0]
+    probabilities, aliases = sampling.build_alias_table(weights)
+    shares = [0.0] * len(weights)
+    for column, probability in enumerate(probabilities):
+        shares[column] += probability
+        shares[aliases[column]] += 1.0 - probability
+    for share, weight in zip(shares, weights):
+        assert share == pytest.approx(weight * len(weights) / sum(weights))
+
+    assert sampling.build_alias_table([0.0, 0.0]) == ([1.0, 1.0], [0, 1])
+
+
+def test_weighted_sampler_choices():
+    """The same seed gives the same choices, and items are chosen about as often as their weights say"""
+    items = [blocks.BlockFile("", blocks.BlockType.STRAIGHT, weight=weight) for weight in [1.0, 3.0, 0.0]]
+    sampler = sampling.WeightedSampler(cache_size=1)
+    first = [sampler.choose(items, random.Random(5)) for _ in range(10)]
+    assert first == [sampler.choose(items, random.Random(5)) for _ in range(10)]
+
+    rng = random.Random(7)
+    counts = [0, 0, 0]
+    for _ in range(4000):
+        counts[items.index(sampler.choose(items, rng))] += 1
+    assert counts[2] == 0
+    assert 2.5 < counts[1] / float(counts[0]) < 3.5
+
+
+def test_derive_seed():
+    """Child seeds are a stable hash of the master seed and index, so they are the same in every process"""
+    expected = int(hashlib.sha256(b"42/3").hexdigest()[:16], 16)
+    assert sampling.derive_seed(42, 3) == expected
+    assert len(set(sampling.derive_seed(42, index) for index in range(100))) == 100
+    assert all(0 <= sampling.derive_seed(index, 0) < 1 << 64 for index in range(10))
+
+
+def test_to_bytes_round_trip(tmpdir):
+    """A packed level, in memory, in a file or memory mapped, unpacks to the same blocks, seed and settings"""
+    lvl = make_level()
+    pth = str(tmpdir.join("level.lvl"))
+    lvl.save(pth)
+    with level.Level.load(pth, use_mmap=True) as mapped:
+        copies = [level.Level.from_bytes(lvl.to_bytes()), level.Level.load(pth), mapped]
+        for copy in copies:
+            assert tuple(copy.size) == tuple(lvl.size)
+            assert (copy.length, copy.seed) == (lvl.length, lvl.seed)
+            assert level.LevelGenerator.from_settings(copy.settings).get_settings() == lvl.settings
+            assert cells(copy) == cells(lvl)
+            assert str(copy) == str(lvl)
+            assert copy.find_longest_dead_end() == lvl.find_longest_dead_end()
+        with pytest.raises(ValueError):
+            mapped.place_block(blocks.BlockPrototype(blocks.BlockType.EMPTY), (0, 0, 0), length=-1)
+
+    assert level.Level.from_bytes(copies[0].to_bytes()).to_bytes() == lvl.to_bytes()
+
+
+def test_from_bytes_rejects_other_data():
+    """Data with the wrong magic or version, or cut short, is refused instead of read as garbage"""
+    data = bytearray(make_level().to_bytes())
+    with pytest.raises(ValueError, match="Not a packed level"):
+        level.Level.from_bytes(b"XXXX" + bytes(data[4:]))
+    newer = level.LEVEL_HEADER.pack(*((level.LEVEL_MAGIC, level.LEVEL_VERSION + 1)
+                                      + level.LEVEL_HEADER.unpack_from(bytes(data), 0)[2:]))
+    with pytest.raises(ValueError, match="version"):
+        level.Level.from_bytes(newer + bytes(data[level.LEVEL_HEADER.size:]))
+    with pytest.raises(ValueError, match="truncated"):
+        level.Level.from_bytes(bytes(data[:-1]))
+
+
+def test_write_text_glyphs():
+    """Every cell is drawn with the glyph of its block, and write_text writes the same text as str"""
+    lvl = level.Level(size=(3, 1, 2))
+    placed = [((0, 0, 0), blocks.BlockType.START, blocks.Orientation.EAST),
+              ((1, 0, 0), blocks.BlockType.STRAIGHT, blocks.Orientation.EAST),
+              ((1, 0, 1), blocks.BlockType.DEAD_END, blocks.Orientation.SOUTH)]
+    for pos, block_type, orientation in placed:
+        lvl.place_block(blocks.BlockPrototype(block_type, orientation, "x.ma"), pos, length=1)
+
+    def glyph(block_type, orientation):
+        return str(blocks.make_block(block_type, orientation=orientation))
+
+    empty = glyph(blocks.BlockType.EMPTY, blocks.Orientation.NORTH)
+    assert str(lvl).split("\n") == [
+        "Layer 0:",
+        ".....",
+        "." + glyph(*placed[0][1:]) + glyph(*placed[1][1:]) + empty + ".",
+        "." + empty + glyph(*placed[2][1:]) + empty + ".",
+        ".....",
+        "",
+    ]
+    text = io.StringIO()
+    lvl.write_text(text)
+    assert text.getvalue() == str(lvl)
+
+    cropped = io.StringIO()
+    lvl.write_text(cropped, crop=True)
+    assert cropped.getvalue().split("\n")[2] == "." + glyph(*placed[0][1:]) + glyph(*placed[1][1:]) + "."
+
+
+def test_occupancy_and_dead_ends():
+    """Counts, the longest dead end and the bounding box follow blocks as they are placed, replaced and emptied"""
+    lvl = level.Level(size=(4, 2, 4))
+    dead_end = blocks.BlockPrototype(blocks.BlockType.DEAD_END, blocks.Orientation.NORTH, "d.ma")
+    lvl.place_block(dead_end, (0, 0, 0), length=3)
+    lvl.place_block(dead_end, (3, 1, 2), length=5)
+    lvl.place_block(dead_end, (2, 0, 1), length=5)
+    assert lvl.count_blocks([blocks.BlockType.DEAD_END]) == 3
+    assert lvl.find_longest_dead_end() == (2, 0, 1)  # Ties go to the first position
+    assert lvl.bounding_box() == ((0, 0, 0), (3, 1, 2))
+
+    lvl.place_block(blocks.BlockPrototype(blocks.BlockType.STRAIGHT, blocks.Orientation.NORTH, "s.ma"), (2, 0, 1),
+                    length=5)
+    assert lvl.find_longest_dead_end() == (3, 1, 2)
+    lvl.place_block(blocks.BlockPrototype(blocks.BlockType.EMPTY), (3, 1, 2), length=-1)
+    assert lvl.find_longest_dead_end() == (0, 0, 0)
+    assert lvl.bounding_box() == ((0, 0, 0), (2, 0, 1))
+    assert list(lvl.iter_positions([blocks.BlockType.STRAIGHT])) == [(2, 0, 1)]
+
+
+def test_rollback_restores_level():
+    """Rolling back leaves the cell arrays, socket masks, occupancy index and bounding box as they were"""
+    lvl = make_level(size=(5, 2, 5))
+    lvl.start_journal()
+    before = snapshot(lvl)
+    checkpoint = lvl.checkpoint()
+
+    positions = list(lvl.iter_positions())
+    lvl.place_block(blocks.BlockPrototype(blocks.BlockType.EMPTY), positions[0], length=-1)
+    lvl.place_block(blocks.BlockPrototype(blocks.BlockType.DEAD_END, blocks.Orientation.WEST, "new.ma"),
+                    positions[-1], length=99)
+    for pos in [(x, y, z) for x in range(5) for y in range(2) for z in range(5)]:
+        if lvl.is_empty(pos):
+            lvl.place_block(blocks.BlockPrototype(blocks.BlockType.CROSS, blocks.Orientation.NORTH, "c.ma"), pos,
+                            length=1)
+            break
+    assert snapshot(lvl) != before
+
+    lvl.rollback(checkpoint)
+    assert snapshot(lvl) == before
+
+
+def test_generate_with_retries_backtracks():
+    """A level that generate gives up on is finished by undoing a few placements, and one it can make is unchanged"""
+    generator = level.LevelGenerator(block_list(), size=(4, 2, 4), maximum_length=6, seed=42)
+    with pytest.raises(level.CannotGenerateLevelError):
+        generator.generate()
+    result = generator.generate_with_retries()
+    assert result.backtracks > 0
+    assert result.level.count_blocks([blocks.BlockType.START]) == 1
+    assert result.level.count_blocks([blocks.BlockType.END]) == 1
+
+    generator = level.LevelGenerator(block_list(), size=(6, 2, 6), seed=3)
+    result = generator.generate_with_retries()
+    assert (result.seed, result.attempts, result.backtracks) == (3, 1, 0)
+    assert cells(result.level) == cells(generator.generate())
+
+
+def test_steer_to_minimum():
+    """Steering reaches the minimum length for more seeds than plain generation, with the same settings"""
+    def reached(steer):
+        return sum(level.LevelGenerator(block_list(), size=(8, 1, 8), minimum_length=20, seed=seed,
+                                        steer_to_minimum=steer).generate().length >= 20 for seed in range(40))
+
+    assert reached(True) > reached(False) + 10
+
+
+def test_generate_many_pool_matches_serial():
+    """Levels made in worker processes are the same as those made one at a time, and each can be made again"""
+    generator = level.LevelGenerator(block_list(), size=(5, 2, 5), seed=11)
+    serial = sorted(generator.generate_many(6, workers=1))
+    pooled = sorted(generator.generate_many(6, workers=2))
+    assert pooled == serial
+    assert [generated.index for generated in serial] == list(range(6))
+
+    again = level.LevelGenerator(block_list(), size=(5, 2, 5), seed=serial[4].seed).generate()
+    assert again.to_bytes() == serial[4].data
@@ -0,0 +1,81 @@
+"""
+test_mafile.py
+Asmita Chitale
+Assignment 03
+ATCM 3311.0U1
+07/24/2020
+"""
+
+
+#====================================================== IMPORTS =======================================================#
+import conftest
+import mafile
+
+import io
+import os
+
+
+#===================================================== FUNCTIONS =======================================================#
+def read_scene(name):
+    """
+    Reads the block out of one of the example scene files
+    :param name: The file name, such as Start_1.ma
+    :return: The BlockAsset
+    """
+    with io.open(os.path.join(conftest.SCENES_DIR, name), encoding=mafile.ENCODING) as ma_file:
+        return mafile.read_block_asset(ma_file)
+
+
+def test_read_block_asset_keeps_node_attributes():
+    """Node IDs are skipped without losing the setAttr statements after them"""
+    nodes = dict((node.name, node) for node in read_scene("Start_1.ma").nodes)
+    assert nodes["pCube1"].statements == [
+        'createNode transform -n "pCube1" -p "groupBlock"',
+        'setAttr ".t" -type "double3" 5 0.2 7.5',
+        'setAttr ".s" -type "double3" 2 0.4 5',
+    ]
+    assert len(nodes["polyCube1"].statements) > 1
+    assert not any(text.startswith("rename") for node in nodes.values() for text in node.statements)
+
+
+def test_read_block_asset_keeps_only_the_block():
+    """Cameras and UI scripts are left out, and the group's hierarchy is kept"""
+    asset = read_scene("Start_1.ma")
+    names = set(node.name for node in asset.nodes)
+    assert "groupBlock" in names
+    assert "persp" not in names and "perspShape" not in names
+    assert all(node.parent is None or node.parent in names for node in asset.nodes)
+
+
+def test_level_writer_round_trip(tmpdir):
+    """Every block of a written level reads back with the statements of its scene file, and the block's transform"""
+    import blocks
+    import level
+
+    placed = [((0, 0, 0), blocks.BlockType.START, "Start_1.ma", blocks.Orientation.NORTH),
+              ((1, 0, 0), blocks.BlockType.RAMP, "Ramp_1.ma", blocks.Orientation.EAST),
+              ((2, 1, 0), blocks.BlockType.END, "End_1.ma", blocks.Orientation.SOUTH)]
+    lvl = level.Level(size=(3, 2, 1))
+    for pos, block_type, name, orientation in placed:
+        lvl.place_block(blocks.BlockPrototype(block_type, orientation, os.path.join(conftest.SCENES_DIR, name)), pos,
+                        length=1)
+    pth = str(tmpdir.join("level.ma"))
+    mafile.MaLevelWriter().save(lvl, pth)
+
+    for pos, _, name, orientation in placed:
+        source = read_scene(name)
+        group_name = mafile.block_node_name(mafile.DEFAULT_GROUP_NAME, pos)
+        suffix = group_name[len(mafile.DEFAULT_GROUP_NAME):]
+        with io.open(pth, encoding=mafile.ENCODING) as ma_file:
+            written = mafile.read_block_asset(ma_file, group_name)
+        assert [node.name for node in written.nodes] == [node.name + suffix for node in source.nodes]
+
+        renamed = dict((node.name, node.name + suffix) for node in source.nodes)
+        for source_node, written_node in zip(source.nodes, written.nodes):
+            statements = [mafile.rename_nodes(source_node.statements[0], renamed)] + source_node.statements[1:]
+            if source_node.name == mafile.DEFAULT_GROUP_NAME:
+                translation, rotation = mafile.block_transform(pos, orientation, mafile.DEFAULT_BLOCK_SIZE)
+                statements.append('setAttr ".t" -type "double3" {!r} {!r} {!r}'.format(*map(float, translation)))
+                statements.append('setAttr ".r" -type "double3" 0 {!r} 0'.format(float(rotation[1])))
+            assert written_node.statements == statements
+        assert written.connections == [mafile.rename_nodes(text, renamed) for text in source.connections]
@@ -0,0 +1,134 @@
+"""
+test_mayalevel.py
+Asmita Chitale
+Assignment 03
+ATCM 3311.0U1
+07/24/2020
+"""
+
+
+#====================================================== IMPORTS =======================================================#
+import conftest
+import mayalevel
+import mayastandin
+import scene
+
+import os
+
+import pytest
+
+
+#====================================================== CONSTS ========================================================#
+PLACEMENTS = [  # Two blocks from one scene file and one from another
+    scene.BlockPlacement(os.path.join(conftest.SCENES_DIR, "Start_1.ma"), "groupBlock_0_0_0", (0.0, 0.0, 0.0),
+                         (0, 0, 0)),
+    scene.BlockPlacement(os.path.join(conftest.SCENES_DIR, "Straight_1.ma"), "groupBlock_1_0_0", (20.0, 0.0, 0.0),
+                         (0, 90, 0)),
+    scene.BlockPlacement(os.path.join(conftest.SCENES_DIR, "Straight_1.ma"), "groupBlock_2_0_0", (30.0, 0.0, 0.0),
+                         (0, 90, 0)),
+]
+
+
+#===================================================== FUNCTIONS =======================================================#
+@pytest.fixture
+def maya(monkeypatch):
+    """The stand-in maya.cmds and PyMEL, installed for one test"""
+    stand_in = mayastandin.MayaStandIn(mayalevel.DEFAULT_GROUP_NAME)
+    stand_in.install(monkeypatch)
+    return stand_in
+
+
+def place(mode):
+    """
+    Places PLACEMENTS in one batch of a new MayaSceneBackend
+    :param mode: The SceneMode
+    :return: The list of phase names
+    """
+    phases = [][:]
+    backend = mayalevel.MayaSceneBackend()
+    backend.begin_batch()
+    try:
+        backend.clear()
+        backend.place_blocks(PLACEMENTS, mode, phases.append)
+    finally:
+        backend.end_batch()
+    return phases
+
+
+@pytest.mark.parametrize("mode, copy_function", [(scene.SceneMode.DUPLICATE, "pymel.core.general.duplicate"),
+                                                 (scene.SceneMode.INSTANCE, "pymel.core.general.instance")])
+def test_place_blocks_copies_templates(maya, mode, copy_function):
+    """Each scene file is imported once, then every block is a copy with its name and transform"""
+    assert place(mode) == ["import", "copy", "transform"]
+
+    assert len(maya.called("pymel.core.system.importFile")) == 2
+    assert [kwargs["name"] for _, kwargs in maya.called(copy_function)] == [p.name for p in PLACEMENTS]
+    assert [(args[0], kwargs) for args, kwargs in maya.called("maya.cmds.xform")] == \
+        [(p.name, {"translation": p.translation, "rotation": p.rotation}) for p in PLACEMENTS]
+    assert all(p.name in maya.nodes for p in PLACEMENTS)
+
+    # Undo and refresh are turned off for the batch and back on after
+    assert maya.called("maya.cmds.refresh") == [((), {"suspend": True}), ((), {"suspend": False})]
+    assert maya.called("maya.cmds.undoInfo")[-1] == ((), {"stateWithoutFlush": True})
+
+
+def test_place_blocks_instancer(maya):
+    """One particle per block, with each block's template index and rotation, feeds one instancer"""
+    assert place(scene.SceneMode.INSTANCER) == ["import", "instancer"]
+
+    (_, particle_kwargs), = maya.called("pymel.core.effects.particle")
+    assert particle_kwargs["position"] == [p.translation for p in PLACEMENTS]
+    plugs = dict((args[0], args[1]) for args, _ in maya.called("plug.set"))
+    particles_shape = mayalevel.INSTANCER_PARTICLES_NAME + "Shape"
+    assert plugs[particles_shape + ".objectIndexPP"] == [0, 1, 1]
+    assert plugs[particles_shape + ".objectIndexPP0"] == [0, 1, 1]
+    assert plugs[particles_shape + ".rotationPP"] == [p.rotation for p in PLACEMENTS]
+
+    (args, kwargs), = maya.called("pymel.core.effects.particleInstancer")
+    assert len(kwargs["object"]) == 2
+    assert kwargs["name"] == mayalevel.INSTANCER_NAME
+    assert maya.called("pymel.core.general.duplicate") == []
+
+
+def test_delete_and_find_blocks(maya):
+    """Blocks deleted by hand are skipped when deleting, and make blocks_exist false"""
+    place(scene.SceneMode.DUPLICATE)
+    backend = mayalevel.MayaSceneBackend()
+    names = [p.name for p in PLACEMENTS]
+    assert backend.blocks_exist(names)
+
+    backend.delete_blocks(names[:1] + ["groupBlock_9_9_9"])
+    assert maya.called("maya.cmds.delete")[-1] == ((names[:1],), {})
+    assert not backend.blocks_exist(names)
+
+
+def test_ui_is_imported_when_opened(monkeypatch):
+    """mayalevel.MayaSceneLevelGeneratorUI makes the UI of mayalevelui, which is only imported then"""
+    import sys
+    import types
+
+    assert "mayalevelui" not in sys.modules
+    ui_module = types.ModuleType("mayalevelui")
+    ui_module.MayaSceneLevelGeneratorUI = lambda: "ui"
+    monkeypatch.setitem(sys.modules, "mayalevelui", ui_module)
+    assert mayalevel.MayaSceneLevelGeneratorUI() == "ui"
+
+
+def test_undo_and_refresh_between_chunks(maya):
+    """Undo and viewport refresh are back on whenever a chunked build hands control back to Maya"""
+    import blocks
+    import level
+
+    lvl = level.Level(size=(3, 1, 1))
+    for placement in PLACEMENTS:
+        pos = tuple(int(name) for name in placement.name.split("_")[1:])
+        lvl.place_block(blocks.BlockPrototype(blocks.BlockType.STRAIGHT, blocks.Orientation.EAST, placement.pth), pos,
+                        length=1)
+    building = mayalevel.MayaSceneLevelGenerator(lvl).iter_generate(chunk_size=1)
+    for _ in range(3):
+        next(building)
+        assert maya.called("maya.cmds.refresh")[-1] == ((), {"suspend": False})
+        assert maya.called("maya.cmds.undoInfo")[-1] == ((), {"stateWithoutFlush": True})
+    for _ in building:
+        pass
+    assert len(maya.called("maya.cmds.refresh")) == 8  # Off and on around each chunk and around the end of the build
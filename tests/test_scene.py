@@ -0,0 +1,145 @@
+"""
+test_scene.py
+Asmita Chitale
+Assignment 03
+ATCM 3311.0U1
+07/24/2020
+"""
+
+
+#====================================================== IMPORTS =======================================================#
+import blocks
+import conftest
+import level
+import mafile
+import scene
+
+import os
+
+
+#====================================================== CONSTS ========================================================#
+OLD_BLOCKS = (  # Blocks of the level in the scene, as tuples of the position, type, scene file and orientation
+    ((0, 0, 0), blocks.BlockType.START, "Start_1.ma", blocks.Orientation.NORTH),
+    ((1, 0, 0), blocks.BlockType.STRAIGHT, "Straight_1.ma", blocks.Orientation.EAST),
+    ((2, 0, 0), blocks.BlockType.END, "End_1.ma", blocks.Orientation.SOUTH),
+)
+NEW_BLOCKS = (  # The same start, a turned straight, the end moved and a dead end added on top
+    ((0, 0, 0), blocks.BlockType.START, "Start_1.ma", blocks.Orientation.NORTH),
+    ((1, 0, 0), blocks.BlockType.STRAIGHT, "Straight_1.ma", blocks.Orientation.NORTH),
+    ((1, 0, 1), blocks.BlockType.END, "End_1.ma", blocks.Orientation.SOUTH),
+    ((0, 1, 0), blocks.BlockType.DEAD_END, "DeadEnd_1.ma", blocks.Orientation.WEST),
+)
+SIZE = (3, 2, 2)  # Size of both levels
+
+
+#===================================================== FUNCTIONS =======================================================#
+def make_level(placed):
+    """
+    Makes a level by hand
+    :param placed: Tuple of tuples of the position, type, scene file and orientation of each block
+    :return: The Level
+    """
+    lvl = level.Level(size=SIZE)
+    for pos, block_type, name, orientation in placed:
+        lvl.place_block(blocks.BlockPrototype(block_type, orientation, os.path.join(conftest.SCENES_DIR, name)), pos,
+                        length=1)
+    return lvl
+
+
+def expected_placements(placed):
+    """
+    Works out the placements of blocks without the generator
+    :param placed: Tuple of tuples of the position, type, scene file and orientation of each block
+    :return: Dict of node name -> BlockPlacement
+    """
+    placements = dict()
+    for pos, _, name, orientation in placed:
+        translation, rotation = mafile.block_transform(pos, orientation, scene.DEFAULT_BLOCK_SIZE)
+        node_name = mafile.block_node_name(scene.DEFAULT_GROUP_NAME, pos)
+        placements[node_name] = scene.BlockPlacement(os.path.join(conftest.SCENES_DIR, name), node_name, translation,
+                                                     rotation)
+    return placements
+
+
+def names(positions):
+    """
+    Returns the node names of blocks
+    :param positions: Iterable of (X,Y,Z) positions
+    :return: Sorted list of the names
+    """
+    return sorted(mafile.block_node_name(scene.DEFAULT_GROUP_NAME, pos) for pos in positions)
+
+
+def test_generate_places_every_block():
+    """A new scene is cleared, then gets every block with its transform in one batch"""
+    backend = scene.RecordingSceneBackend()
+    scene.SceneLevelGenerator(make_level(OLD_BLOCKS), backend, mode=scene.SceneMode.INSTANCE).generate()
+
+    assert [call[0] for call in backend.calls] == ["begin_batch", "clear"] + ["place_block"] * 3 + \
+        ["pause_batch", "resume_batch", "end_batch"]
+    assert dict((name, placement) for name, (placement, _) in backend.blocks.items()) == \
+        expected_placements(OLD_BLOCKS)
+    assert all(mode == scene.SceneMode.INSTANCE for _, mode in backend.blocks.values())
+
+
+def test_batch_is_paused_between_chunks():
+    """The backend is paused whenever the build hands back control, and only ended once"""
+    backend = scene.RecordingSceneBackend()
+    building = scene.SceneLevelGenerator(make_level(OLD_BLOCKS), backend).iter_generate(chunk_size=2)
+    assert next(building) == (2, 3)
+    assert backend.calls[-1] == ("pause_batch",)
+    assert next(building) == (3, 3)
+    assert [call[0] for call in backend.calls[-3:]] == ["resume_batch", "place_block", "pause_batch"]
+    building.close()
+    assert backend.calls[-1] == ("end_batch", False)
+    assert [call[0] for call in backend.calls].count("begin_batch") == 1
+
+
+def test_update_replaces_only_changed_blocks():
+    """Only blocks whose type, orientation or path changed are deleted and placed, leaving the scene of a new build"""
+    backend = scene.RecordingSceneBackend()
+    generator = scene.SceneLevelGenerator(make_level(OLD_BLOCKS), backend)
+    generator.generate()
+    del backend.calls[:]
+    generator.update(make_level(NEW_BLOCKS))
+
+    deletes = [call[1] for call in backend.calls if call[0] == "delete_blocks"]
+    assert [sorted(deleted) for deleted in deletes] == [names([(1, 0, 0), (2, 0, 0)])]
+    assert sorted(call[1].name for call in backend.calls if call[0] == "place_block") == \
+        names([(1, 0, 0), (1, 0, 1), (0, 1, 0)])
+    assert ("clear",) not in backend.calls
+
+    rebuilt = scene.RecordingSceneBackend()
+    scene.SceneLevelGenerator(make_level(NEW_BLOCKS), rebuilt).generate()
+    assert dict(backend.blocks) == dict(rebuilt.blocks)
+
+
+def test_update_rebuilds_missing_blocks():
+    """If the blocks of the last level are gone from the scene, such as after a new scene, update builds it all again"""
+    backend = scene.RecordingSceneBackend()
+    generator = scene.SceneLevelGenerator(make_level(OLD_BLOCKS), backend)
+    generator.generate()
+    backend.clear()
+    del backend.calls[:]
+    generator.update(make_level(NEW_BLOCKS))
+
+    assert ("clear",) in backend.calls
+    assert dict((name, placement) for name, (placement, _) in backend.blocks.items()) == \
+        expected_placements(NEW_BLOCKS)
+
+
+def test_cancelled_build_keeps_the_file(tmpdir):
+    """A Maya ASCII file is written when a build finishes, and left as it was when a build is cancelled"""
+    pth = str(tmpdir.join("level.ma"))
+    generator = scene.SceneLevelGenerator(make_level(OLD_BLOCKS), scene.MaFileSceneBackend(pth))
+    generator.generate()
+    with open(pth, "rb") as ma_file:
+        written = ma_file.read()
+    assert mafile.block_node_name(scene.DEFAULT_GROUP_NAME, (2, 0, 0)).encode("ascii") in written
+
+    building = generator.iter_update(make_level(NEW_BLOCKS), chunk_size=1)
+    next(building)
+    building.close()
+    with open(pth, "rb") as ma_file:
+        assert ma_file.read() == written
+    assert tmpdir.listdir() == [tmpdir.join("level.ma")]